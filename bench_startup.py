@@ -0,0 +1,74 @@
+import sys
+import json
+import time
+import argparse
+import subprocess
+
+# Startup-time budget for the CLI. Each case runs in a fresh interpreter:
+# wall time of the command (best of N runs) plus the list of heavy modules it
+# imported. Exit code 1 if a case is over budget or imports something it
+# should not.
+
+HEAVY = ["nfstream", "pandas", "numpy", "sklearn", "joblib", "matplotlib", "folium", "requests", "yaml"]
+
+# Imports the export-csv command does before it starts reading the pcap.
+EXPORT_CSV_PROBE = "import netpoc.cli; from netpoc.flows import pcap_to_flows_df; import nfstream"
+
+CASES = [
+    # name, python args, default budget (s), modules that must stay unloaded
+    ("--help", ["app.py", "--help"], 0.5, HEAVY),
+    ("export-csv imports", ["-c", EXPORT_CSV_PROBE], 1.0, ["sklearn", "joblib", "matplotlib", "folium", "requests", "yaml"]),
+]
+
+PROBE = (
+    "import sys, json, runpy, atexit\n"
+    "heavy = {heavy!r}\n"
+    "atexit.register(lambda: sys.__stderr__.write('\\nLOADED ' + json.dumps([m for m in heavy if m in sys.modules]) + '\\n'))\n"
+    "argv = {argv!r}\n"
+    "if argv[0] == '-c':\n"
+    "    exec(argv[1])\n"
+    "else:\n"
+    "    sys.argv = argv\n"
+    "    runpy.run_path(argv[0], run_name='__main__')\n"
+)
+
+
+def _run(argv):
+    t0 = time.perf_counter()
+    subprocess.run([sys.executable] + argv, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, check=True)
+    return time.perf_counter() - t0
+
+
+def _loaded(argv):
+    code = PROBE.format(heavy=HEAVY, argv=argv)
+    p = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True)
+    for line in p.stderr.splitlines():
+        if line.startswith("LOADED "):
+            return json.loads(line[len("LOADED "):])
+    raise RuntimeError(f"probe failed for {argv}:\n{p.stderr}")
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Check netpoc CLI startup time against a budget")
+    ap.add_argument("--runs", type=int, default=5)
+    ap.add_argument("--scale", type=float, default=1.0, help="Multiply all budgets (slow CI machines)")
+    args = ap.parse_args()
+
+    base = _run(["-c", "pass"])
+    failed = False
+    for name, argv, budget, forbidden in CASES:
+        best = min(_run(argv) for _ in range(args.runs))
+        loaded = _loaded(argv)
+        bad = [m for m in loaded if m in forbidden]
+        limit = budget * args.scale
+        ok = best <= limit and not bad
+        failed |= not ok
+        print(f"{'OK  ' if ok else 'FAIL'} {name:20s} {best:6.3f}s (budget {limit:.2f}s, interpreter {base:.3f}s) loaded={loaded}")
+        if bad:
+            print(f"     must not import: {bad}")
+
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,12 +1,20 @@
 import json
 import os
-from datetime import datetime
+from collections import Counter, deque
 
 import pandas as pd
 import streamlit as st
 import plotly.express as px
 
+from netpoc import alert_stream, store
+from netpoc.rollups import (
+    PAIRS_TOP_CSV, ROLLUP_BIN_MS, SUMMARY_JSON, TIMELINE_CSV,
+    alerts_frame, alerts_timeline, rebin_timeline, summarize,
+)
+
 OUT_DEFAULT = "out"
+FEED_PAGE = 15
+LIVE_FEED_KEEP = 200
 
 st.set_page_config(
     page_title="NetPoC Dashboard",
@@ -42,24 +50,160 @@ st.markdown(
 )
 
 
-def load_json(path: str):
-    if not os.path.exists(path):
-        return []
+# --- Data layer ---
+# Every loader is keyed by (path, mtime), so Streamlit reruns (each widget click)
+# reuse the parsed tables until analyze rewrites the file. cache_resource keeps a
+# single shared object instead of unpickling a copy per rerun: treat as read-only.
+
+def file_mtime(path: str):
+    try:
+        return os.stat(path).st_mtime_ns
+    except OSError:
+        return None
+
+
+@st.cache_resource(show_spinner=False, max_entries=16)
+def _load_json(path: str, mtime):
+    if mtime is None:
+        return None
     with open(path, "r", encoding="utf-8") as f:
         return json.load(f)
 
 
-def safe_read_csv(path: str):
-    if not os.path.exists(path):
+@st.cache_resource(show_spinner=False, max_entries=16)
+def _load_csv(path: str, mtime, usecols=None):
+    if mtime is None:
         return None
-    return pd.read_csv(path)
+    return pd.read_csv(path, usecols=usecols)
 
 
-def ms_to_dt(ms: int):
-    try:
-        return datetime.fromtimestamp(int(ms) / 1000.0)
-    except Exception:
+@st.cache_resource(show_spinner=False, max_entries=2)
+def _load_text(path: str, mtime):
+    if mtime is None:
         return None
+    with open(path, "r", encoding="utf-8") as f:
+        return f.read()
+
+
+@st.cache_resource(show_spinner=False, max_entries=4)
+def _load_alerts(path: str, mtime):
+    return alerts_frame(_load_json(path, mtime))
+
+
+def load_json(path: str):
+    return _load_json(path, file_mtime(path))
+
+
+def safe_read_csv(path: str, usecols=None):
+    return _load_csv(path, file_mtime(path), tuple(usecols) if usecols else None)
+
+
+def load_alerts(path: str):
+    return _load_alerts(path, file_mtime(path))
+
+
+@st.cache_resource(show_spinner=False, max_entries=4)
+def _load_rollups(out_dir: str, mtimes):
+    summary = load_json(os.path.join(out_dir, SUMMARY_JSON))
+    timeline = safe_read_csv(os.path.join(out_dir, TIMELINE_CSV))
+    pairs = safe_read_csv(os.path.join(out_dir, PAIRS_TOP_CSV))
+    if summary is not None and timeline is not None:
+        return summary, timeline, pairs
+
+    # out/ written before rollups existed: derive them once from the raw files
+    alerts_df = load_alerts(os.path.join(out_dir, "alerts.json"))
+    flows = safe_read_csv(os.path.join(out_dir, "flows.csv"), usecols=["id"])
+    ml = safe_read_csv(os.path.join(out_dir, "ml_predictions.csv"))
+    pairs = safe_read_csv(os.path.join(out_dir, "pairs_summary.csv"))
+    summary = summarize(alerts_df, len(flows) if flows is not None else None, ml)
+    return summary, alerts_timeline(alerts_df), pairs
+
+
+@st.cache_resource(show_spinner=False, max_entries=2)
+def _open_store(path: str, mtime):
+    if mtime is None:
+        return None
+    return store.open_store(path)
+
+
+def load_store(path: str):
+    return _open_store(path, file_mtime(path))
+
+
+# --- Live tail (analyze --stream) ---
+# Only records appended since the last refresh are read (by segment/byte offset);
+# KPIs, timeline bins and the feed are updated from them in session state.
+
+def _live_state(sdir: str):
+    s = st.session_state.get("live")
+    if s is None or s["dir"] != sdir:
+        s = {"dir": sdir, "cursor": None, "total": 0, "sigma": 0, "bins": Counter(), "feed": deque(maxlen=LIVE_FEED_KEEP)}
+        st.session_state["live"] = s
+    return s
+
+
+def render_live(sdir: str, bin_sec: int):
+    s = _live_state(sdir)
+    new, cursor, index = alert_stream.tail(sdir, s["cursor"])
+    if index is None:
+        st.info("Brak alerts_stream/ (uruchom analyze --stream).")
+        return
+    if s["cursor"] is not None and s["cursor"]["stream_id"] != cursor["stream_id"]:
+        # stream was recreated: drop what was accumulated from the old one
+        s.update(cursor=None, total=0, sigma=0, bins=Counter(), feed=deque(maxlen=LIVE_FEED_KEEP))
+    s["cursor"] = cursor
+
+    for a in new:
+        rid = str(a.get("rule_id") or "UNKNOWN")
+        s["total"] += 1
+        s["sigma"] += rid.upper().startswith("SIGMA")
+        if a.get("ts_ms") is not None:
+            s["bins"][((int(a["ts_ms"]) // ROLLUP_BIN_MS) * ROLLUP_BIN_MS, rid)] += 1
+        s["feed"].appendleft(a)
+
+    status = "done" if index.get("done") else "running"
+    k1, k2, k3, k4 = st.columns(4)
+    k1.markdown(f'<div class="kpi-card"><div class="kpi-title">Flows seen</div><div class="kpi-value">{index.get("flows", 0)}</div></div>', unsafe_allow_html=True)
+    k2.markdown(f'<div class="kpi-card"><div class="kpi-title">Alerts</div><div class="kpi-value">{s["total"]}</div></div>', unsafe_allow_html=True)
+    k3.markdown(f'<div class="kpi-card"><div class="kpi-title">Sigma vs Python</div><div class="kpi-value">{s["sigma"]} / {s["total"] - s["sigma"]}</div></div>', unsafe_allow_html=True)
+    k4.markdown(f'<div class="kpi-card"><div class="kpi-title">Stream</div><div class="kpi-value">{status} (+{len(new)})</div></div>', unsafe_allow_html=True)
+
+    left, right = st.columns([1.35, 1])
+    with left:
+        st.markdown("### ⏱️ Alerts timeline (live)")
+        if s["bins"]:
+            tl = pd.DataFrame([(b, r, c) for (b, r), c in s["bins"].items()], columns=["bin_ms", "rule_id", "count"])
+            fig = px.line(rebin_timeline(tl, bin_sec * 1000), x="bin", y="count", color="rule_id", title=None)
+            fig.update_layout(
+                paper_bgcolor="rgba(0,0,0,0)",
+                plot_bgcolor="rgba(0,0,0,0)",
+                legend_title_text="rule_id",
+                height=360,
+                margin=dict(l=10, r=10, t=10, b=10),
+            )
+            st.plotly_chart(fig, use_container_width=True)
+        else:
+            st.info("Brak alertów w strumieniu.")
+    with right:
+        st.markdown("### 🚨 Alert feed (live)")
+        for a in list(s["feed"])[:FEED_PAGE]:
+            st.markdown(
+                f"""
+                <div class="kpi-card" style="margin-bottom:10px;">
+                  <div style="display:flex;justify-content:space-between;align-items:center;">
+                    <div><b>{a.get("rule_id", "UNKNOWN")}</b></div>
+                    <div class="muted">{a.get("src_ip", "")} ➜ {a.get("dst_ip", "")}:{a.get("dst_port", "")}</div>
+                  </div>
+                  <div class="muted" style="margin-top:6px;">{a.get("details", "")}</div>
+                </div>
+                """,
+                unsafe_allow_html=True,
+            )
+
+
+def load_rollups(out_dir: str):
+    names = [SUMMARY_JSON, TIMELINE_CSV, PAIRS_TOP_CSV, "alerts.json", "flows.csv", "pairs_summary.csv", "ml_predictions.csv"]
+    return _load_rollups(out_dir, tuple(file_mtime(os.path.join(out_dir, n)) for n in names))
 
 
 # --- Sidebar ---
@@ -71,11 +215,10 @@ flows_path = os.path.join(out_dir, "flows.csv")
 pairs_path = os.path.join(out_dir, "pairs_summary.csv")
 ml_path = os.path.join(out_dir, "ml_predictions.csv")
 map_path = os.path.join(out_dir, "map.html")
+store_db = store.store_path(out_dir)
 
-alerts = load_json(alerts_path)
-flows = safe_read_csv(flows_path)
-pairs = safe_read_csv(pairs_path)
-ml = safe_read_csv(ml_path)
+summary, timeline, pairs = load_rollups(out_dir)
+con = load_store(store_db)
 
 st.sidebar.markdown("---")
 st.sidebar.markdown("**Data sources**")
@@ -84,15 +227,25 @@ st.sidebar.write("flows:", "✅" if os.path.exists(flows_path) else "❌")
 st.sidebar.write("pairs:", "✅" if os.path.exists(pairs_path) else "❌")
 st.sidebar.write("ml:", "✅" if os.path.exists(ml_path) else "❌")
 st.sidebar.write("map:", "✅" if os.path.exists(map_path) else "❌")
+st.sidebar.write("index:", "✅" if con is not None else "❌ (in-memory filtering)")
+
+st.sidebar.markdown("---")
+live = st.sidebar.toggle("Live tail (analyze --stream)", value=False)
+refresh_sec = st.sidebar.selectbox("Refresh every (s)", [2, 5, 10, 30], index=1, disabled=not live)
 
 # --- Header ---
 st.markdown("## 🎬 NetPoC Dashboard")
 st.markdown('<span class="pill">dark mode</span>  <span class="pill">flows</span>  <span class="pill">sigma + python rules</span>  <span class="pill">ml</span>', unsafe_allow_html=True)
 
+if live:
+    live_bin = st.selectbox("Timeline bin", [5, 10, 30, 60], index=0)
+    st.fragment(run_every=refresh_sec)(render_live)(alert_stream.stream_dir(out_dir), live_bin)
+    st.stop()
+
 # --- Filters ---
-rule_ids = sorted({a.get("rule_id", "UNKNOWN") for a in alerts}) if alerts else []
-src_ips = sorted({a.get("src_ip", "") for a in alerts if a.get("src_ip")}) if alerts else []
-dst_ips = sorted({a.get("dst_ip", "") for a in alerts if a.get("dst_ip")}) if alerts else []
+rule_ids = summary["rule_ids"]
+src_ips = summary["src_ips"]
+dst_ips = summary["dst_ips"]
 
 colF1, colF2, colF3, colF4 = st.columns([1.2, 1, 1, 1])
 with colF1:
@@ -105,24 +258,56 @@ with colF4:
     bin_sec = st.selectbox("Timeline bin", [5, 10, 30, 60], index=3)
 
 # Apply filters
-flt = alerts
-if sel_rules:
-    flt = [a for a in flt if a.get("rule_id") in sel_rules]
-if sel_src:
-    flt = [a for a in flt if a.get("src_ip") in sel_src]
-if sel_dst:
-    flt = [a for a in flt if a.get("dst_ip") in sel_dst]
+filters = {"rules": sel_rules, "src_ips": sel_src, "dst_ips": sel_dst}
+bin_ms = bin_sec * 1000
+
+if con is not None:
+    # indexed SQLite store: filtering, time binning and paging run in the database
+    filtered_alerts = store.count_alerts(con, **filters)
+    g = store.alerts_timeline(con, bin_ms, **filters)
+
+    def fetch_page(offset):
+        return store.alerts_page(con, FEED_PAGE, offset, **filters)
+
+else:
+    # no store (older out/ or --no-store): rule_id alone is answered from the
+    # timeline rollup, src/dst filters need the cached alert table
+    def filtered_frame():
+        flt = load_alerts(alerts_path)
+        mask = pd.Series(True, index=flt.index)
+        if sel_rules:
+            mask &= flt["rule_id"].isin(sel_rules)
+        if sel_src:
+            mask &= flt["src_ip"].isin(sel_src)
+        if sel_dst:
+            mask &= flt["dst_ip"].isin(sel_dst)
+        return flt[mask]
+
+    if sel_src or sel_dst or summary["total_alerts"] == 0:
+        flt = filtered_frame()
+        flt_timeline = alerts_timeline(flt, bin_ms=bin_ms)
+        filtered_alerts = len(flt)
+    else:
+        flt_timeline = timeline[timeline["rule_id"].isin(sel_rules)] if sel_rules else timeline
+        filtered_alerts = int(flt_timeline["count"].sum())
+    g = rebin_timeline(flt_timeline, bin_ms)
+
+    def fetch_page(offset):
+        flt = filtered_frame()
+        if flt["ts_ms"].notna().any():
+            return flt.nlargest(offset + FEED_PAGE, "ts_ms").iloc[offset:]
+        return flt.iloc[offset:offset + FEED_PAGE]
 
 # --- KPIs ---
-total_alerts = len(alerts)
-filtered_alerts = len(flt)
-total_flows = len(flows) if flows is not None else 0
+total_alerts = summary["total_alerts"]
+total_flows = summary["total_flows"] or 0
 
-sigma_count = sum(1 for a in alerts if str(a.get("rule_id", "")).upper().startswith("SIGMA"))
-python_count = total_alerts - sigma_count
+sigma_count = summary["sigma_alerts"]
+python_count = summary["python_alerts"]
 
-ml_on = ml is not None and len(ml) > 0
-ml_susp = int((ml["pred_label"] == 1).sum()) if ml_on and "pred_label" in ml.columns else None
+ml_counts = summary.get("ml_pred_counts")
+ml_on = bool(ml_counts)
+ml_susp = ml_counts.get("1", 0) if ml_on else None
 
 k1, k2, k3, k4, k5 = st.columns(5)
 k1.markdown(f'<div class="kpi-card"><div class="kpi-title">Total flows</div><div class="kpi-value">{total_flows}</div></div>', unsafe_allow_html=True)
@@ -141,18 +326,7 @@ left, right = st.columns([1.35, 1])
 
 with left:
     st.markdown("### ⏱️ Alerts timeline")
-    if flt:
-        dfA = pd.DataFrame(flt)
-        # pick best timestamp field
-        if "ts_ms" in dfA.columns and dfA["ts_ms"].notna().any():
-            dfA["ts"] = dfA["ts_ms"].apply(ms_to_dt)
-        else:
-            # if no timestamps, fake a single timestamp so UI still works
-            dfA["ts"] = datetime.now()
-        dfA = dfA[dfA["ts"].notna()]
-        dfA["bin"] = dfA["ts"].dt.floor(f"{bin_sec}S")
-        g = dfA.groupby(["bin", "rule_id"]).size().reset_index(name="count")
-        g = g.sort_values("bin")
+    if filtered_alerts:
         fig = px.line(g, x="bin", y="count", color="rule_id", title=None)
         fig.update_layout(
             paper_bgcolor="rgba(0,0,0,0)",
@@ -167,14 +341,12 @@ with left:
 
 with right:
     st.markdown("### 🚨 Alert feed (latest)")
-    if flt:
-        dfA = pd.DataFrame(flt)
-        if "ts_ms" in dfA.columns and dfA["ts_ms"].notna().any():
-            dfA["ts"] = dfA["ts_ms"].apply(ms_to_dt)
-            dfA = dfA.sort_values("ts", ascending=False)
-        dfA = dfA.head(15)
-
-        for _, row in dfA.iterrows():
+    if filtered_alerts:
+        pages = -(-filtered_alerts // FEED_PAGE)
+        page = st.number_input(f"Page (of {pages})", min_value=1, max_value=pages, value=1, step=1)
+        dfA = fetch_page((int(page) - 1) * FEED_PAGE)
+
+        for row in dfA.to_dict("records"):
             rid = row.get("rule_id", "UNKNOWN")
             sip = row.get("src_ip", "")
             dip = row.get("dst_ip", "")
@@ -226,19 +398,14 @@ with c1:
 with c2:
     st.markdown("### 🤖 ML predictions (distribution)")
     if ml_on:
-        # expecting pred_label and/or pred_score
-        if "pred_label" in ml.columns:
-            dist = ml["pred_label"].value_counts().reset_index()
-            dist.columns = ["pred_label", "count"]
-            fig = px.pie(dist, names="pred_label", values="count", title=None)
-            fig.update_layout(
-                paper_bgcolor="rgba(0,0,0,0)",
-                height=380,
-                margin=dict(l=10, r=10, t=10, b=10),
-            )
-            st.plotly_chart(fig, use_container_width=True)
-        else:
-            st.write(ml.head(20))
+        dist = pd.DataFrame({"pred_label": list(ml_counts.keys()), "count": list(ml_counts.values())})
+        fig = px.pie(dist, names="pred_label", values="count", title=None)
+        fig.update_layout(
+            paper_bgcolor="rgba(0,0,0,0)",
+            height=380,
+            margin=dict(l=10, r=10, t=10, b=10),
+        )
+        st.plotly_chart(fig, use_container_width=True)
     else:
         st.info("Brak ml_predictions.csv (uruchom analyze z ML).")
 
@@ -246,9 +413,8 @@ st.markdown("---")
 
 # --- Map embed ---
 st.markdown("### 🗺️ Map (optional)")
-if os.path.exists(map_path):
-    with open(map_path, "r", encoding="utf-8") as f:
-        html = f.read()
-    st.components.v1.html(html, height=520, scrolling=True)
+map_html = _load_text(map_path, file_mtime(map_path))
+if map_html is not None:
+    st.components.v1.html(map_html, height=520, scrolling=True)
 else:
     st.info("Brak map.html (enrichment mógł nie zwrócić geolokacji, albo wyłączyłeś mapę).")
@@ -0,0 +1,126 @@
+import yaml
+import numpy as np
+import pandas as pd
+
+
+# Collapses per-flow alerts into incidents: alerts with the same key inside
+# one tumbling time window (aligned to the epoch) become one record with
+# first/last seen, count, summed flow bytes and a few sample flow ids.
+# Per-rule overrides go under "rules", e.g.
+#   rules:
+#     R002: {suppress: true}                      # drop the rule's alerts
+#     "SIGMA:...": {key: [rule_id, dst_ip], window_s: 3600, max_per_window: 20}
+# max_per_window throttles a rule to its first N aggregates per window.
+
+DEFAULT_AGGREGATION = {
+    "key": ["rule_id", "src_ip", "dst_ip", "dst_port"],
+    "window_s": 300,
+    "max_samples": 5,
+    "max_per_window": None,
+    "suppress": False,
+    "rules": {},
+}
+
+_FIRST_COLS = ["rule_name", "type", "src_ip", "dst_ip", "dst_port", "details", "flow_id"]
+
+
+def load_aggregation_config(path=None):
+    cfg = dict(DEFAULT_AGGREGATION)
+    if path:
+        with open(path, "r", encoding="utf-8") as f:
+            cfg.update(yaml.safe_load(f) or {})
+    cfg["rules"] = {str(k): v or {} for k, v in (cfg.get("rules") or {}).items()}
+    return cfg
+
+
+def _rule_cfg(cfg, rule_id):
+    rc = {k: cfg[k] for k in ("key", "window_s", "max_samples", "max_per_window", "suppress")}
+    rc.update(cfg["rules"].get(rule_id, {}))
+    return rc
+
+
+def _flow_bytes(df, flows_df):
+    if flows_df is None or "bidirectional_bytes" not in flows_df.columns or "id" not in flows_df.columns:
+        return pd.Series(0, index=df.index, dtype="int64")
+    f = flows_df[["id", "bidirectional_bytes"]].drop_duplicates("id")
+    by_id = pd.Series(pd.to_numeric(f["bidirectional_bytes"], errors="coerce").to_numpy(), index=f["id"].to_numpy())
+    return df["flow_id"].map(by_id).fillna(0).astype("int64")
+
+
+def _aggregate_rule(df, rc):
+    window_ms = int(rc["window_s"] * 1000)
+    df = df.sort_values("ts_ms", kind="stable")
+    df["window_ms"] = (df["ts_ms"].fillna(-1).astype("int64") // window_ms) * window_ms
+    keys = [k for k in rc["key"] if k in df.columns] + ["window_ms"]
+    g = df.groupby(keys, dropna=False, sort=False)
+
+    agg = g.agg(
+        first_seen_ms=("ts_ms", "min"),
+        last_seen_ms=("ts_ms", "max"),
+        count=("ts_ms", "size"),
+        bytes=("bytes", "sum"),
+        **{c: (c, "first") for c in _FIRST_COLS if c not in keys},
+    ).reset_index()
+
+    # first max_samples flow ids per aggregate, in time order
+    picked = df[df["flow_id"].notna() & (g.cumcount() < rc["max_samples"])]
+    samples = picked.groupby(keys, dropna=False, sort=False)["flow_id"].agg(lambda s: [int(v) for v in s])
+    agg = agg.merge(samples.rename("sample_flow_ids").reset_index(), on=keys, how="left")
+    agg["sample_flow_ids"] = agg["sample_flow_ids"].apply(lambda v: v if isinstance(v, list) else [])
+
+    throttled = 0
+    if rc["max_per_window"]:
+        agg = agg.sort_values("first_seen_ms", kind="stable")
+        over = agg.groupby("window_ms").cumcount() >= int(rc["max_per_window"])
+        throttled = int(agg.loc[over, "count"].sum())
+        agg = agg[~over]
+    for c in ("first_seen_ms", "last_seen_ms", "count", "bytes"):
+        agg[c] = agg[c].astype("Int64")
+    agg["ts_ms"] = agg["first_seen_ms"]
+    return agg, throttled
+
+
+def aggregate_alerts(alerts, flows_df=None, cfg=None):
+    cfg = cfg or load_aggregation_config()
+    if not alerts:
+        return [], {
+            "raw": 0, "aggregates": 0, "suppressed": 0, "throttled": 0, "by_rule": [],
+            "key": cfg["key"], "window_s": cfg["window_s"],
+        }
+
+    df = pd.DataFrame(alerts)
+    df["rule_id"] = df["rule_id"].fillna("UNKNOWN").astype(str)
+    df["ts_ms"] = pd.to_numeric(df["ts_ms"], errors="coerce")
+    for c in _FIRST_COLS:
+        if c not in df.columns:
+            df[c] = None
+    df["bytes"] = _flow_bytes(df, flows_df)
+
+    parts, by_rule = [], []
+    for rule_id, rdf in df.groupby("rule_id", sort=True):
+        rc = _rule_cfg(cfg, rule_id)
+        row = {"rule_id": rule_id, "raw": len(rdf), "aggregates": 0, "suppressed": 0, "throttled": 0}
+        if rc["suppress"]:
+            row["suppressed"] = len(rdf)
+        else:
+            agg, row["throttled"] = _aggregate_rule(rdf.copy(), rc)
+            row["aggregates"] = len(agg)
+            parts.append(agg)
+        by_rule.append(row)
+
+    out = pd.concat(parts, ignore_index=True) if parts else pd.DataFrame()
+    if len(out):
+        out = out.sort_values("ts_ms", kind="stable")
+        out = out.astype(object).where(out.notna(), None)
+    records = [{k: (v.item() if isinstance(v, np.generic) else v) for k, v in r.items()} for r in out.to_dict("records")]
+
+    stats = {
+        "raw": len(df),
+        "aggregates": len(records),
+        "suppressed": sum(r["suppressed"] for r in by_rule),
+        "throttled": sum(r["throttled"] for r in by_rule),
+        "by_rule": by_rule,
+        "key": cfg["key"],
+        "window_s": cfg["window_s"],
+    }
+    return records, stats
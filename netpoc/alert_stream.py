@@ -0,0 +1,129 @@
+import os
+import json
+import uuid
+
+
+# Alerts appended while analyze runs: NDJSON segments + a small offset index.
+# The index is only rewritten (atomically) after a segment write is flushed,
+# so readers never see a partially written record. Every run starts a new
+# stream (new stream_id, segment names carry it) and drops the previous
+# run's segments.
+
+STREAM_DIR = "alerts_stream"
+INDEX_JSON = "index.json"
+SEGMENT_MAX_RECORDS = 100_000
+
+
+def stream_dir(out_dir):
+    return os.path.join(out_dir, STREAM_DIR)
+
+
+def read_index(sdir):
+    try:
+        with open(os.path.join(sdir, INDEX_JSON), "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def _write_index(sdir, index):
+    path = os.path.join(sdir, INDEX_JSON)
+    tmp = path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(index, f)
+    os.replace(tmp, path)
+
+
+class AlertStreamWriter:
+    def __init__(self, out_dir, segment_max_records=SEGMENT_MAX_RECORDS):
+        self.dir = stream_dir(out_dir)
+        self.segment_max_records = segment_max_records
+        os.makedirs(self.dir, exist_ok=True)
+        self.index = {
+            "stream_id": uuid.uuid4().hex,
+            "records": 0,
+            "flows": 0,
+            "done": False,
+            "segments": [],
+        }
+        # readers switch to the new (empty) stream before the old segments go away
+        _write_index(self.dir, self.index)
+        for name in os.listdir(self.dir):
+            if name.startswith("seg-") and name.endswith(".ndjson"):
+                os.remove(os.path.join(self.dir, name))
+
+    def _segment(self):
+        segs = self.index["segments"]
+        if not segs or segs[-1]["count"] >= self.segment_max_records:
+            segs.append({
+                "name": f"seg-{self.index['stream_id'][:12]}-{len(segs):06d}.ndjson",
+                "first": self.index["records"],
+                "count": 0,
+                "bytes": 0,
+            })
+        return segs[-1]
+
+    def append(self, alerts, flows=0):
+        alerts = list(alerts or [])
+        while alerts:
+            seg = self._segment()
+            take = alerts[:self.segment_max_records - seg["count"]]
+            alerts = alerts[len(take):]
+
+            data = "".join(json.dumps(a, ensure_ascii=False, default=str) + "\n" for a in take).encode("utf-8")
+            with open(os.path.join(self.dir, seg["name"]), "ab") as f:
+                f.write(data)
+                f.flush()
+                os.fsync(f.fileno())
+            seg["count"] += len(take)
+            seg["bytes"] += len(data)
+            self.index["records"] += len(take)
+
+        self.index["flows"] += int(flows)
+        _write_index(self.dir, self.index)
+
+    def close(self):
+        self.index["done"] = True
+        _write_index(self.dir, self.index)
+
+
+def tail(sdir, cursor=None, max_records=None):
+    # cursor = {"stream_id", "segment", "pos", "records"}; pass the returned one
+    # back in to read only what was appended since. A new stream_id restarts.
+    index = read_index(sdir)
+    if index is None:
+        return [], None, None
+
+    if not cursor or cursor.get("stream_id") != index["stream_id"]:
+        cursor = {"stream_id": index["stream_id"], "segment": 0, "pos": 0, "records": 0}
+    else:
+        cursor = dict(cursor)
+
+    out = []
+    segs = index["segments"]
+    while cursor["segment"] < len(segs):
+        seg = segs[cursor["segment"]]
+        if cursor["pos"] < seg["bytes"]:
+            try:
+                with open(os.path.join(sdir, seg["name"]), "rb") as f:
+                    f.seek(cursor["pos"])
+                    data = f.read(seg["bytes"] - cursor["pos"])
+            except FileNotFoundError:
+                break  # a new run replaced this stream; the next call sees its stream_id
+            lines = data.splitlines()
+            if max_records is not None:
+                lines = lines[:max_records - len(out)]
+                data_len = sum(len(ln) + 1 for ln in lines)
+            else:
+                data_len = len(data)
+            out.extend(json.loads(ln) for ln in lines)
+            cursor["pos"] += data_len
+            cursor["records"] += len(lines)
+            if max_records is not None and len(out) >= max_records:
+                break
+        if cursor["segment"] == len(segs) - 1:
+            break
+        cursor["segment"] += 1
+        cursor["pos"] = 0
+
+    return out, cursor, index
@@ -0,0 +1,285 @@
+import os
+import re
+import json
+import time
+import uuid
+import shutil
+import sqlite3
+import hashlib
+from datetime import datetime, timezone
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from .flows import FLOW_COLS, APP_COLS
+from .detection_rules import RULES, RULE_PREDICATES, run_flow_rules
+from .sigma_rules import _field_map, run_sigma_rules
+
+
+# Persistent flow archive fed by `analyze --archive`. Flows are partitioned
+# by UTC hour of first_seen_ms and cut into blocks of at most BLOCK_ROWS rows,
+# sorted by time. A block is a folder of .npy columns (strings dictionary-
+# encoded: <col>.codes.npy + <col>.dict.npy). catalog.sqlite lists every
+# block with its time range and a zone map per column (min/max, plus the
+# distinct values when there are few), which `netpoc hunt` uses to skip
+# blocks before reading them.
+
+CATALOG_DB = "catalog.sqlite"
+BLOCK_ROWS = 65_536
+ZONE_MAX_VALUES = 256
+HOUR_MS = 3_600_000
+
+_STRING_COLS = {"src_ip", "dst_ip"}
+
+
+def _is_text(col, values):
+    # object under pandas 2, StringDtype under pandas 3 (application_name, ...)
+    return col in _STRING_COLS or pd.api.types.is_string_dtype(values.dtype) or pd.api.types.is_object_dtype(values.dtype)
+
+
+def _catalog(root):
+    os.makedirs(root, exist_ok=True)
+    con = sqlite3.connect(os.path.join(root, CATALOG_DB), timeout=30)
+    con.execute(
+        "CREATE TABLE IF NOT EXISTS blocks (id INTEGER PRIMARY KEY, path TEXT, hour_ms INTEGER, rows INTEGER, "
+        "min_ts INTEGER, max_ts INTEGER, zone TEXT, run TEXT)"
+    )
+    con.execute("CREATE INDEX IF NOT EXISTS idx_blocks_ts ON blocks(max_ts, min_ts)")
+    con.execute("CREATE TABLE IF NOT EXISTS runs (run TEXT PRIMARY KEY, source TEXT, flows INTEGER, blocks INTEGER, added_ms INTEGER)")
+    return con
+
+
+def source_key(paths):
+    h = hashlib.sha1()
+    for p in paths:
+        st = os.stat(p)
+        h.update(f"{os.path.abspath(p)}|{st.st_size}|{st.st_mtime_ns}\n".encode("utf-8"))
+    return h.hexdigest()
+
+
+# ---------- Write ----------
+
+def _zone(col, values):
+    s = pd.Series(values)
+    s = s[s.notna()]
+    if len(s) == 0:
+        return {"min": None, "max": None, "values": []}
+    if _is_text(col, s):
+        s = s.astype(str)
+        lo, hi = s.min(), s.max()
+    else:
+        lo, hi = s.min().item(), s.max().item()
+    uniq = s.unique()
+    vals = sorted(v.item() if isinstance(v, np.generic) else v for v in uniq) if len(uniq) <= ZONE_MAX_VALUES else None
+    return {"min": lo, "max": hi, "values": vals}
+
+
+def write_block(path, df):
+    os.makedirs(path)
+    zone = {}
+    for col in df.columns:
+        values = df[col]
+        if _is_text(col, values):
+            codes, uniques = pd.factorize(values.astype("string").fillna(""), sort=True)
+            np.save(os.path.join(path, col + ".codes.npy"), codes.astype(np.int32))
+            np.save(os.path.join(path, col + ".dict.npy"), np.asarray(uniques, dtype=str))
+        else:
+            np.save(os.path.join(path, col + ".npy"), pd.to_numeric(values, errors="coerce").to_numpy())
+        zone[col] = _zone(col, values)
+    return zone
+
+
+def archive_flows(root, flows_df: pd.DataFrame, source, run=None):
+    # -> summary; skipped when this source was archived before (same paths/sizes/mtimes)
+    run = run or uuid.uuid4().hex[:12]
+    con = _catalog(root)
+    try:
+        if con.execute("SELECT 1 FROM runs WHERE run = ?", [run]).fetchone():
+            return {"run": run, "skipped": True, "flows": 0, "blocks": 0}
+
+        # base flow columns (+ app columns when the run dissected them); per-packet stats are not kept
+        df = flows_df[[c for c in FLOW_COLS + APP_COLS if c in flows_df.columns]]
+        ts = pd.to_numeric(df["first_seen_ms"], errors="coerce").fillna(0).astype("int64")
+        df = df.assign(first_seen_ms=ts).iloc[np.argsort(ts.to_numpy(), kind="stable")]
+        hours = df["first_seen_ms"].to_numpy() // HOUR_MS * HOUR_MS
+
+        rows = []
+        for hour in np.unique(hours):
+            part = df[hours == hour]
+            day = datetime.fromtimestamp(hour / 1000, tz=timezone.utc)
+            pdir = os.path.join(root, day.strftime("%Y/%m/%d/%H"))
+            # blocks are written before the catalog commit: drop what a crashed earlier attempt left
+            if os.path.isdir(pdir):
+                for name in os.listdir(pdir):
+                    if name.startswith(f"b-{run[:12]}-"):
+                        shutil.rmtree(os.path.join(pdir, name))
+            for start in range(0, len(part), BLOCK_ROWS):
+                block = part.iloc[start:start + BLOCK_ROWS]
+                rel = os.path.join(os.path.relpath(pdir, root), f"b-{run[:12]}-{start // BLOCK_ROWS}")
+                zone = write_block(os.path.join(root, rel), block)
+                rows.append((rel, int(hour), len(block), zone["first_seen_ms"]["min"], zone["first_seen_ms"]["max"], json.dumps(zone), run))
+
+        con.executemany("INSERT INTO blocks (path, hour_ms, rows, min_ts, max_ts, zone, run) VALUES (?, ?, ?, ?, ?, ?, ?)", rows)
+        con.execute("INSERT INTO runs VALUES (?, ?, ?, ?, ?)", [run, source, len(df), len(rows), int(time.time() * 1000)])
+        con.commit()
+    finally:
+        con.close()
+    return {"run": run, "skipped": False, "flows": int(len(df)), "blocks": len(rows)}
+
+
+# ---------- Read ----------
+
+def read_block(root, rel, columns=None):
+    path = os.path.join(root, rel)
+    data = {}
+    for name in sorted(os.listdir(path)):
+        if name.endswith(".dict.npy"):
+            continue
+        col = name[: -len(".codes.npy")] if name.endswith(".codes.npy") else name[: -len(".npy")]
+        if columns is not None and col not in columns:
+            continue
+        if name.endswith(".codes.npy"):
+            codes = np.load(os.path.join(path, name), mmap_mode="r")
+            data[col] = np.load(os.path.join(path, col + ".dict.npy"))[codes]
+        else:
+            data[col] = np.load(os.path.join(path, name), mmap_mode="r")
+    return pd.DataFrame(data)
+
+
+# ---------- Hunt ----------
+
+def parse_time(value, now_ms=None):
+    # "30d" / "12h" / "90m" (relative to now), epoch ms, or an ISO date/datetime (UTC if no tz)
+    if value is None:
+        return None
+    now_ms = int(time.time() * 1000) if now_ms is None else now_ms
+    m = re.fullmatch(r"(\d+)\s*([smhd])", str(value).strip())
+    if m:
+        return now_ms - int(m.group(1)) * {"s": 1_000, "m": 60_000, "h": HOUR_MS, "d": 24 * HOUR_MS}[m.group(2)]
+    if str(value).isdigit():
+        return int(value)
+    ts = pd.Timestamp(value)
+    if ts.tzinfo is None:
+        ts = ts.tz_localize("UTC")
+    return int(ts.timestamp() * 1000)
+
+
+def _sigma_predicates(rule):
+    # selection -> [(col, values)] usable on zone maps; "contains" cannot prune
+    fmap = _field_map()
+    sel = ((rule.get("detection") or {}).get("selection")) or {}
+    preds = []
+    for k, v in sel.items():
+        col = fmap.get(k, k)
+        if isinstance(v, dict):
+            continue
+        preds.append((col, "in", v if isinstance(v, list) else [v]))
+    return preds
+
+
+def _may_match(zone, preds):
+    for col, op, val in preds:
+        z = zone.get(col)
+        if z is None:
+            # column not archived: the rule cannot match (run_sigma_rules treats it the same way)
+            return False
+        if z["min"] is None:
+            return False
+        if op == "in":
+            if z["values"] is not None:
+                if not set(z["values"]) & set(val):
+                    return False
+            elif isinstance(z["min"], str):
+                if all(str(v) < z["min"] or str(v) > z["max"] for v in val):
+                    return False
+            elif all(not isinstance(v, (int, float)) or v < z["min"] or v > z["max"] for v in val):
+                return False
+        elif op == ">" and not z["max"] > val:
+            return False
+        elif op == ">=" and not z["max"] >= val:
+            return False
+        elif op == "<" and not z["min"] < val:
+            return False
+        elif op == "<=" and not z["min"] <= val:
+            return False
+    return True
+
+
+def _scan(task):
+    root, blocks, since_ms, until_ms = task
+    alerts, rows = [], 0
+    for rel, sigma_rules, python_rules in blocks:
+        df = read_block(root, rel)
+        ts = df["first_seen_ms"].to_numpy()
+        keep = np.ones(len(df), dtype=bool)
+        if since_ms is not None:
+            keep &= ts >= since_ms
+        if until_ms is not None:
+            keep &= ts < until_ms
+        df = df[keep].reset_index(drop=True)
+        rows += len(df)
+        if len(df) == 0:
+            continue
+        found = run_sigma_rules(df, sigma_rules) if sigma_rules else []
+        if python_rules:
+            found += [a for a in run_flow_rules(df) if a["rule_id"] in python_rules]
+        for a in found:
+            a["archive_block"] = rel
+        alerts += found
+    return alerts, rows
+
+
+def hunt(root, sigma_rules=(), python_rules=True, since_ms=None, until_ms=None, workers=None, blocks_per_task=8):
+    t0 = time.perf_counter()
+    con = _catalog(root)
+    try:
+        total = con.execute("SELECT COUNT(*) FROM blocks").fetchone()[0]
+        sql, params = "SELECT path, zone FROM blocks", []
+        cond = []
+        if since_ms is not None:
+            cond.append("max_ts >= ?")
+            params.append(int(since_ms))
+        if until_ms is not None:
+            cond.append("min_ts < ?")
+            params.append(int(until_ms))
+        if cond:
+            sql += " WHERE " + " AND ".join(cond)
+        in_range = con.execute(sql + " ORDER BY min_ts", params).fetchall()
+    finally:
+        con.close()
+
+    sigma_preds = [(r, _sigma_predicates(r)) for r in sigma_rules]
+    py_ids = [rid for rid, _, _ in RULES] if python_rules is True else list(python_rules or [])
+
+    candidates = []
+    for rel, zone_json in in_range:
+        zone = json.loads(zone_json)
+        s = [r for r, preds in sigma_preds if _may_match(zone, preds)]
+        p = [rid for rid in py_ids if _may_match(zone, RULE_PREDICATES.get(rid, []))]
+        if s or p:
+            candidates.append((rel, s, p))
+
+    tasks = [(root, candidates[i:i + blocks_per_task], since_ms, until_ms) for i in range(0, len(candidates), blocks_per_task)]
+    alerts, rows = [], 0
+    if workers is None:
+        workers = min(len(tasks), os.cpu_count() or 1)
+    if workers > 1 and len(tasks) > 1:
+        with ProcessPoolExecutor(max_workers=workers) as ex:
+            results = list(ex.map(_scan, tasks))
+    else:
+        results = [_scan(t) for t in tasks]
+    for a, n in results:
+        alerts += a
+        rows += n
+
+    alerts.sort(key=lambda a: a.get("ts_ms") or 0)
+    return alerts, {
+        "blocks_total": total,
+        "blocks_in_range": len(in_range),
+        "blocks_scanned": len(candidates),
+        "blocks_skipped_by_zone_maps": len(in_range) - len(candidates),
+        "rows_scanned": rows,
+        "workers": workers,
+        "seconds": round(time.perf_counter() - t0, 4),
+    }
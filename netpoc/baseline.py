@@ -0,0 +1,193 @@
+import os
+import json
+import shutil
+import numpy as np
+import pandas as pd
+
+
+# Per-host behavioral baselines. Flows are rolled up per (src_ip, time
+# bucket) into bytes / flows / distinct peers / distinct ports; each host
+# keeps an EWMA mean and variance of log1p(metric) over the buckets it was
+# active in. A run scores its host windows against the stored state, then
+# folds them in, so the cost is linear in the run's flows and independent of
+# history length. State is a folder of .npy arrays (one row per host).
+
+METRICS = ["bytes", "flows", "peers", "ports"]
+
+DEFAULT_BASELINE = {
+    "bucket_s": 60,
+    "alpha": 0.1,
+    "min_history": 10,   # buckets a host needs before it is scored
+    "min_std": 0.5,      # floor for the std of log1p(metric)
+    "threshold": 4.0,    # window score (max z over metrics) that raises an alert
+}
+
+# flow columns the host windows are built from
+COLUMNS = ["src_ip", "dst_ip", "dst_port", "bidirectional_bytes", "first_seen_ms"]
+
+_ARRAYS = ["hosts", "mean", "var", "n", "last_bucket"]
+
+
+def host_windows(flows_df: pd.DataFrame, bucket_s=60) -> pd.DataFrame:
+    bucket_ms = int(bucket_s * 1000)
+    df = flows_df[flows_df["src_ip"].notna()]
+    bucket = (pd.to_numeric(df["first_seen_ms"], errors="coerce").fillna(0).astype("int64") // bucket_ms) * bucket_ms
+    g = df.assign(bucket_ms=bucket, _b=pd.to_numeric(df["bidirectional_bytes"], errors="coerce").fillna(0)).groupby(
+        ["src_ip", "bucket_ms"], sort=False
+    )
+    return g.agg(
+        bytes=("_b", "sum"),
+        flows=("_b", "size"),
+        peers=("dst_ip", "nunique"),
+        ports=("dst_port", "nunique"),
+    ).reset_index()
+
+
+class BaselineStore:
+    def __init__(self, path, cfg=None):
+        self.path = path
+        meta_path = os.path.join(path, "meta.json")
+        if os.path.exists(meta_path):
+            with open(meta_path, "r", encoding="utf-8") as f:
+                meta = json.load(f)
+            # bucket size / alpha are fixed once a store exists
+            self.cfg = {**DEFAULT_BASELINE, **(cfg or {}), "bucket_s": meta["bucket_s"], "alpha": meta["alpha"]}
+            arrays = {name: np.load(os.path.join(path, name + ".npy")) for name in _ARRAYS}
+            self.hosts = arrays["hosts"].astype(object)
+            self.mean, self.var = arrays["mean"], arrays["var"]
+            self.n, self.last_bucket = arrays["n"], arrays["last_bucket"]
+        else:
+            self.cfg = {**DEFAULT_BASELINE, **(cfg or {})}
+            self.hosts = np.empty(0, dtype=object)
+            self.mean = np.zeros((0, len(METRICS)), dtype=np.float32)
+            self.var = np.zeros((0, len(METRICS)), dtype=np.float32)
+            self.n = np.zeros(0, dtype=np.int32)
+            self.last_bucket = np.full(0, -1, dtype=np.int64)
+        self.new_hosts = 0
+        self.updated = 0
+
+    def _host_rows(self, hosts):
+        idx = pd.Index(self.hosts).get_indexer(hosts)
+        new = pd.unique(hosts[idx < 0])
+        if len(new):
+            k = len(new)
+            self.hosts = np.concatenate([self.hosts, new.astype(object)])
+            self.mean = np.concatenate([self.mean, np.zeros((k, len(METRICS)), dtype=np.float32)])
+            self.var = np.concatenate([self.var, np.zeros((k, len(METRICS)), dtype=np.float32)])
+            self.n = np.concatenate([self.n, np.zeros(k, dtype=np.int32)])
+            self.last_bucket = np.concatenate([self.last_bucket, np.full(k, -1, dtype=np.int64)])
+            self.new_hosts += k
+            idx = pd.Index(self.hosts).get_indexer(hosts)
+        return idx
+
+    def score_update(self, windows: pd.DataFrame, update=True) -> pd.DataFrame:
+        # z per metric against the state before the window; NaN while a host has < min_history buckets
+        out = windows.copy()
+        if len(windows) == 0:
+            for m in METRICS:
+                out[f"z_{m}"] = np.zeros(0)
+            out["score"] = np.zeros(0)
+            return out
+
+        X = np.log1p(windows[METRICS].to_numpy(dtype=np.float64)).astype(np.float32)
+        rows_h = self._host_rows(windows["src_ip"].astype(str).to_numpy(dtype=object))
+        buckets = windows["bucket_ms"].to_numpy(dtype=np.int64)
+        Z = np.full(X.shape, np.nan, dtype=np.float32)
+        alpha, min_std = np.float32(self.cfg["alpha"]), self.cfg["min_std"]
+
+        # one sort, then each bucket is a slice (buckets apply in time order)
+        order = np.argsort(buckets, kind="stable")
+        uniq, starts = np.unique(buckets[order], return_index=True)
+        ends = np.append(starts[1:], len(order))
+        for b, lo, hi in zip(uniq, starts, ends):
+            rows = order[lo:hi]
+            h = rows_h[rows]
+            std = np.maximum(np.sqrt(self.var[h]), min_std)
+            z = (X[rows] - self.mean[h]) / std
+            z[self.n[h] < self.cfg["min_history"]] = np.nan
+            Z[rows] = z
+            if not update:
+                continue
+
+            # buckets already folded in (re-run of the same capture) are scored but not counted twice
+            fresh = b > self.last_bucket[h]
+            h, x = h[fresh], X[rows][fresh]
+            first = self.n[h] == 0
+            self.mean[h[first]] = x[first]
+            hs, xs = h[~first], x[~first]
+            diff = xs - self.mean[hs]
+            incr = alpha * diff
+            self.mean[hs] += incr
+            self.var[hs] = (1 - alpha) * (self.var[hs] + diff * incr)
+            self.n[h] += 1
+            self.last_bucket[h] = b
+            self.updated += len(h)
+
+        for j, m in enumerate(METRICS):
+            out[f"z_{m}"] = Z[:, j]
+        out["score"] = np.nanmax(np.where(np.isnan(Z), -np.inf, Z), axis=1)
+        out.loc[~np.isfinite(out["score"]), "score"] = np.nan
+        return out
+
+    def save(self):
+        tmp = self.path.rstrip("/\\") + ".tmp"
+        shutil.rmtree(tmp, ignore_errors=True)
+        os.makedirs(tmp)
+        arrays = {
+            "hosts": self.hosts.astype(str), "mean": self.mean, "var": self.var,
+            "n": self.n, "last_bucket": self.last_bucket,
+        }
+        for name, arr in arrays.items():
+            np.save(os.path.join(tmp, name + ".npy"), arr)
+        with open(os.path.join(tmp, "meta.json"), "w", encoding="utf-8") as f:
+            json.dump({"bucket_s": self.cfg["bucket_s"], "alpha": self.cfg["alpha"], "metrics": METRICS, "hosts": len(self.hosts)}, f)
+        shutil.rmtree(self.path, ignore_errors=True)
+        os.replace(tmp, self.path)
+        return self.path
+
+
+def baseline_alerts(scored: pd.DataFrame, threshold):
+    hits = scored[scored["score"] >= threshold]
+    alerts = []
+    for row in hits.itertuples(index=False):
+        zs = ", ".join(f"{m} z={getattr(row, 'z_' + m):.1f}" for m in METRICS if np.isfinite(getattr(row, "z_" + m)))
+        alerts.append({
+            "rule_id": "B001",
+            "rule_name": "host_baseline_anomaly",
+            "type": "baseline",
+            "ts_ms": int(row.bucket_ms),
+            "src_ip": row.src_ip,
+            "dst_ip": None,
+            "dst_port": None,
+            "details": f"Host window deviates from its baseline ({zs})",
+            "flow_id": None,
+        })
+    return alerts
+
+
+def run_baseline(path, flows_df: pd.DataFrame, cfg=None, update=True):
+    # -> (flows_df with baseline_score, scored host windows, alerts, summary)
+    store = BaselineStore(path, cfg)
+    windows = host_windows(flows_df, store.cfg["bucket_s"])
+    scored = store.score_update(windows, update=update)
+    if update:
+        store.save()
+
+    bucket_ms = int(store.cfg["bucket_s"] * 1000)
+    key = pd.MultiIndex.from_arrays([scored["src_ip"], scored["bucket_ms"]])
+    fb = (pd.to_numeric(flows_df["first_seen_ms"], errors="coerce").fillna(0).astype("int64") // bucket_ms) * bucket_ms
+    pos = key.get_indexer(pd.MultiIndex.from_arrays([flows_df["src_ip"], fb]))
+    flows_df = flows_df.assign(baseline_score=np.where(pos >= 0, scored["score"].to_numpy()[pos], np.nan))
+
+    alerts = baseline_alerts(scored, store.cfg["threshold"])
+    summary = {
+        "path": path,
+        "hosts": int(len(store.hosts)),
+        "new_hosts": store.new_hosts,
+        "windows": int(len(scored)),
+        "scored_windows": int(scored["score"].notna().sum()),
+        "updated_windows": store.updated,
+        "anomalies": len(alerts),
+        "config": store.cfg,
+    }
+    return flows_df, scored, alerts, summary
@@ -0,0 +1,112 @@
+import time
+import yaml
+import numpy as np
+import pandas as pd
+
+
+# Cheap tiers in front of ML scoring. A flow goes to the model if
+#   tier "rules":     a Python/Sigma rule already alerted on it (flow_id), or
+#   tier "threshold": it passes the vectorized size/port thresholds, or
+#   tier "sample":    it was picked by the random calibration sample.
+# Everything else is dropped before the model sees it.
+
+DEFAULT_CASCADE = {
+    "min_bytes": 5_000,
+    "min_packets": 4,
+    "ignore_ports": [53, 123, 137, 5353],
+    "sample_rate": 0.01,
+    "seed": 7,
+}
+
+TIERS = ["rules", "threshold", "sample"]
+
+# flow columns the prefilters read
+COLUMNS = ["id", "bidirectional_bytes", "bidirectional_packets", "dst_port"]
+
+
+def load_cascade_config(path=None):
+    cfg = dict(DEFAULT_CASCADE)
+    if path:
+        with open(path, "r", encoding="utf-8") as f:
+            cfg.update(yaml.safe_load(f) or {})
+    return cfg
+
+
+def _num(df, col):
+    return pd.to_numeric(df[col], errors="coerce").fillna(0).to_numpy()
+
+
+class Cascade:
+    def __init__(self, cfg):
+        self.cfg = cfg
+        self.rng = np.random.default_rng(cfg.get("seed", 7))
+        self.stats = {t: {"kept": 0, "seconds": 0.0} for t in TIERS}
+        self.flows_in = 0
+        self.ml_flows = 0
+        self.ml_seconds = 0.0
+
+    def select(self, chunk: pd.DataFrame, alert_flow_ids=()):
+        n = len(chunk)
+        self.flows_in += n
+        undecided = np.ones(n, dtype=bool)
+        tier = np.empty(n, dtype=object)
+
+        t = time.perf_counter()
+        hit = chunk["id"].isin(alert_flow_ids).to_numpy() if len(alert_flow_ids) else np.zeros(n, dtype=bool)
+        tier[hit] = "rules"
+        undecided &= ~hit
+        self._tier_done("rules", hit, t)
+
+        t = time.perf_counter()
+        ok = (
+            (_num(chunk, "bidirectional_bytes") >= self.cfg["min_bytes"])
+            & (_num(chunk, "bidirectional_packets") >= self.cfg["min_packets"])
+            & ~np.isin(_num(chunk, "dst_port"), self.cfg["ignore_ports"])
+            & undecided
+        )
+        tier[ok] = "threshold"
+        undecided &= ~ok
+        self._tier_done("threshold", ok, t)
+
+        t = time.perf_counter()
+        sample = undecided & (self.rng.random(n) < self.cfg["sample_rate"])
+        tier[sample] = "sample"
+        undecided &= ~sample
+        self._tier_done("sample", sample, t)
+
+        kept = chunk[~undecided].copy()
+        kept["cascade_tier"] = tier[~undecided]
+        return kept
+
+    def _tier_done(self, name, mask, t0):
+        self.stats[name]["kept"] += int(mask.sum())
+        self.stats[name]["seconds"] += time.perf_counter() - t0
+
+    def record_ml(self, n_flows, seconds):
+        self.ml_flows += n_flows
+        self.ml_seconds += seconds
+
+    def summary(self):
+        rows = []
+        remaining = self.flows_in
+        for name in TIERS:
+            kept = self.stats[name]["kept"]
+            rows.append({
+                "tier": name,
+                "flows_in": remaining,
+                "to_ml": kept,
+                "to_next_tier": remaining - kept,
+                "seconds": round(self.stats[name]["seconds"], 4),
+            })
+            remaining -= kept
+        per_flow = self.ml_seconds / self.ml_flows if self.ml_flows else 0.0
+        return {
+            "tiers": rows,
+            "flows_in": self.flows_in,
+            "ml_flows": self.ml_flows,
+            "dropped": remaining,
+            "ml_seconds": round(self.ml_seconds, 4),
+            # what the dropped flows would have cost at the measured per-flow ML cost
+            "est_seconds_saved": round(per_flow * remaining, 4),
+            "config": self.cfg,
+        }
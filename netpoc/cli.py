@@ -1,12 +1,16 @@
-import os
 import click
 
-from .flows import pcap_to_flows_df
-from .detection_rules import run_python_rules
-from .sigma_rules import load_sigma_rules, run_sigma_rules
-from .ml import train_or_load_model, predict_with_model, evaluate_model
-from .enrich import enrich_suspicious_ips
-from .report import build_report
+# Subsystems (nfstream, pandas, sklearn, matplotlib, folium, requests) are
+# imported inside the commands so `--help` and small commands start fast.
+# bench_startup.py checks the budget.
+
+
+def _ingest_line(s):
+    rate = f", {s['mb_per_s']} MB/s uncompressed" if s.get("mb_per_s") is not None else ""
+    return (
+        f"Ingest: {s['inputs']} file(s), {s['compressed_bytes'] / 1e6:.1f} MB read -> "
+        f"{s['pcap_bytes'] / 1e6:.1f} MB pcap in {s['seconds']}s{rate}"
+    )
 
 
 @click.group()
@@ -15,64 +19,377 @@ def cli():
 
 
 @cli.command()
-@click.option("--pcap", required=True, type=click.Path(exists=True))
+@click.option("--pcap", required=True, multiple=True, type=click.Path(exists=True), help="pcap, .pcap.gz/.zst/.bz2/.xz, or a folder; repeat for rotated files (in capture order)")
 @click.option("--out", default="out", show_default=True)
 @click.option("--sigma", default=None, help="Folder or YAML file with Sigma rules")
 @click.option("--model", default="out/model.joblib", show_default=True)
 @click.option("--train-csv", default=None, help="CSV with labeled flows to train ML (optional)")
+@click.option("--force-train", is_flag=True, default=False, help="With --train-csv: retrain even if --model already exists (overwrites it)")
 @click.option("--no-ml", is_flag=True, default=False)
 @click.option("--no-enrich", is_flag=True, default=False)
-def analyze(pcap, out, sigma, model, train_csv, no_ml, no_enrich):
-    os.makedirs(out, exist_ok=True)
+@click.option("--plot-workers", default=None, type=int, help="Processes used to render report plots (default: CPU count)")
+@click.option("--no-store", is_flag=True, default=False, help="Skip writing the indexed SQLite store used by the dashboard")
+@click.option("--stream", is_flag=True, default=False, help="Append alerts to out/alerts_stream/ while flows are extracted (live dashboard)")
+@click.option("--chunk-size", default=50_000, show_default=True, help="Flows per chunk for --stream extraction and ML scoring")
+@click.option("--cascade", is_flag=True, default=False, help="Only ML-score flows that pass cheap rule/threshold prefilters (+ a calibration sample)")
+@click.option("--cascade-config", default=None, type=click.Path(exists=True), help="YAML overriding cascade thresholds (implies --cascade)")
+@click.option("--index-pcap", is_flag=True, default=False, help="Write a packet index (out/pcap_index.npy) for `netpoc carve`")
+@click.option("--no-prune", is_flag=True, default=False, help="Extract all base flow columns, not only those the enabled stages read (pruned ones are left out of flows.csv and the store)")
+@click.option("--no-aggregate", is_flag=True, default=False, help="Keep one alert per matching flow instead of aggregated incidents")
+@click.option("--aggregate-config", default=None, type=click.Path(exists=True), help="YAML with aggregation key/window and per-rule suppression/throttling")
+@click.option("--baseline", default=None, type=click.Path(), help="Per-host baseline store (folder); scored and updated by this run")
+@click.option("--baseline-readonly", is_flag=True, default=False, help="Score against --baseline without updating it")
+@click.option("--baseline-threshold", default=None, type=float, help="Host window score that raises a B001 alert (default 4.0)")
+@click.option("--archive", default=None, type=click.Path(), help="Flow archive (folder) to append this run's flows to, for `netpoc hunt`")
+def analyze(pcap, out, sigma, model, train_csv, force_train, no_ml, no_enrich, plot_workers, no_store, stream, chunk_size, cascade, cascade_config, index_pcap, no_prune,
+            no_aggregate, aggregate_config, baseline, baseline_readonly, baseline_threshold, archive):
+    from .pipeline import run_analysis
 
-    flows_df = pcap_to_flows_df(pcap)
-    py_alerts = run_python_rules(flows_df)
+    sigma_rules = []
+    if sigma:
+        from .sigma_rules import load_sigma_rules
 
-    sigma_rules = load_sigma_rules(sigma) if sigma else []
-    sigma_alerts = run_sigma_rules(flows_df, sigma_rules) if sigma_rules else []
-
-    ml_info = {}
+        sigma_rules = load_sigma_rules(sigma)
+    scoring_model = None
     if not no_ml:
-        model_obj, model_meta = train_or_load_model(model_path=model, train_csv=train_csv)
-        preds = predict_with_model(model_obj, flows_df, model_meta)
-        ml_info["preds"] = preds
-        if train_csv:
-            ml_info["eval"] = evaluate_model(model_obj, train_csv, model_meta)
-
-    all_alerts = py_alerts + sigma_alerts
-
-    enrich = {}
-    if not no_enrich:
-        enrich = enrich_suspicious_ips(all_alerts)
-
-    report_paths = build_report(
-        out_dir=out,
-        pcap_path=pcap,
-        flows_df=flows_df,
-        python_alerts=py_alerts,
-        sigma_alerts=sigma_alerts,
-        ml_info=ml_info,
-        enrichment=enrich,
-    )
+        from .ml import load_scoring_model
+
+        try:
+            scoring_model = load_scoring_model(model_path=model, train_csv=train_csv, force_train=force_train)
+        except ValueError as e:
+            raise click.ClickException(str(e))
+    cascade_cfg = None
+    if cascade or cascade_config:
+        from .cascade import load_cascade_config
+
+        cascade_cfg = load_cascade_config(cascade_config)
+    aggregate_cfg = None
+    if not no_aggregate:
+        from .aggregate import load_aggregation_config
+
+        aggregate_cfg = load_aggregation_config(aggregate_config)
+
+    try:
+        result = run_analysis(
+            out,
+            pcap=list(pcap),
+            sigma_rules=sigma_rules,
+            model=scoring_model,
+            train_csv=train_csv,
+            enrich=not no_enrich,
+            plot_workers=plot_workers,
+            store=not no_store,
+            stream=stream,
+            chunk_size=chunk_size,
+            cascade_cfg=cascade_cfg,
+            index_pcap=index_pcap,
+            prune_columns=not no_prune,
+            aggregate_cfg=aggregate_cfg,
+            baseline=baseline,
+            baseline_cfg={"threshold": baseline_threshold} if baseline_threshold is not None else None,
+            baseline_update=not baseline_readonly,
+            archive=archive,
+        )
+    except ValueError as e:
+        raise click.ClickException(str(e))
+    report_paths = result["report"]
 
     click.echo(f"OK. Report: {report_paths['report_md']}")
+    click.echo(f"Alerts: {result['alerts']} (from {result['raw_alerts']} rule hits)")
     if report_paths.get("map_html"):
         click.echo(f"Map: {report_paths['map_html']}")
+    if result["baseline"]:
+        b = result["baseline"]
+        click.echo(f"Baseline: {b['hosts']} hosts, {b['scored_windows']}/{b['windows']} windows scored, {b['anomalies']} anomalies")
+    if result["archive"]:
+        a = result["archive"]
+        if a["skipped"]:
+            click.echo(f"Archive: capture already in {a['path']}, not added again")
+        else:
+            click.echo(f"Archive: {a['flows']} flows in {a['blocks']} blocks -> {a['path']}")
+    if result["ingest"]:
+        click.echo(_ingest_line(result["ingest"]))
+    idx = result["pcap_index"]
+    if idx and idx.get("error"):
+        click.echo(f"Packet index skipped: {idx['error']}")
+    elif idx:
+        click.echo(f"Packet index: {idx['indexed']}/{idx['packets']} packets, {idx['index_bytes']} bytes ({idx['build_s']}s)")
 
 
 @cli.command()
-@click.option("--pcap", required=True, type=click.Path(exists=True))
+@click.option("--host", default="127.0.0.1", show_default=True)
+@click.option("--port", default=8765, show_default=True)
+@click.option("--socket", "unix_socket", default=None, help="Listen on a Unix socket instead of TCP")
+@click.option("--jobs-dir", default="out/jobs", show_default=True, help="Default output root, one folder per job")
+@click.option("--sigma", default=None, help="Folder or YAML file with Sigma rules")
+@click.option("--model", default="out/model.joblib", show_default=True)
+@click.option("--no-ml", is_flag=True, default=False)
+@click.option("--no-enrich", is_flag=True, default=False)
+@click.option("--cascade-config", default=None, type=click.Path(exists=True), help="Cascade thresholds for jobs submitted with \"cascade\": true")
+@click.option("--no-aggregate", is_flag=True, default=False)
+@click.option("--aggregate-config", default=None, type=click.Path(exists=True))
+@click.option("--workers", default=2, show_default=True)
+@click.option("--queue-size", default=16, show_default=True, help="Queued jobs before submissions get HTTP 503")
+@click.option("--chunk-size", default=50_000, show_default=True)
+def serve(host, port, unix_socket, jobs_dir, sigma, model, no_ml, no_enrich, cascade_config, no_aggregate, aggregate_config,
+          workers, queue_size, chunk_size):
+    from .server import AnalysisService, make_server
+
+    try:
+        service = AnalysisService(
+            jobs_dir=jobs_dir,
+            sigma=sigma,
+            model_path=None if no_ml else model,
+            workers=workers,
+            queue_size=queue_size,
+            enrich=not no_enrich,
+            cascade_config=cascade_config,
+            aggregate=not no_aggregate,
+            aggregate_config=aggregate_config,
+            chunk_size=chunk_size,
+        )
+    except ValueError as e:
+        raise click.ClickException(str(e))
+    httpd = make_server(service, host=host, port=port, unix_socket=unix_socket)
+    where = unix_socket or f"http://{host}:{port}"
+    click.echo(f"netpoc serve: {where} (workers={workers}, queue={queue_size}, warm-up {service.warmup_seconds}s)")
+    try:
+        httpd.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        httpd.server_close()
+
+
+@cli.command()
+@click.option("--host", default="127.0.0.1", show_default=True)
+@click.option("--port", default=8770, show_default=True)
+def worker(host, port):
+    from .cluster import make_worker_server
+
+    server = make_worker_server(host, port)
+    click.echo(f"netpoc worker: http://{host}:{server.server_address[1]}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+@cli.command()
+@click.option("--pcap", required=True, multiple=True, type=click.Path(exists=True), help="Capture per task (a folder = one rotated capture); repeatable")
+@click.option("--worker", "worker_addrs", multiple=True, help="host:port of a running `netpoc worker` (repeatable)")
+@click.option("--local-workers", default=0, show_default=True, help="Start this many worker processes on this machine")
+@click.option("--partitions", default=None, type=int, help="Host-key partitions for the reduce step (default: one per worker)")
+@click.option("--out", default="out", show_default=True)
+@click.option("--sigma", default=None, help="Folder or YAML file with Sigma rules")
+@click.option("--model", default="out/model.joblib", show_default=True, help="Model bundle; workers load it from the same path")
+@click.option("--no-ml", is_flag=True, default=False)
+@click.option("--no-enrich", is_flag=True, default=False)
+@click.option("--plot-workers", default=None, type=int)
+@click.option("--no-store", is_flag=True, default=False)
+@click.option("--no-prune", is_flag=True, default=False)
+@click.option("--no-aggregate", is_flag=True, default=False)
+@click.option("--aggregate-config", default=None, type=click.Path(exists=True))
+def analyze_cluster(pcap, worker_addrs, local_workers, partitions, out, sigma, model, no_ml, no_enrich, plot_workers, no_store, no_prune,
+                    no_aggregate, aggregate_config):
+    import os
+    from .cluster import run_cluster, start_local_workers, worker_url
+
+    if not worker_addrs and not local_workers:
+        raise click.UsageError("Give --worker and/or --local-workers")
+    sigma_rules = []
+    if sigma:
+        from .sigma_rules import load_sigma_rules
+
+        sigma_rules = load_sigma_rules(sigma)
+    aggregate_cfg = None
+    if not no_aggregate:
+        from .aggregate import load_aggregation_config
+
+        aggregate_cfg = load_aggregation_config(aggregate_config)
+    if not no_ml and not os.path.exists(model):
+        raise click.BadParameter(f"{model} not found (train it first, or --no-ml)", param_hint="--model")
+
+    workers = [worker_url(a) for a in worker_addrs]
+    procs = []
+    try:
+        if local_workers:
+            urls, procs = start_local_workers(local_workers)
+            workers += urls
+        result = run_cluster(
+            out, [os.path.abspath(p) for p in pcap], workers, sigma_rules=sigma_rules, model_path=None if no_ml else model,
+            enrich=not no_enrich, plot_workers=plot_workers, store=not no_store, aggregate_cfg=aggregate_cfg,
+            prune_columns=not no_prune, partitions=partitions,
+        )
+    except (RuntimeError, ValueError) as e:
+        raise click.ClickException(str(e))
+    finally:
+        for p in procs:
+            p.terminate()
+
+    click.echo(f"OK. Report: {result['report']['report_md']}")
+    click.echo(f"Alerts: {result['alerts']} (from {result['raw_alerts']} rule hits)")
+    c = result["cluster"]
+    click.echo(f"Flows: {result['flows']} from {len(c['tasks'])} captures on {len(c['workers'])} workers, "
+               f"{c['partitions']} partitions ({c['partial_bytes']} bytes of partials reduced)")
+    click.echo(f"Timings: {result['timings']}")
+
+
+@cli.command()
+@click.option("--pcap", required=True, multiple=True, type=click.Path(exists=True), help="pcap, .pcap.gz/.zst/.bz2/.xz, or a folder; repeat for rotated files (in capture order)")
 @click.option("--csv-out", required=True, type=click.Path())
-def export_csv(pcap, csv_out):
-    df = pcap_to_flows_df(pcap)
+@click.option("--extra", multiple=True, type=click.Choice(["stats", "app"]), help="Also export NFStream statistical / application columns")
+def export_csv(pcap, csv_out, extra):
+    from .flows import FLOW_COLS, STAT_COLS, APP_COLS, pcap_to_flows_df
+
+    columns = FLOW_COLS + (STAT_COLS if "stats" in extra else []) + (APP_COLS if "app" in extra else [])
+    ingest = {}
+    try:
+        df = pcap_to_flows_df(list(pcap), ingest_stats=ingest, columns=columns)
+    except ValueError as e:
+        raise click.ClickException(str(e))
     df.to_csv(csv_out, index=False)
     click.echo(f"Saved: {csv_out}")
+    click.echo(_ingest_line(ingest))
+
+
+@cli.command()
+@click.option("--out", default="out", show_default=True, help="Analyze output folder with pcap_index.npy")
+@click.option("--flow-id", "flow_ids", multiple=True, type=int, help="Flow id from flows.csv (repeatable)")
+@click.option("--alert", default=None, type=int, help="Alert position in alerts.json (0-based)")
+@click.option("--pcap-out", required=True, type=click.Path())
+def carve(out, flow_ids, alert, pcap_out):
+    from .pcap_index import lookup_flows, carve_flows
+
+    if not flow_ids and alert is None:
+        raise click.UsageError("Give --flow-id and/or --alert")
+    try:
+        flows = lookup_flows(out, flow_ids=flow_ids, alert=alert)
+        if not flows:
+            raise click.ClickException("No matching flows")
+        res = carve_flows(out, flows, pcap_out)
+    except (OSError, ValueError) as e:
+        raise click.ClickException(str(e))
+    click.echo(f"Saved: {res['path']} ({res['packets']} packets from {res['flows']} flows, {res['seconds'] * 1000:.1f} ms)")
+
+
+@cli.command()
+@click.option("--archive", required=True, type=click.Path(exists=True, file_okay=False), help="Flow archive written by `analyze --archive`")
+@click.option("--rules", "sigma", multiple=True, type=click.Path(exists=True), help="Folder or YAML file with Sigma rules (repeatable)")
+@click.option("--python-rules/--no-python-rules", default=True, show_default=True, help="Also run the per-flow Python rules")
+@click.option("--since", default=None, help="Start of the hunt: 30d / 12h / 90m ago, epoch ms or ISO date (UTC)")
+@click.option("--until", default=None, help="End of the hunt (exclusive), same formats as --since")
+@click.option("--out", default="out/hunt", show_default=True)
+@click.option("--workers", default=None, type=int, help="Processes scanning blocks (default: CPU count)")
+@click.option("--no-aggregate", is_flag=True, default=False)
+@click.option("--aggregate-config", default=None, type=click.Path(exists=True))
+def hunt(archive, sigma, python_rules, since, until, out, workers, no_aggregate, aggregate_config):
+    import os
+    import json
+    from .archive import hunt as run_hunt, parse_time
+    from .sigma_rules import load_sigma_rules
+
+    sigma_rules = [r for path in sigma for r in load_sigma_rules(path)]
+    if not sigma_rules and not python_rules:
+        raise click.UsageError("Give --rules and/or --python-rules")
+    try:
+        since_ms, until_ms = parse_time(since), parse_time(until)
+    except ValueError as e:
+        raise click.BadParameter(str(e))
+
+    alerts, stats = run_hunt(archive, sigma_rules, python_rules, since_ms=since_ms, until_ms=until_ms, workers=workers)
+    stats["raw_alerts"] = len(alerts)
+    if not no_aggregate:
+        from .aggregate import aggregate_alerts, load_aggregation_config
+
+        alerts, stats["aggregation"] = aggregate_alerts(alerts, None, load_aggregation_config(aggregate_config))
+
+    os.makedirs(out, exist_ok=True)
+    alerts_json = os.path.join(out, "alerts.json")
+    with open(alerts_json, "w", encoding="utf-8") as f:
+        json.dump(alerts, f, indent=2, ensure_ascii=False, default=lambda v: v.item() if hasattr(v, "item") else str(v))
+    stats.update(archive=archive, since_ms=since_ms, until_ms=until_ms, sigma_rules=len(sigma_rules), python_rules=python_rules)
+    with open(os.path.join(out, "hunt.json"), "w", encoding="utf-8") as f:
+        json.dump(stats, f, indent=2)
+
+    click.echo(f"Alerts: {len(alerts)} (from {stats['raw_alerts']} rule hits) -> {alerts_json}")
+    click.echo(
+        f"Blocks: {stats['blocks_scanned']} scanned, {stats['blocks_skipped_by_zone_maps']} skipped by zone maps, "
+        f"{stats['blocks_total'] - stats['blocks_in_range']} outside the time range ({stats['blocks_total']} total); "
+        f"{stats['rows_scanned']} flows in {stats['seconds']}s"
+    )
+
+
+@cli.command()
+@click.option("--manifest", default=None, type=click.Path(exists=True), help="YAML with sources and their labels / label rules")
+@click.option("--source", "sources", multiple=True, help="PATH=LABEL: capture, folder, glob, flows CSV, netpoc.sqlite or flow archive (repeatable)")
+@click.option("--out", default="out/dataset", show_default=True)
+@click.option("--per-class", default=200_000, show_default=True, help="Distinct flows sampled per label")
+@click.option("--no-balance", is_flag=True, default=False, help="Keep up to --per-class flows of every label instead of trimming all to the smallest class")
+@click.option("--shard-rows", default=100_000, show_default=True)
+@click.option("--workers", default=None, type=int, help="Sources read in parallel (default: CPU count)")
+@click.option("--chunk-size", default=50_000, show_default=True)
+@click.option("--extra", multiple=True, type=click.Choice(["stats", "app"]), help="Also keep NFStream statistical / application columns")
+@click.option("--seed", default=7, show_default=True)
+def build_dataset(manifest, sources, out, per_class, no_balance, shard_rows, workers, chunk_size, extra, seed):
+    from .dataset import build_dataset as run_build, load_manifest, parse_source_arg
+
+    try:
+        specs = load_manifest(manifest) if manifest else []
+        specs += [parse_source_arg(s) for s in sources]
+    except ValueError as e:
+        raise click.BadParameter(str(e))
+    if not specs:
+        raise click.UsageError("Give --manifest and/or --source")
+
+    def progress(s):
+        click.echo(f"  {s['path']}: {s['flows']} flows, labels {s['by_label']}, {s['unlabeled']} unlabeled ({s['seconds']}s)")
+
+    try:
+        meta = run_build(out, specs, per_class=per_class, balance=not no_balance, shard_rows=shard_rows, workers=workers,
+                         chunk_size=chunk_size, extra=extra, seed=seed, progress=progress)
+    except (OSError, ValueError) as e:
+        raise click.ClickException(str(e))
+    click.echo(f"Saved: {out} ({meta['rows']} rows in {len(meta['shards'])} shards, {meta['seconds']}s)")
+    for label, c in meta["classes"].items():
+        click.echo(f"  label {label}: {c['rows']} rows (from {c['flows']} flows, ~{c['distinct_est']} distinct)")
+    if meta["label_conflicts"]:
+        click.echo(f"  {meta['label_conflicts']} flows had several labels (kept the highest)")
 
 
 @cli.command()
 @click.option("--train-csv", required=True, type=click.Path(exists=True))
 @click.option("--model-out", default="out/model.joblib", show_default=True)
-def train(train_csv, model_out):
-    model_obj, meta = train_or_load_model(model_path=model_out, train_csv=train_csv, force_train=True)
-    click.echo(f"Trained. Model: {model_out}")
+@click.option("--out-of-core", is_flag=True, default=False, help="Stream the CSV/SQLite source in chunks (incremental linear model)")
+@click.option("--chunk-size", default=100_000, show_default=True, help="Rows per chunk with --out-of-core")
+@click.option("--holdout", default=0.2, show_default=True, help="Fraction of rows held out for evaluation with --out-of-core")
+@click.option("--max-holdout", default=200_000, show_default=True, help="Held-out rows kept (reservoir sample) with --out-of-core")
+def train(train_csv, model_out, out_of_core, chunk_size, holdout, max_holdout):
+    from .ml import train_or_load_model, train_streaming
+    from .forest import forest_path
+
+    if out_of_core:
+        def progress(s):
+            rss = f"{s['peak_rss_mb']:.0f} MB" if s["peak_rss_mb"] is not None else "n/a"
+            click.echo(f"  {s['rows']} rows, {s['rows_per_s']:.0f} rows/s, peak RSS {rss}")
+
+        try:
+            model_obj, meta = train_streaming(
+                model_out, train_csv, chunk_size=chunk_size, holdout=holdout, max_holdout=max_holdout, progress=progress,
+            )
+        except ValueError as e:
+            raise click.ClickException(str(e))
+        click.echo(f"Trained (out-of-core). Model: {model_out}")
+        click.echo(f"Stats: {meta['train_stats']}")
+    else:
+        try:
+            model_obj, meta = train_or_load_model(model_path=model_out, train_csv=train_csv, force_train=True)
+        except ValueError as e:
+            raise click.ClickException(str(e))
+        click.echo(f"Trained. Model: {model_out}")
+        click.echo(f"Forest (numpy scoring): {forest_path(model_out)}")
     click.echo(f"Features: {meta['features']}")
+    if meta.get("eval"):
+        click.echo(f"Held-out eval: {meta['eval']}")
@@ -0,0 +1,443 @@
+import io
+import os
+import json
+import time
+import queue
+import threading
+import traceback
+import urllib.request
+import multiprocessing
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy as np
+import pandas as pd
+
+from .flows import pcap_to_flows_df
+from .detection_rules import run_flow_rules, dst_flow_counts, burst_alerts
+from .sigma_rules import run_sigma_rules
+
+
+# Sharded analyze: a coordinator spreads captures over workers (`netpoc worker`,
+# local processes or other hosts over TCP) and merges their results into the
+# usual out/ artifacts.
+#
+#   1. extract (one capture per task, on whichever worker is free): flows,
+#      per-flow Python/Sigma rules and ML scores, plus per-host partial
+#      aggregates hash-partitioned by host key (R010 flow counts by dst_ip,
+#      the pair summary by src_ip); everything stays on the worker
+#   2. reduce (partition p on worker p % W): pulls partition p from every
+#      worker and merges it; only these per-key partials cross the network,
+#      raw flows are never shuffled between workers
+#   3. merge (coordinator): collects each task's flows/alerts/predictions in
+#      task order (flow ids offset to stay unique), R010 from the reduced
+#      counts, the pair summary from the reduced sums, then the aggregation,
+#      enrichment and report stages of a normal analyze
+#
+# Only extraction, per-flow rules and scoring are spread out: step 3 still
+# pulls every flow to the coordinator (flows.csv, the store, alert aggregation
+# and the report are written there), so its memory and the merge stages grow
+# with the total flow count.
+#
+# Capture paths are opened by the workers, so remote workers need them on
+# shared storage. Payloads are .npz (no pickle) over HTTP.
+#
+#   POST /extract     {"job", "task", "pcap", "columns", "partitions", "sigma_rules", "model"}
+#   GET  /partials/<job>/<p>
+#   POST /reduce      {"job", "partition", "peers"}
+#   GET  /results/<job>/<task>
+#   DELETE /jobs/<job>
+#   GET  /health
+
+_SEP = "::"
+PAIR_SUMS = ["flows", "packets", "bytes"]
+REQUEST_TIMEOUT_S = 60
+TASK_TIMEOUT_S = 3600  # /extract and /reduce answer once the work is done
+
+
+# ---------- Payloads ----------
+
+def pack(frames: dict, meta=None) -> bytes:
+    arrays = {"__meta__": np.array(json.dumps(meta or {}, default=_json_default))}
+    for name, df in frames.items():
+        arrays[f"{name}{_SEP}__columns__"] = np.array(list(df.columns), dtype=str)
+        for c in df.columns:
+            col = df[c]
+            if pd.api.types.is_string_dtype(col.dtype) or pd.api.types.is_object_dtype(col.dtype):
+                null = col.isna().to_numpy()
+                arrays[f"{name}{_SEP}{c}{_SEP}null"] = null
+                arrays[f"{name}{_SEP}{c}{_SEP}str"] = np.where(null, "", col.astype(str).to_numpy()).astype(str)
+            else:
+                arrays[f"{name}{_SEP}{c}"] = col.to_numpy()
+    buf = io.BytesIO()
+    np.savez(buf, **arrays)
+    return buf.getvalue()
+
+
+def unpack(data: bytes):
+    z = np.load(io.BytesIO(data), allow_pickle=False)
+    frames = {}
+    for key in z.files:
+        if key.endswith(_SEP + "__columns__"):
+            name = key[: -len(_SEP + "__columns__")]
+            cols = {}
+            for c in z[key].tolist():
+                if f"{name}{_SEP}{c}{_SEP}str" in z.files:
+                    s = z[f"{name}{_SEP}{c}{_SEP}str"].astype(object)
+                    s[z[f"{name}{_SEP}{c}{_SEP}null"]] = None
+                    cols[c] = s
+                else:
+                    cols[c] = z[f"{name}{_SEP}{c}"]
+            frames[name] = pd.DataFrame(cols, columns=z[key].tolist())
+    return frames, json.loads(str(z["__meta__"]))
+
+
+def _json_default(v):
+    return v.item() if hasattr(v, "item") else str(v)
+
+
+def partition_of(values: pd.Series, partitions):
+    # stable across processes/hosts (fixed hash key)
+    return (pd.util.hash_array(values.astype(str).to_numpy(dtype=object)) % np.uint64(partitions)).astype(np.int64)
+
+
+# ---------- Worker ----------
+
+class Worker:
+    def __init__(self):
+        self.jobs = {}
+        self.models = {}
+        self.lock = threading.Lock()
+
+    def _model(self, path):
+        with self.lock:
+            if path not in self.models:
+                from .ml import load_scoring_model
+
+                self.models[path] = load_scoring_model(model_path=path)
+            return self.models[path]
+
+    def extract(self, spec):
+        t0 = time.perf_counter()
+        ingest = {}
+        flows_df = pcap_to_flows_df(spec["pcap"], ingest_stats=ingest, columns=spec["columns"])
+        t_extract = time.perf_counter() - t0
+
+        alerts = run_flow_rules(flows_df)
+        if spec.get("sigma_rules"):
+            alerts += run_sigma_rules(flows_df, spec["sigma_rules"])
+        preds = None
+        if spec.get("model"):
+            from .ml import predict_with_model
+
+            model_obj, model_meta = self._model(spec["model"])
+            preds = predict_with_model(model_obj, flows_df, model_meta)
+
+        # per-host partials, partitioned by the key their aggregation groups on
+        P = spec["partitions"]
+        dst = dst_flow_counts(flows_df).rename("count").reset_index()
+        pairs = flows_df.groupby(["src_ip", "dst_ip"], dropna=False).agg(
+            flows=("id", "count"),
+            packets=("bidirectional_packets", "sum"),
+            bytes=("bidirectional_bytes", "sum"),
+        ).reset_index()
+        dst["p"] = partition_of(dst["dst_ip"], P)
+        pairs["p"] = partition_of(pairs["src_ip"], P)
+
+        task = {
+            "flows": flows_df,
+            "alerts": alerts,
+            "preds": preds,
+            "dst": dst,
+            "pairs": pairs,
+        }
+        with self.lock:
+            self.jobs.setdefault(spec["job"], {})[spec["task"]] = task
+        ts = pd.to_numeric(flows_df["first_seen_ms"], errors="coerce")
+        return {
+            "task": spec["task"],
+            "flows": int(len(flows_df)),
+            "alerts": len(alerts),
+            "first_seen_ms": int(ts.min()) if len(ts) and ts.notna().any() else None,
+            "ingest": ingest,
+            "extract_s": round(t_extract, 4),
+            "seconds": round(time.perf_counter() - t0, 4),
+        }
+
+    def partials(self, job, p):
+        with self.lock:
+            tasks = list(self.jobs.get(job, {}).values())
+        dst = pd.concat([t["dst"][t["dst"]["p"] == p] for t in tasks], ignore_index=True) if tasks else pd.DataFrame()
+        pairs = pd.concat([t["pairs"][t["pairs"]["p"] == p] for t in tasks], ignore_index=True) if tasks else pd.DataFrame()
+        return pack({"dst": dst.drop(columns="p", errors="ignore"), "pairs": pairs.drop(columns="p", errors="ignore")})
+
+    def reduce(self, spec):
+        dst, pairs, moved = [], [], 0
+        for peer in spec["peers"]:
+            data = _get(f"{peer}/partials/{spec['job']}/{spec['partition']}")
+            moved += len(data)
+            frames, _ = unpack(data)
+            dst.append(frames["dst"])
+            pairs.append(frames["pairs"])
+        dst = pd.concat(dst, ignore_index=True)
+        pairs = pd.concat(pairs, ignore_index=True)
+        by_dst = dst.groupby("dst_ip")["count"].sum() if len(dst) else pd.Series(dtype="int64", index=pd.Index([], name="dst_ip"))
+        # R010 keeps the global top 10, which is within the union of each partition's top 10
+        top = by_dst.sort_values(ascending=False).head(10).rename("count").reset_index()
+        if len(pairs):
+            pairs = pairs.groupby(["src_ip", "dst_ip"], dropna=False)[PAIR_SUMS].sum().reset_index()
+        return pack({"dst": top, "pairs": pairs}, {"partial_bytes": moved})
+
+    def results(self, job, task):
+        with self.lock:
+            t = self.jobs[job][task]
+        frames = {"flows": t["flows"]}
+        if t["preds"] is not None:
+            frames["preds"] = t["preds"]
+        return pack(frames, {"alerts": t["alerts"]})
+
+    def drop(self, job):
+        with self.lock:
+            self.jobs.pop(job, None)
+
+
+def _make_handler(worker: Worker):
+    class Handler(BaseHTTPRequestHandler):
+        def _send(self, code, body, ctype="application/json"):
+            if not isinstance(body, bytes):
+                body = json.dumps(body, default=_json_default).encode("utf-8")
+            self.send_response(code)
+            self.send_header("Content-Type", ctype)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def _call(self, fn, *args):
+            try:
+                out = fn(*args)
+            except KeyError as e:
+                return self._send(404, {"error": f"unknown {e}"})
+            except Exception as e:
+                traceback.print_exc()
+                return self._send(500, {"error": f"{type(e).__name__}: {e}"})
+            if isinstance(out, bytes):
+                return self._send(200, out, "application/octet-stream")
+            return self._send(200, out)
+
+        def do_GET(self):
+            parts = [p for p in self.path.split("?")[0].split("/") if p]
+            if parts == ["health"]:
+                return self._send(200, {"jobs": len(worker.jobs), "pid": os.getpid()})
+            if len(parts) == 3 and parts[0] == "partials":
+                return self._call(worker.partials, parts[1], int(parts[2]))
+            if len(parts) == 3 and parts[0] == "results":
+                return self._call(worker.results, parts[1], int(parts[2]))
+            return self._send(404, {"error": "not found"})
+
+        def do_POST(self):
+            length = int(self.headers.get("Content-Length") or 0)
+            spec = json.loads(self.rfile.read(length) or b"{}")
+            path = self.path.rstrip("/")
+            if path == "/extract":
+                return self._call(worker.extract, spec)
+            if path == "/reduce":
+                return self._call(worker.reduce, spec)
+            return self._send(404, {"error": "not found"})
+
+        def do_DELETE(self):
+            parts = [p for p in self.path.split("/") if p]
+            if len(parts) == 2 and parts[0] == "jobs":
+                worker.drop(parts[1])
+                return self._send(200, {"dropped": parts[1]})
+            return self._send(404, {"error": "not found"})
+
+        def log_message(self, fmt, *args):
+            pass
+
+    return Handler
+
+
+def make_worker_server(host="127.0.0.1", port=8770):
+    return ThreadingHTTPServer((host, port), _make_handler(Worker()))
+
+
+def _serve_local(ready):
+    server = make_worker_server("127.0.0.1", 0)
+    ready.put(server.server_address[1])
+    server.serve_forever()
+
+
+def start_local_workers(n):
+    # -> (urls, processes); spawn keeps each worker independent of the coordinator's state.
+    # Not daemonic (NFStream starts its own meter processes): the caller terminates them.
+    ctx = multiprocessing.get_context("spawn")
+    ready = ctx.Queue()
+    procs = [ctx.Process(target=_serve_local, args=(ready,), name=f"netpoc-worker-{i}") for i in range(n)]
+    try:
+        for p in procs:
+            p.start()
+        urls = [f"http://127.0.0.1:{ready.get(timeout=60)}" for _ in procs]
+    except BaseException as e:
+        # the caller never gets these processes, so they are stopped here
+        for p in procs:
+            if p.is_alive():
+                p.terminate()
+        if isinstance(e, queue.Empty):
+            raise RuntimeError(f"{n} local workers did not start within 60s") from None
+        raise
+    return urls, procs
+
+
+# ---------- Coordinator ----------
+
+def _request(url, payload=None, method=None, timeout=REQUEST_TIMEOUT_S):
+    data = json.dumps(payload, default=_json_default).encode("utf-8") if payload is not None else None
+    req = urllib.request.Request(url, data=data, method=method, headers={"Content-Type": "application/json"})
+    try:
+        with urllib.request.urlopen(req, timeout=timeout) as resp:
+            return resp.read()
+    except urllib.error.HTTPError as e:
+        body = e.read().decode("utf-8", "replace")
+        try:
+            body = json.loads(body).get("error", body)
+        except ValueError:
+            pass
+        raise RuntimeError(f"{url}: {body}") from None
+    except urllib.error.URLError as e:
+        raise RuntimeError(f"{url}: {e.reason}") from None
+    except TimeoutError:
+        raise RuntimeError(f"{url}: no response after {timeout}s") from None
+
+
+def _get(url):
+    return _request(url)
+
+
+def _post(url, payload, timeout=REQUEST_TIMEOUT_S):
+    return _request(url, payload, "POST", timeout)
+
+
+def worker_url(addr):
+    return addr.rstrip("/") if addr.startswith("http") else f"http://{addr}"
+
+
+def run_cluster(out, captures, workers, sigma_rules=(), model_path=None, enrich=True, plot_workers=None, store=True,
+                aggregate_cfg=None, prune_columns=True, partitions=None):
+    from .flows import FLOW_COLS, ALL_COLS
+    from .ingest import describe_source
+    from .pipeline import _required_columns, _timed, finish_analysis
+
+    os.makedirs(out, exist_ok=True)
+    timings = {}
+    job = f"{os.getpid()}-{int(time.time() * 1000)}"
+    P = partitions or len(workers)
+
+    model_meta = None
+    if model_path:
+        from .ml import load_scoring_model
+
+        model_meta = load_scoring_model(model_path=model_path)[1]
+    columns, column_info = FLOW_COLS, None
+    if prune_columns:
+        columns, column_info = _required_columns(sigma_rules, model_meta, False, False)
+        # the worker-side partials need these whatever else is pruned
+        columns = [c for c in ALL_COLS if c in set(columns) | {"id", "src_ip", "dst_ip", "bidirectional_packets", "bidirectional_bytes", "first_seen_ms"}]
+        column_info["columns"] = columns
+
+    # 1. extract: one thread per worker pulls the next capture (a busy worker takes fewer)
+    todo = queue.Queue()
+    for i, cap in enumerate(captures):
+        todo.put((i, cap))
+    placed, errors = {}, []
+
+    def feed(url):
+        while not errors:
+            try:
+                i, cap = todo.get_nowait()
+            except queue.Empty:
+                return
+            spec = {
+                "job": job, "task": i, "pcap": cap, "columns": columns, "partitions": P,
+                "sigma_rules": list(sigma_rules), "model": os.path.abspath(model_path) if model_path else None,
+            }
+            try:
+                placed[i] = {"worker": url, **json.loads(_post(f"{url}/extract", spec, TASK_TIMEOUT_S))}
+            except RuntimeError as e:
+                errors.append(e)
+
+    try:
+        with _timed(timings, "extract"):
+            threads = [threading.Thread(target=feed, args=(url,), daemon=True) for url in workers]
+            for t in threads:
+                t.start()
+            for t in threads:
+                t.join()
+        if errors:
+            raise errors[0]
+
+        # 2. reduce: partition p on worker p % W
+        with _timed(timings, "reduce"):
+            with ThreadPoolExecutor(max_workers=len(workers)) as ex:
+                reduced = list(ex.map(
+                    lambda p: unpack(_post(f"{workers[p % len(workers)]}/reduce", {"job": job, "partition": p, "peers": workers}, TASK_TIMEOUT_S)),
+                    range(P),
+                ))
+
+        # 3. merge, task order: ids are offset by the flows of the tasks before
+        with _timed(timings, "gather"):
+            flows, py_alerts, sigma_alerts, preds, offset = [], [], [], [], 0
+            for i in range(len(captures)):
+                frames, meta = unpack(_get(f"{placed[i]['worker']}/results/{job}/{i}"))
+                f = frames["flows"]
+                f["id"] = f["id"] + offset
+                flows.append(f)
+                for a in meta["alerts"]:
+                    if a.get("flow_id") is not None:
+                        a["flow_id"] = int(a["flow_id"]) + offset
+                    (sigma_alerts if a["type"] == "sigma" else py_alerts).append(a)
+                if "preds" in frames:
+                    frames["preds"]["id"] = frames["preds"]["id"] + offset
+                    preds.append(frames["preds"])
+                offset += placed[i]["flows"]
+            flows_df = pd.concat(flows, ignore_index=True) if flows else pd.DataFrame(columns=columns)
+    finally:
+        for url in workers:
+            try:
+                _request(f"{url}/jobs/{job}", method="DELETE")
+            except RuntimeError:
+                pass
+
+    with _timed(timings, "rules"):
+        by_dst = pd.concat([r[0]["dst"] for r in reduced], ignore_index=True)
+        firsts = [t["first_seen_ms"] for t in placed.values() if t["first_seen_ms"] is not None]
+        py_alerts += burst_alerts(by_dst.set_index("dst_ip")["count"], min(firsts) if firsts else 0)
+        pairs = pd.concat([r[0]["pairs"] for r in reduced], ignore_index=True)
+        pairs = pairs.reindex(columns=["src_ip", "dst_ip"] + PAIR_SUMS).sort_values(["bytes"], ascending=False)
+
+    ml_info = {}
+    if model_path:
+        from .ml import PredictionWriter
+
+        with _timed(timings, "ml"):
+            writer = PredictionWriter(os.path.join(out, "ml_predictions.csv"))
+            for part in preds:
+                writer.append(part)
+        ml_info = {"preds_csv": writer.path, "pred_counts": writer.counts}
+
+    cluster = {
+        "workers": workers,
+        "partitions": P,
+        "partial_bytes": sum(r[1]["partial_bytes"] for r in reduced),
+        "tasks": [
+            {"task": i, "capture": describe_source(cap), "worker": placed[i]["worker"], "flows": placed[i]["flows"],
+             "rule_hits": placed[i]["alerts"], "extract_s": placed[i]["extract_s"], "seconds": placed[i]["seconds"]}
+            for i, cap in enumerate(captures)
+        ],
+    }
+    source = describe_source(captures[0]) if len(captures) == 1 else f"{len(captures)} captures on {len(workers)} workers"
+    result = finish_analysis(
+        out, source, flows_df, py_alerts, sigma_alerts, ml_info, timings,
+        enrich=enrich, plot_workers=plot_workers, store=store, aggregate_cfg=aggregate_cfg,
+        column_info=column_info, pairs=pairs, cluster=cluster,
+    )
+    return {**result, "cluster": cluster, "ml_pred_counts": ml_info.get("pred_counts")}
@@ -0,0 +1,354 @@
+import os
+import glob
+import json
+import time
+import shutil
+import sqlite3
+import ipaddress
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import yaml
+import numpy as np
+import pandas as pd
+
+from .flows import FLOW_COLS, STAT_COLS, APP_COLS
+
+
+# Labeled training datasets from many captures / flow stores. Each source
+# (capture or capture folder, flows CSV, analyze netpoc.sqlite, flow archive)
+# is read in its own worker process and labeled with a constant and/or
+# first-match rules on IPs/CIDRs and time. Every flow gets a seeded 64-bit
+# hash of its identity; per class a worker keeps only the k flows with the
+# smallest hashes. Equal flows hash equally, so this is at the same time
+# deduplication and a uniform sample, and bottom-k samples of the workers
+# merge into exactly the bottom-k sample of everything (memory stays
+# O(k per class), however large the corpus). Rows are written in hash order
+# (= shuffled) as shards in the archive block format (.npy per column).
+#
+# manifest.yml:
+#   sources:
+#     - path: captures/normal/*.pcap.gz    # glob: one worker task per match
+#       label: 0
+#     - path: captures/incident.pcap
+#       label: 0                           # default when no rule matches
+#       labels:                            # first match wins
+#         - {src_ip: [10.0.0.66], since: "2024-05-01T10:00", until: "2024-05-01T11:00", label: 1}
+#         - {ip: 203.0.113.0/24, label: 1}  # either side
+#     - path: archive/                     # flow archive, optionally a time range
+#       since: "2024-05-01"
+#       labels: [{dst_port: [4444], label: 1}]   # no default: unmatched flows are dropped
+
+DATASET_META = "dataset.json"
+
+# flow identity used for deduplication (ids are per-run, so not part of it)
+DEDUP_COLS = [
+    "src_ip", "src_port", "dst_ip", "dst_port", "protocol",
+    "first_seen_ms", "bidirectional_packets", "bidirectional_bytes",
+]
+
+_IP_FIELDS = {"src_ip": ["src_ip"], "dst_ip": ["dst_ip"], "ip": ["src_ip", "dst_ip"]}
+
+
+def load_manifest(path):
+    with open(path, "r", encoding="utf-8") as f:
+        cfg = yaml.safe_load(f) or {}
+    sources = cfg.get("sources") or []
+    if not sources:
+        raise ValueError(f"{path}: no sources")
+    return sources
+
+
+def parse_source_arg(value):
+    # CLI shorthand PATH=LABEL
+    path, sep, label = value.rpartition("=")
+    if not sep or not path:
+        raise ValueError(f"{value}: expected PATH=LABEL")
+    return {"path": path, "label": int(label)}
+
+
+def _source_kind(path):
+    from .archive import CATALOG_DB
+
+    if os.path.isdir(path) and os.path.exists(os.path.join(path, CATALOG_DB)):
+        return "archive"
+    if path.lower().endswith(".csv"):
+        return "csv"
+    if path.lower().endswith((".sqlite", ".db")):
+        return "store"
+    return "capture"
+
+
+def expand_sources(sources):
+    from .archive import parse_time
+
+    tasks = []
+    for src in sources:
+        path = str(src["path"])
+        paths = sorted(glob.glob(path)) if glob.has_magic(path) else [path]
+        if not paths:
+            raise ValueError(f"{path}: no matching files")
+        for p in paths:
+            if not os.path.exists(p):
+                raise ValueError(f"{p}: not found")
+            tasks.append({
+                "path": p,
+                "kind": _source_kind(p),
+                "label": src.get("label"),
+                "labels": src.get("labels") or [],
+                "since_ms": parse_time(src.get("since")),
+                "until_ms": parse_time(src.get("until")),
+            })
+    return tasks
+
+
+# ---------- Worker ----------
+
+def _iter_source(task, columns, chunk_size):
+    path, kind = task["path"], task["kind"]
+    if kind == "capture":
+        from .flows import iter_flow_chunks
+
+        yield from iter_flow_chunks(path, chunk_size=chunk_size, columns=columns)
+    elif kind == "csv":
+        yield from pd.read_csv(path, chunksize=chunk_size)
+    elif kind == "store":
+        con = sqlite3.connect(f"file:{path}?mode=ro", uri=True)
+        try:
+            yield from pd.read_sql_query("SELECT * FROM flows", con, chunksize=chunk_size)
+        finally:
+            con.close()
+    else:
+        from .archive import _catalog, read_block
+
+        con = _catalog(path)
+        try:
+            rels = [r for r, lo, hi in con.execute("SELECT path, min_ts, max_ts FROM blocks ORDER BY min_ts")
+                    if (task["since_ms"] is None or hi >= task["since_ms"]) and (task["until_ms"] is None or lo < task["until_ms"])]
+        finally:
+            con.close()
+        for rel in rels:
+            yield read_block(path, rel, columns)
+
+
+def _ip_mask(values: pd.Series, spec):
+    nets = [ipaddress.ip_network(str(v), strict=False) for v in (spec if isinstance(spec, list) else [spec])]
+    hits = set()
+    for ip in pd.unique(values.dropna().astype(str)):
+        try:
+            addr = ipaddress.ip_address(ip)
+        except ValueError:
+            continue
+        if any(addr.version == n.version and addr in n for n in nets):
+            hits.add(ip)
+    return values.astype(str).isin(hits).to_numpy()
+
+
+def label_flows(df: pd.DataFrame, default=None, rules=()):
+    # -> float labels (NaN = unlabeled); rules: {src_ip|dst_ip|ip: ip/cidr list, <column>: values, since, until, label}
+    from .archive import parse_time
+
+    labels = np.full(len(df), np.nan if default is None else float(default))
+    free = np.ones(len(df), dtype=bool)
+    ts = pd.to_numeric(df["first_seen_ms"], errors="coerce").to_numpy() if "first_seen_ms" in df.columns else None
+    for rule in rules:
+        m = free.copy()
+        for k, v in rule.items():
+            if k == "label":
+                continue
+            if k in _IP_FIELDS:
+                m &= np.logical_or.reduce([_ip_mask(df[c], v) for c in _IP_FIELDS[k]])
+            elif k in ("since", "until"):
+                bound = parse_time(v)
+                m &= (ts >= bound) if k == "since" else (ts < bound)
+            elif k in df.columns:
+                m &= df[k].isin(v if isinstance(v, list) else [v]).to_numpy()
+            else:
+                m[:] = False
+        labels[m] = rule["label"]
+        free &= ~m
+    return labels
+
+
+def flow_hashes(df: pd.DataFrame, seed=7):
+    key = pd.DataFrame(index=df.index)
+    for c in DEDUP_COLS:
+        if c not in df.columns:
+            key[c] = -1
+        elif c in ("src_ip", "dst_ip"):
+            key[c] = df[c].astype(str)
+        else:
+            # 443 / 443.0 / "443" (capture vs CSV round-trip) hash the same
+            key[c] = pd.to_numeric(df[c], errors="coerce").fillna(-1).astype("int64")
+    return pd.util.hash_pandas_object(key, index=False, hash_key=f"netpoc{seed:010d}"[-16:]).to_numpy()
+
+
+class BottomK:
+    # per label: the k distinct flows with the smallest hashes (column "_h")
+
+    def __init__(self, k):
+        self.k = k
+        self.parts = {}
+
+    def add(self, df: pd.DataFrame):
+        for label, part in df.groupby("label", sort=False):
+            cur = self.parts.get(label)
+            both = part if cur is None else pd.concat([cur, part], ignore_index=True)
+            both = both.drop_duplicates("_h")
+            if len(both) > self.k:
+                both = both.iloc[np.argpartition(both["_h"].to_numpy(), self.k - 1)[:self.k]]
+            self.parts[label] = both.reset_index(drop=True)
+
+    def merge(self, other):
+        for part in other.parts.values():
+            self.add(part)
+
+
+def _extract(task, columns, k, chunk_size, seed):
+    t0 = time.perf_counter()
+    sample = BottomK(k)
+    seen, unlabeled, by_label = 0, 0, {}
+    for chunk in _iter_source(task, columns, chunk_size):
+        if task["since_ms"] is not None or task["until_ms"] is not None:
+            ts = pd.to_numeric(chunk["first_seen_ms"], errors="coerce")
+            keep = np.ones(len(chunk), dtype=bool)
+            if task["since_ms"] is not None:
+                keep &= (ts >= task["since_ms"]).to_numpy()
+            if task["until_ms"] is not None:
+                keep &= (ts < task["until_ms"]).to_numpy()
+            chunk = chunk[keep]
+        seen += len(chunk)
+        labels = label_flows(chunk, task["label"], task["labels"])
+        ok = ~np.isnan(labels)
+        unlabeled += int((~ok).sum())
+        chunk = chunk.reindex(columns=columns)[ok].assign(label=labels[ok].astype("int64"))
+        chunk["_h"] = flow_hashes(chunk, seed)
+        for label, n in chunk["label"].value_counts().items():
+            by_label[int(label)] = by_label.get(int(label), 0) + int(n)
+        sample.add(chunk)
+    stats = {
+        "path": task["path"], "kind": task["kind"], "flows": seen, "unlabeled": unlabeled,
+        "by_label": by_label, "seconds": round(time.perf_counter() - t0, 4),
+    }
+    return sample, stats
+
+
+# ---------- Build ----------
+
+def _distinct_estimate(part, k):
+    # exact below k; KMV estimate once the sample is full
+    if len(part) < k:
+        return len(part)
+    return int((k - 1) * 2.0 ** 64 / (float(part["_h"].max()) + 1))
+
+
+def build_dataset(out, sources, per_class=200_000, balance=True, shard_rows=100_000, workers=None,
+                  chunk_size=50_000, extra=(), seed=7, progress=None):
+    t0 = time.perf_counter()
+    columns = [c for c in FLOW_COLS if c != "id"]
+    if "stats" in extra:
+        columns += STAT_COLS
+    if "app" in extra:
+        columns += APP_COLS
+
+    # out (and its .tmp twin) is replaced wholesale, so it has to be a dataset already
+    tmp = out.rstrip("/\\") + ".tmp"
+    for path in (out, tmp):
+        if not _replaceable(path):
+            raise ValueError(f"{path} exists and is not a dataset folder; pick another --out")
+
+    tasks = expand_sources(sources)
+    sample = BottomK(per_class)
+    source_stats = []
+    workers = workers or min(len(tasks), os.cpu_count() or 1)
+    with ProcessPoolExecutor(max_workers=workers) as ex:
+        futures = [ex.submit(_extract, t, columns, per_class, chunk_size, seed) for t in tasks]
+        # merged as they finish: the coordinator holds at most 2k rows per class
+        for fut in as_completed(futures):
+            part, stats = fut.result()
+            sample.merge(part)
+            source_stats.append(stats)
+            if progress:
+                progress(stats)
+
+    classes = {}
+    for label, part in sample.parts.items():
+        classes[int(label)] = {
+            "flows": sum(s["by_label"].get(int(label), 0) for s in source_stats),
+            "distinct_est": _distinct_estimate(part, per_class),
+        }
+
+    # the same flow under several labels: keep it in the highest one
+    conflicts = 0
+    if len(sample.parts) > 1:
+        hl = pd.concat([p[["_h", "label"]] for p in sample.parts.values()], ignore_index=True)
+        owner = hl.sort_values("label").drop_duplicates("_h", keep="last").set_index("_h")["label"]
+        for label, part in sample.parts.items():
+            keep = (part["_h"].map(owner) == label).to_numpy()
+            conflicts += int((~keep).sum())
+            sample.parts[label] = part[keep]
+
+    n = min((len(p) for p in sample.parts.values()), default=0)
+    parts = []
+    for label, part in sample.parts.items():
+        if balance and len(part) > n:
+            part = part.iloc[np.argpartition(part["_h"].to_numpy(), n - 1)[:n]] if n else part.iloc[:0]
+        classes[int(label)]["rows"] = int(len(part))
+        parts.append(part)
+    data = pd.concat(parts, ignore_index=True) if parts else pd.DataFrame(columns=columns + ["label", "_h"])
+    data = data.iloc[np.argsort(data["_h"].to_numpy(), kind="stable")].drop(columns="_h").reset_index(drop=True)
+
+    shutil.rmtree(tmp, ignore_errors=True)
+    os.makedirs(tmp)
+    shards = write_shards(tmp, data, shard_rows)
+    meta = {
+        "rows": int(len(data)),
+        "columns": list(data.columns),
+        "shards": shards,
+        "classes": {str(k): v for k, v in sorted(classes.items())},
+        "per_class": per_class,
+        "balanced": balance,
+        "label_conflicts": conflicts,
+        "seed": seed,
+        "sources": sorted(source_stats, key=lambda s: s["path"]),
+        "workers": workers,
+        "seconds": round(time.perf_counter() - t0, 4),
+    }
+    with open(os.path.join(tmp, DATASET_META), "w", encoding="utf-8") as f:
+        json.dump(meta, f, indent=2)
+    shutil.rmtree(out, ignore_errors=True)
+    os.replace(tmp, out)
+    return meta
+
+
+def write_shards(out, data: pd.DataFrame, shard_rows):
+    from .archive import write_block
+
+    shards = []
+    for i, start in enumerate(range(0, len(data), shard_rows)):
+        part = data.iloc[start:start + shard_rows]
+        name = f"shard-{i:05d}"
+        write_block(os.path.join(out, name), part)
+        shards.append({"path": name, "rows": int(len(part))})
+    return shards
+
+
+def _replaceable(path):
+    # missing, empty, or only what build_dataset writes (a crashed run leaves shards without dataset.json)
+    if not os.path.exists(path):
+        return True
+    if not os.path.isdir(path):
+        return False
+    return all(n == DATASET_META or (n.startswith("shard-") and os.path.isdir(os.path.join(path, n))) for n in os.listdir(path))
+
+
+def is_dataset(path):
+    return os.path.isdir(path) and os.path.exists(os.path.join(path, DATASET_META))
+
+
+def iter_dataset(path, columns=None):
+    from .archive import read_block
+
+    with open(os.path.join(path, DATASET_META), "r", encoding="utf-8") as f:
+        meta = json.load(f)
+    for shard in meta["shards"]:
+        yield read_block(path, shard["path"], columns)
@@ -26,9 +26,19 @@ RULES = [
     ("R002", "asymmetric_flow", rule_asymmetric_flow),
 ]
 
+# zone-map predicates a flow must satisfy for each rule to fire (`netpoc hunt` skips archive
+# blocks where they cannot hold); (column, op, value) with op in: in, >, >=, <, <=
+RULE_PREDICATES = {
+    "R001": [("dst_port", "in", [443]), ("src2dst_bytes", ">", 1_000_000)],
+    "R002": [("src2dst_bytes", ">", 300_000)],
+}
 
+# flow columns read by RULES, the aggregate rules and the alert records
+RULE_COLUMNS = ["id", "src_ip", "dst_ip", "dst_port", "src2dst_bytes", "dst2src_bytes", "first_seen_ms", "last_seen_ms"]
 
-def run_python_rules(flows_df: pd.DataFrame):
+
+
+def run_flow_rules(flows_df: pd.DataFrame):
     alerts = []
     for _, row in flows_df.iterrows():
         for rid, name, fn in RULES:
@@ -45,21 +55,37 @@ def run_python_rules(flows_df: pd.DataFrame):
                     "details": msg,
                     "flow_id": row.get("id"),
                 })
+    return alerts
 
-    if "dst_ip" in flows_df.columns and len(flows_df) > 0:
-        by_dst = flows_df.groupby("dst_ip").size().sort_values(ascending=False)
-        for dst_ip, cnt in by_dst.head(10).items():
-            if cnt >= 200:
-                alerts.append({
-                    "rule_id": "R010",
-                    "rule_name": "burst_to_single_dst",
-                    "type": "python",
-                    "ts_ms": int(flows_df["first_seen_ms"].min() or 0),
-                    "src_ip": None,
-                    "dst_ip": dst_ip,
-                    "dst_port": None,
-                    "details": f"Many flows to single destination: {cnt}",
-                    "flow_id": None,
-                })
 
+def dst_flow_counts(flows_df: pd.DataFrame) -> pd.Series:
+    # R010 input; counts of disjoint flow subsets add up (sharded runs)
+    return flows_df.groupby("dst_ip").size()
+
+
+def burst_alerts(by_dst: pd.Series, ts_ms):
+    alerts = []
+    for dst_ip, cnt in by_dst.sort_values(ascending=False).head(10).items():
+        if cnt >= 200:
+            alerts.append({
+                "rule_id": "R010",
+                "rule_name": "burst_to_single_dst",
+                "type": "python",
+                "ts_ms": int(ts_ms),
+                "src_ip": None,
+                "dst_ip": dst_ip,
+                "dst_port": None,
+                "details": f"Many flows to single destination: {cnt}",
+                "flow_id": None,
+            })
     return alerts
+
+
+def run_aggregate_rules(flows_df: pd.DataFrame):
+    if "dst_ip" in flows_df.columns and len(flows_df) > 0:
+        return burst_alerts(dst_flow_counts(flows_df), flows_df["first_seen_ms"].min() or 0)
+    return []
+
+
+def run_python_rules(flows_df: pd.DataFrame):
+    return run_flow_rules(flows_df) + run_aggregate_rules(flows_df)
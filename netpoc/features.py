@@ -0,0 +1,63 @@
+import numpy as np
+import pandas as pd
+
+
+CATEGORICAL_FEATURES = ["protocol"]
+
+
+def _cat_keys(s: pd.Series) -> pd.Series:
+    # 6, 6.0 and "6" (NFStream vs. CSV round-trip) must map to the same code
+    s = s.fillna(0)
+    num = pd.to_numeric(s, errors="coerce")
+    keys = s.astype(str)
+    whole = num.notna() & (num == num.round())
+    keys[whole] = num[whole].astype("int64").astype(str)
+    return keys
+
+
+class FeaturePipeline:
+    # Fitted once at training time and saved in the model bundle, so scoring
+    # uses the same column order and categorical codes as training.
+
+    def __init__(self, features, categorical=None):
+        self.features = list(features)
+        self.categorical = [c for c in (categorical or []) if c in self.features]
+        self.categories = {}
+
+    def fit(self, df: pd.DataFrame):
+        for c in self.categorical:
+            keys = _cat_keys(df[c]) if c in df.columns else pd.Series(["0"])
+            self.categories[c] = sorted(keys.unique().tolist())
+        return self
+
+    def partial_fit(self, df: pd.DataFrame):
+        # streaming training: new categories are appended, so codes already
+        # seen by the model never change
+        for c in self.categorical:
+            if c not in df.columns:
+                continue
+            known = self.categories.setdefault(c, [])
+            new = set(_cat_keys(df[c]).unique()) - set(known)
+            known.extend(sorted(new))
+        return self
+
+    def transform(self, df: pd.DataFrame) -> np.ndarray:
+        X = np.zeros((len(df), len(self.features)), dtype=np.float32)
+        for j, c in enumerate(self.features):
+            if c not in df.columns:
+                continue
+            if c in self.categories:
+                # unseen categories -> -1
+                X[:, j] = pd.Index(self.categories[c]).get_indexer(_cat_keys(df[c]))
+            else:
+                X[:, j] = pd.to_numeric(df[c], errors="coerce").fillna(0).to_numpy(dtype=np.float32)
+        return X
+
+    def to_dict(self):
+        return {"features": self.features, "categorical": self.categorical, "categories": self.categories}
+
+    @classmethod
+    def from_dict(cls, d):
+        p = cls(d["features"], d.get("categorical"))
+        p.categories = {c: list(v) for c, v in d.get("categories", {}).items()}
+        return p
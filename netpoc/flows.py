@@ -1,5 +1,9 @@
+import os
+import stat
+
 import pandas as pd
-from nfstream import NFStreamer
+
+from .ingest import capture_source
 
 
 FLOW_COLS = [
@@ -19,38 +23,102 @@ FLOW_COLS = [
 ]
 
 
-def pcap_to_flows_df(pcap_path: str) -> pd.DataFrame:
-    streamer = NFStreamer(source=pcap_path, decode_tunnels=True, bpf_filter=None)
+# Optional NFStream attributes. Each group costs extra work in NFStream
+# (statistical_analysis / nDPI dissection), which extraction only turns on
+# when a stage asks for one of its columns.
+STAT_COLS = (
+    [f"{d}_{s}_ps" for d in ("bidirectional", "src2dst", "dst2src") for s in ("min", "mean", "stddev", "max")]
+    + [f"{d}_{s}_piat_ms" for d in ("bidirectional", "src2dst", "dst2src") for s in ("min", "mean", "stddev", "max")]
+    + [f"{d}_{flag}_packets" for d in ("bidirectional", "src2dst", "dst2src")
+       for flag in ("syn", "cwr", "ece", "urg", "ack", "psh", "rst", "fin")]
+)
+APP_COLS = [
+    "application_name",
+    "application_category_name",
+    "application_is_guessed",
+    "requested_server_name",
+    "client_fingerprint",
+    "server_fingerprint",
+    "user_agent",
+    "content_type",
+]
+ALL_COLS = FLOW_COLS + STAT_COLS + APP_COLS
+
+_MS_ATTRS = {
+    "duration_ms": "bidirectional_duration_ms",
+    "first_seen_ms": "bidirectional_first_seen_ms",
+    "last_seen_ms": "bidirectional_last_seen_ms",
+}
+_NONE_DEFAULT = {"id", "src_ip", "src_port", "dst_ip", "dst_port", "protocol"} | set(APP_COLS)
+
+
+def _flow_row(f, cols=FLOW_COLS):
+    row = {}
+    for c in cols:
+        if c in _MS_ATTRS:
+            row[c] = int(getattr(f, _MS_ATTRS[c], 0) or 0)
+        else:
+            row[c] = getattr(f, c, None if c in _NONE_DEFAULT else 0)
+    return row
+
+
+def _rows_to_df(rows, cols=FLOW_COLS) -> pd.DataFrame:
+    return pd.DataFrame(rows, columns=cols)
+
+
+def nfstream_features(cols):
+    return {
+        "statistical_analysis": any(c in STAT_COLS for c in cols),
+        "n_dissections": 20 if any(c in APP_COLS for c in cols) else 0,
+    }
+
+
+_STREAMER_CLS = None
+
+
+def _streamer(source, cols=FLOW_COLS):
+    # NFStreamer only accepts regular files or interfaces; the FIFO fed by
+    # ingest.capture_source is read like an offline pcap
+    global _STREAMER_CLS
+    if _STREAMER_CLS is None:
+        from nfstream import NFStreamer
+        from nfstream.utils import NFMode
+
+        class PipeStreamer(NFStreamer):
+            @NFStreamer.source.setter
+            def source(self, value):
+                if isinstance(value, str) and os.path.exists(value) and stat.S_ISFIFO(os.stat(value).st_mode):
+                    self._mode = NFMode.SINGLE_FILE
+                    self._source = value
+                else:
+                    NFStreamer.source.fset(self, value)
 
-    rows = []
-    for f in streamer:
-        rows.append({
-            "id": getattr(f, "id", None),
-            "src_ip": getattr(f, "src_ip", None),
-            "src_port": getattr(f, "src_port", None),
-            "dst_ip": getattr(f, "dst_ip", None),
-            "dst_port": getattr(f, "dst_port", None),
-            "protocol": getattr(f, "protocol", None),
+        _STREAMER_CLS = PipeStreamer
+    return _STREAMER_CLS(source=source, decode_tunnels=True, bpf_filter=None, **nfstream_features(cols))
 
-            "bidirectional_packets": getattr(f, "bidirectional_packets", 0),
-            "bidirectional_bytes": getattr(f, "bidirectional_bytes", 0),
 
-            "src2dst_packets": getattr(f, "src2dst_packets", 0),
-            "src2dst_bytes": getattr(f, "src2dst_bytes", 0),
+# pcap_path: a .pcap, a compressed capture, an ordered list of rotated files
+# or a directory of them (see ingest.capture_paths); ingest_stats receives
+# input sizes and throughput against the uncompressed bytes. columns: subset
+# of ALL_COLS to materialize (default FLOW_COLS).
 
-            "dst2src_packets": getattr(f, "dst2src_packets", 0),
-            "dst2src_bytes": getattr(f, "dst2src_bytes", 0),
+def pcap_to_flows_df(pcap_path, ingest_stats=None, columns=None) -> pd.DataFrame:
+    cols = list(columns or FLOW_COLS)
+    with capture_source(pcap_path, ingest_stats) as source:
+        return _rows_to_df([_flow_row(f, cols) for f in _streamer(source, cols)], cols)
 
-            "duration_ms": int(getattr(f, "bidirectional_duration_ms", 0) or 0),
-            "first_seen_ms": int(getattr(f, "bidirectional_first_seen_ms", 0) or 0),
-            "last_seen_ms": int(getattr(f, "bidirectional_last_seen_ms", 0) or 0),
-        })
 
-    df = pd.DataFrame(rows)
-    for c in FLOW_COLS:
-        if c not in df.columns:
-            df[c] = None
-    return df[FLOW_COLS]
+def iter_flow_chunks(pcap_path, chunk_size=50_000, ingest_stats=None, columns=None):
+    cols = list(columns or FLOW_COLS)
+    with capture_source(pcap_path, ingest_stats) as source:
+        rows = []
+        for f in _streamer(source, cols):
+            rows.append(_flow_row(f, cols))
+            if len(rows) >= chunk_size:
+                yield _rows_to_df(rows, cols)
+                rows = []
+        if rows:
+            yield _rows_to_df(rows, cols)
 
 
 def summary_pairs(df: pd.DataFrame) -> pd.DataFrame:
@@ -0,0 +1,104 @@
+import os
+import json
+import shutil
+import numpy as np
+
+from .features import FeaturePipeline
+
+
+# Random forest flattened into packed arrays (one .npy per field, so every
+# array can be memory-mapped). All trees share one node table; child indices
+# are global, -1 marks a leaf, roots[t] is the first node of tree t.
+
+_ARRAYS = ["feature", "threshold", "left", "right", "value", "roots", "classes"]
+
+
+def forest_path(model_path):
+    return os.path.splitext(model_path)[0] + ".forest"
+
+
+def export_forest(model, pipeline: FeaturePipeline, path):
+    feature, threshold, left, right, value, roots = [], [], [], [], [], []
+    offset = 0
+    for est in model.estimators_:
+        t = est.tree_
+        leaf = t.children_left == -1
+        feature.append(np.where(leaf, 0, t.feature).astype(np.int32))
+        threshold.append(t.threshold.astype(np.float64))
+        left.append(np.where(leaf, -1, t.children_left + offset).astype(np.int32))
+        right.append(np.where(leaf, -1, t.children_right + offset).astype(np.int32))
+        v = t.value[:, 0, :].astype(np.float64)
+        value.append(v / np.maximum(v.sum(axis=1, keepdims=True), np.finfo(np.float64).tiny))
+        roots.append(offset)
+        offset += t.node_count
+
+    arrays = {
+        "feature": np.concatenate(feature),
+        "threshold": np.concatenate(threshold),
+        "left": np.concatenate(left),
+        "right": np.concatenate(right),
+        "value": np.ascontiguousarray(np.concatenate(value)),
+        "roots": np.asarray(roots, dtype=np.int64),
+        "classes": np.asarray(model.classes_),
+    }
+
+    tmp = path + ".tmp"
+    shutil.rmtree(tmp, ignore_errors=True)
+    os.makedirs(tmp)
+    for name, arr in arrays.items():
+        np.save(os.path.join(tmp, name + ".npy"), arr)
+    with open(os.path.join(tmp, "meta.json"), "w", encoding="utf-8") as f:
+        json.dump({"n_trees": len(roots), "n_nodes": offset, "pipeline": pipeline.to_dict()}, f)
+
+    shutil.rmtree(path, ignore_errors=True)
+    os.replace(tmp, path)
+    return path
+
+
+class ForestModel:
+    # Duck-types the part of RandomForestClassifier that scoring uses
+    # (classes_, predict_proba, predict), evaluated with plain numpy.
+
+    def __init__(self, arrays, n_trees):
+        for name in _ARRAYS:
+            setattr(self, name, arrays[name])
+        self.classes_ = self.classes
+        self.n_trees = n_trees
+
+    def apply(self, X):
+        # leaf index for every (tree, sample): per tree, the whole batch descends
+        # one level per iteration, keeping only samples still in inner nodes
+        X = np.ascontiguousarray(X, dtype=np.float32)
+        n, k = X.shape
+        flat = X.ravel()
+        base = np.arange(n, dtype=np.int64) * k
+        leaves = np.empty((self.n_trees, n), dtype=np.int32)
+        for t in range(self.n_trees):
+            node = np.full(n, self.roots[t], dtype=np.int32)
+            # a tree that is a single leaf (pure bootstrap sample) has no inner node to walk
+            active = np.flatnonzero(self.left[node] != -1)
+            while len(active):
+                nd = node[active]
+                go_left = flat[base[active] + self.feature[nd]] <= self.threshold[nd]
+                nd = np.where(go_left, self.left[nd], self.right[nd])
+                node[active] = nd
+                active = active[self.left[nd] != -1]
+            leaves[t] = node
+        return leaves
+
+    def predict_proba(self, X):
+        leaves = self.apply(X)
+        proba = np.zeros((leaves.shape[1], self.value.shape[1]), dtype=np.float64)
+        for t in range(self.n_trees):
+            proba += self.value[leaves[t]]
+        return proba / self.n_trees
+
+    def predict(self, X):
+        return self.classes_.take(np.argmax(self.predict_proba(X), axis=1))
+
+
+def load_forest(path):
+    with open(os.path.join(path, "meta.json"), "r", encoding="utf-8") as f:
+        meta = json.load(f)
+    arrays = {name: np.load(os.path.join(path, name + ".npy"), mmap_mode="r") for name in _ARRAYS}
+    return ForestModel(arrays, meta["n_trees"]), FeaturePipeline.from_dict(meta["pipeline"])
@@ -0,0 +1,193 @@
+import os
+import re
+import bz2
+import gzip
+import lzma
+import shutil
+import tempfile
+import threading
+import subprocess
+import time
+from contextlib import contextmanager
+
+
+# Capture sources for NFStream: a plain .pcap is passed through as is;
+# compressed (.gz/.zst/.bz2/.xz) and rotated captures are decompressed on the
+# fly and concatenated into one pcap stream written to a FIFO, so NFStream
+# sees a single continuous capture (flows across a rotation are not split)
+# and nothing full-size is written to disk.
+
+COMPRESSED_EXTS = (".gz", ".zst", ".zstd", ".bz2", ".xz")
+
+_PCAP_MAGICS = {b"\xd4\xc3\xb2\xa1", b"\xa1\xb2\xc3\xd4", b"\x4d\x3c\xb2\xa1", b"\xa1\xb2\x3c\x4d"}
+_COPY_CHUNK = 1 << 20
+
+
+def is_compressed(path):
+    return path.lower().endswith(COMPRESSED_EXTS)
+
+
+def _strip_compression(name):
+    for ext in COMPRESSED_EXTS:
+        if name.lower().endswith(ext):
+            return name[: -len(ext)]
+    return name
+
+
+def _natural_key(name):
+    return [int(t) if t.isdigit() else t for t in re.split(r"(\d+)", _strip_compression(name))]
+
+
+def _is_capture(name):
+    # rotated tcpdump files: cap.pcap, cap.pcap1, cap.pcap2, ...
+    return re.search(r"\.(pcap|cap|dump)\d*$", _strip_compression(name).lower()) is not None
+
+
+def capture_paths(pcap):
+    # str / list of paths in capture order; a directory expands to its capture files (natural sort)
+    items = [pcap] if isinstance(pcap, (str, os.PathLike)) else list(pcap)
+    paths = []
+    for p in map(os.fspath, items):
+        if os.path.isdir(p):
+            names = sorted((n for n in os.listdir(p) if _is_capture(n)), key=_natural_key)
+            paths += [os.path.join(p, n) for n in names]
+        else:
+            paths.append(p)
+    if not paths:
+        raise ValueError(f"No capture files in {pcap}")
+    return paths
+
+
+def is_plain_pcap(pcap):
+    paths = capture_paths(pcap)
+    return len(paths) == 1 and not is_compressed(paths[0])
+
+
+def describe_source(pcap):
+    paths = capture_paths(pcap)
+    return paths[0] if len(paths) == 1 else f"{paths[0]} (+{len(paths) - 1} more, as one capture)"
+
+
+@contextmanager
+def _decompressed(path):
+    low = path.lower()
+    if low.endswith(".gz"):
+        src = gzip.open(path, "rb")
+    elif low.endswith(".bz2"):
+        src = bz2.open(path, "rb")
+    elif low.endswith(".xz"):
+        src = lzma.open(path, "rb")
+    elif low.endswith((".zst", ".zstd")):
+        try:
+            import zstandard
+        except ImportError:
+            zstandard = None
+        if zstandard is not None:
+            src = zstandard.ZstdDecompressor().stream_reader(open(path, "rb"), closefd=True)
+        else:
+            try:
+                proc = subprocess.Popen(["zstd", "-dcq", path], stdout=subprocess.PIPE)
+            except FileNotFoundError:
+                raise ValueError(f"{path}: .zst needs the zstandard package or the zstd binary")
+            try:
+                yield proc.stdout
+            finally:
+                proc.stdout.close()
+                if proc.wait() not in (0, -13):  # -13: SIGPIPE after an early stop
+                    raise ValueError(f"{path}: zstd exited with {proc.returncode}")
+            return
+    else:
+        src = open(path, "rb")
+    with src:
+        yield src
+
+
+def _read_header(src, path):
+    head = src.read(24)
+    if len(head) < 24 or head[:4] not in _PCAP_MAGICS:
+        raise ValueError(f"{path}: not a classic pcap stream (pcapng cannot be concatenated)")
+    return head
+
+
+def _feed(paths, fifo, stats, errors):
+    path = paths[0]
+    try:
+        with open(fifo, "wb") as out:
+            first = None
+            for path in paths:
+                with _decompressed(path) as src:
+                    head = _read_header(src, path)
+                    if first is None:
+                        out.write(head)
+                        first = head
+                    elif head[:4] != first[:4] or head[20:24] != first[20:24]:
+                        raise ValueError(f"{path}: byte order/timestamp precision/linktype differ from {paths[0]}")
+                    n = 24
+                    while True:
+                        buf = src.read(_COPY_CHUNK)
+                        if not buf:
+                            break
+                        out.write(buf)
+                        n += len(buf)
+                stats["compressed_bytes"] += os.path.getsize(path)
+                stats["pcap_bytes"] += n
+                stats["files_done"] += 1
+    except BrokenPipeError:
+        pass  # reader stopped early
+    except ValueError as e:
+        errors.append(e)
+    except (OSError, EOFError, lzma.LZMAError) as e:
+        # corrupt/truncated archive: reported like the format errors above, with the file
+        errors.append(ValueError(f"{path}: {e}"))
+
+
+@contextmanager
+def capture_source(pcap, stats=None):
+    # yields a path NFStream can read; stats gets input/uncompressed bytes and throughput
+    paths = capture_paths(pcap)
+    stats = {} if stats is None else stats
+    stats.update(inputs=len(paths), files_done=0, compressed_bytes=0, pcap_bytes=0)
+    t0 = time.perf_counter()
+
+    if len(paths) == 1 and not is_compressed(paths[0]):
+        size = os.path.getsize(paths[0])
+        stats.update(compressed_bytes=size, pcap_bytes=size, files_done=1)
+        try:
+            yield paths[0]
+        finally:
+            _finish(stats, t0)
+        return
+
+    tmpdir = tempfile.mkdtemp(prefix="netpoc-ingest-")
+    fifo = os.path.join(tmpdir, "capture.pcap")
+    os.mkfifo(fifo)
+    errors = []
+    feeder = threading.Thread(target=_feed, args=(paths, fifo, stats, errors), name="pcap-feed", daemon=True)
+    feeder.start()
+    failed = None
+    try:
+        yield fifo
+    except Exception as e:
+        failed = e
+    finally:
+        # unblock a writer whose reader went away (early stop / NFStream error)
+        while feeder.is_alive():
+            try:
+                os.close(os.open(fifo, os.O_RDONLY | os.O_NONBLOCK))
+            except OSError:
+                pass
+            feeder.join(0.1)
+        shutil.rmtree(tmpdir, ignore_errors=True)
+        _finish(stats, t0)
+    # NFStream usually fails first on bad input ("truncated dump file"); the
+    # feeder's error says why, so it wins
+    if errors:
+        raise errors[0] from failed
+    if failed is not None:
+        raise failed
+
+
+def _finish(stats, t0):
+    secs = time.perf_counter() - t0
+    stats["seconds"] = round(secs, 4)
+    stats["mb_per_s"] = round(stats["pcap_bytes"] / 1e6 / secs, 2) if secs > 0 else None
@@ -1,11 +1,14 @@
 import os
-import joblib
+import time
+import sqlite3
 import pandas as pd
 import numpy as np
 
-from sklearn.model_selection import train_test_split
-from sklearn.metrics import confusion_matrix
-from sklearn.ensemble import RandomForestClassifier
+from .features import CATEGORICAL_FEATURES, FeaturePipeline
+from .forest import export_forest, forest_path, load_forest
+
+# sklearn/joblib are imported inside the training/evaluation functions:
+# scoring with an exported forest (load_scoring_model) never needs them.
 
 
 DEFAULT_FEATURES = [
@@ -21,35 +24,32 @@ DEFAULT_FEATURES = [
 ]
 
 
-def _prep_features(df: pd.DataFrame, features):
-    X = df.copy()
-
-    if "protocol" in X.columns:
-        X["protocol"] = X["protocol"].fillna(0)
-        X["protocol"] = pd.factorize(X["protocol"])[0]
-
-    for c in features:
-        if c not in X.columns:
-            X[c] = 0
-        X[c] = pd.to_numeric(X[c], errors="coerce").fillna(0)
-
-    return X[features].astype(float)
-
-
 def train_or_load_model(model_path: str, train_csv=None, force_train=False):
-    meta = {"features": DEFAULT_FEATURES}
+    import joblib
+    from sklearn.model_selection import train_test_split
+    from sklearn.ensemble import RandomForestClassifier
 
     if (not force_train) and os.path.exists(model_path) and not train_csv:
         obj = joblib.load(model_path)
+        # bundles from before FeaturePipeline carry no frozen encodings; never retrain over them
+        if "pipeline" not in obj["meta"]:
+            raise ValueError(f"{model_path} predates FeaturePipeline; retrain it with --train-csv")
         return obj["model"], obj["meta"]
+    # a saved bundle is only replaced on request (`train`, analyze --force-train)
+    if os.path.exists(model_path) and not force_train:
+        raise ValueError(f"{model_path} already exists; pass --force-train to retrain over it")
 
     if not train_csv:
+        # no saved model and nothing to train on: synthetic demo model, saved once
         df = _make_synthetic_training()
     else:
-        df = pd.read_csv(train_csv)
+        df = pd.concat(iter_labeled_chunks(train_csv), ignore_index=True)
 
-    y = df["label"].astype(int)
-    X = _prep_features(df, meta["features"])
+    pipeline = FeaturePipeline(DEFAULT_FEATURES, CATEGORICAL_FEATURES).fit(df)
+    meta = {"features": pipeline.features, "pipeline": pipeline}
+
+    y = df["label"].astype(int).to_numpy()
+    X = pipeline.transform(df)
 
     Xtr, Xte, ytr, yte = train_test_split(X, y, test_size=0.25, random_state=7, stratify=y)
 
@@ -61,32 +61,247 @@ def train_or_load_model(model_path: str, train_csv=None, force_train=False):
         class_weight="balanced",
     )
     model.fit(Xtr, ytr)
+    meta["eval"] = _metrics(*_confusion(yte, model.predict(Xte)))
 
-    os.makedirs(os.path.dirname(model_path), exist_ok=True)
+    os.makedirs(os.path.dirname(model_path) or ".", exist_ok=True)
     joblib.dump({"model": model, "meta": meta}, model_path)
+    export_forest(model, pipeline, forest_path(model_path))
 
     return model, meta
 
 
+def load_scoring_model(model_path: str, train_csv=None, force_train=False):
+    # Prefer the packed numpy forest next to the joblib bundle: memory-mapped,
+    # no sklearn import. Fall back to (and re-export from) the sklearn model.
+    fpath = forest_path(model_path)
+    if not train_csv and os.path.exists(model_path) and os.path.isdir(fpath):
+        if os.path.getmtime(fpath) >= os.path.getmtime(model_path):
+            forest, pipeline = load_forest(fpath)
+            return forest, {"features": pipeline.features, "pipeline": pipeline}
+
+    model, meta = train_or_load_model(model_path=model_path, train_csv=train_csv, force_train=force_train)
+    stale = not os.path.isdir(fpath) or os.path.getmtime(fpath) < os.path.getmtime(model_path)
+    if stale and hasattr(model, "estimators_"):
+        export_forest(model, meta["pipeline"], fpath)
+    return model, meta
+
+
+# ---------- Out-of-core training ----------
+
+def _peak_rss_mb():
+    try:
+        import resource
+    except ImportError:  # Windows
+        return None
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024.0
+
+
+def iter_labeled_chunks(source: str, chunk_size=100_000):
+    # CSV, a SQLite file with a `flows` table that carries a `label` column,
+    # or a `netpoc build-dataset` folder (one chunk per shard)
+    if os.path.isdir(source):
+        from .dataset import is_dataset, iter_dataset
+
+        if not is_dataset(source):
+            raise ValueError(f"{source} is not a build-dataset folder (no dataset.json)")
+        yield from iter_dataset(source)
+    elif source.endswith((".sqlite", ".db")):
+        con = sqlite3.connect(f"file:{source}?mode=ro", uri=True)
+        try:
+            cols = {r[1] for r in con.execute("PRAGMA table_info(flows)")}
+            if "label" not in cols:
+                # e.g. the netpoc.sqlite written by analyze: flows, but no labels
+                raise ValueError(
+                    f"{source}: the flows table has no label column; label it with "
+                    f"`build-dataset --source {source}=LABEL` (or a manifest) and train on the dataset folder"
+                )
+            yield from pd.read_sql_query("SELECT * FROM flows WHERE label IS NOT NULL", con, chunksize=chunk_size)
+        finally:
+            con.close()
+    else:
+        yield from pd.read_csv(source, chunksize=chunk_size)
+
+
+class StreamingLinearModel:
+    # log1p + running standardization + logistic-loss SGD, trained with
+    # partial_fit one chunk at a time. Exposes classes_/predict_proba/predict
+    # like the forest, so the scoring path does not care which one it gets.
+
+    def __init__(self, random_state=7):
+        from sklearn.linear_model import SGDClassifier
+        from sklearn.preprocessing import StandardScaler
+
+        self.scaler = StandardScaler()
+        self.clf = SGDClassifier(loss="log_loss", alpha=1e-5, random_state=random_state)
+        self.classes_ = np.array([0, 1])
+
+    @staticmethod
+    def _prep(X):
+        return np.log1p(np.maximum(X, 0))
+
+    def partial_fit(self, X, y, sample_weight=None):
+        Z = self._prep(X)
+        self.scaler.partial_fit(Z)
+        self.clf.partial_fit(self.scaler.transform(Z), y, classes=self.classes_, sample_weight=sample_weight)
+        return self
+
+    def predict_proba(self, X):
+        return self.clf.predict_proba(self.scaler.transform(self._prep(X)))
+
+    def predict(self, X):
+        return self.classes_.take(np.argmax(self.predict_proba(X), axis=1))
+
+
+class _Reservoir:
+    # uniform sample of at most `cap` held-out rows, kept as a float32 matrix
+
+    def __init__(self, cap, n_features, rng):
+        self.X = np.empty((cap, n_features), dtype=np.float32)
+        self.y = np.empty(cap, dtype=np.int8)
+        self.cap = cap
+        self.seen = 0
+        self.rng = rng
+
+    def add(self, X, y):
+        m = len(X)
+        fill = max(0, min(m, self.cap - self.seen))
+        self.X[self.seen:self.seen + fill] = X[:fill]
+        self.y[self.seen:self.seen + fill] = y[:fill]
+        if fill < m:
+            slots = self.rng.integers(0, self.seen + np.arange(fill, m) + 1)
+            keep = slots < self.cap
+            self.X[slots[keep]] = X[fill:][keep]
+            self.y[slots[keep]] = y[fill:][keep]
+        self.seen += m
+
+    def data(self):
+        n = min(self.seen, self.cap)
+        return self.X[:n], self.y[:n]
+
+
+def train_streaming(model_path: str, source: str, chunk_size=100_000, holdout=0.2, max_holdout=200_000, progress=None):
+    import joblib
+
+    rng = np.random.default_rng(7)
+    pipeline = FeaturePipeline(DEFAULT_FEATURES, CATEGORICAL_FEATURES)
+    model = StreamingLinearModel()
+    reservoir = _Reservoir(max_holdout, len(pipeline.features), rng)
+    class_counts = np.zeros(2, dtype=np.int64)
+
+    t0 = time.perf_counter()
+    rows = 0
+    for chunk in iter_labeled_chunks(source, chunk_size):
+        y = chunk["label"].astype(int).to_numpy()
+        X = pipeline.partial_fit(chunk).transform(chunk)
+        del chunk
+
+        test = rng.random(len(y)) < holdout
+        reservoir.add(X[test], y[test])
+        Xtr, ytr = X[~test], y[~test]
+        if len(ytr):
+            # class_weight="balanced" is not available with partial_fit:
+            # weight by inverse running class frequency instead
+            class_counts += np.bincount(ytr, minlength=2)[:2]
+            w = class_counts.sum() / (2.0 * np.maximum(class_counts, 1))
+            model.partial_fit(Xtr, ytr, sample_weight=w[ytr])
+
+        rows += len(y)
+        if progress:
+            elapsed = time.perf_counter() - t0
+            progress({"rows": rows, "rows_per_s": rows / elapsed if elapsed else 0.0, "peak_rss_mb": _peak_rss_mb()})
+
+    Xte, yte = reservoir.data()
+    elapsed = time.perf_counter() - t0
+    meta = {
+        "features": pipeline.features,
+        "pipeline": pipeline,
+        "eval": _metrics(*_confusion(yte, model.predict(Xte))) if len(yte) else None,
+        "train_stats": {
+            "rows": rows,
+            "holdout_rows": int(len(yte)),
+            "seconds": round(elapsed, 3),
+            "rows_per_s": rows / elapsed if elapsed else 0.0,
+            "peak_rss_mb": _peak_rss_mb(),
+        },
+    }
+
+    if os.path.dirname(model_path):
+        os.makedirs(os.path.dirname(model_path), exist_ok=True)
+    joblib.dump({"model": model, "meta": meta}, model_path)
+    # a forest exported by an earlier in-memory training would shadow this model
+    fpath = forest_path(model_path)
+    if os.path.isdir(fpath):
+        import shutil
+        shutil.rmtree(fpath)
+
+    return model, meta
+
+
+PRED_COLS = ["id", "src_ip", "dst_ip", "dst_port", "first_seen_ms"]
+
+
+def _score(model, X):
+    # one forest pass: labels are the argmax of the probabilities (what predict() does)
+    if not hasattr(model, "predict_proba"):
+        return model.predict(X), np.full(len(X), np.nan)
+    proba = model.predict_proba(X)
+    pred = model.classes_.take(np.argmax(proba, axis=1))
+    pos = np.flatnonzero(model.classes_ == 1)
+    score = proba[:, pos[0]] if len(pos) else np.zeros(len(X))
+    return pred, score
+
+
 def predict_with_model(model, flows_df: pd.DataFrame, meta):
-    X = _prep_features(flows_df, meta["features"])
-    proba = None
-    if hasattr(model, "predict_proba"):
-        proba = model.predict_proba(X)[:, 1]
-    pred = model.predict(X)
-    out = flows_df[["id", "src_ip", "dst_ip", "dst_port", "first_seen_ms"]].copy()
+    X = meta["pipeline"].transform(flows_df)
+    pred, score = _score(model, X)
+    out = flows_df[PRED_COLS + [c for c in ("cascade_tier",) if c in flows_df.columns]].copy()
     out["ml_pred"] = pred
-    out["ml_score"] = proba if proba is not None else np.nan
+    out["ml_score"] = score
     return out
 
 
-def evaluate_model(model, train_csv: str, meta):
-    df = pd.read_csv(train_csv)
-    y = df["label"].astype(int)
-    X = _prep_features(df, meta["features"])
-    pred = model.predict(X)
+def iter_flow_slices(flows_df: pd.DataFrame, chunk_size=50_000):
+    for start in range(0, len(flows_df), chunk_size):
+        yield flows_df.iloc[start:start + chunk_size]
+
+
+class PredictionWriter:
+    # Appends scored chunks to ml_predictions.csv and keeps only label counts.
+
+    def __init__(self, path, extra_cols=()):
+        self.path = path
+        self.rows = 0
+        self.counts = {}
+        self.columns = PRED_COLS + list(extra_cols) + ["ml_pred", "ml_score"]
+        pd.DataFrame(columns=self.columns).to_csv(path, index=False)
+
+    def append(self, preds: pd.DataFrame):
+        preds[self.columns].to_csv(self.path, mode="a", header=False, index=False)
+        self.rows += len(preds)
+        for label, n in preds["ml_pred"].value_counts().items():
+            self.counts[str(label)] = self.counts.get(str(label), 0) + int(n)
+
+
+def _confusion(y, pred):
+    y = np.asarray(y).astype(int)
+    pred = np.asarray(pred).astype(int)
+    tn = int(((y == 0) & (pred == 0)).sum())
+    fp = int(((y == 0) & (pred == 1)).sum())
+    fn = int(((y == 1) & (pred == 0)).sum())
+    tp = int(((y == 1) & (pred == 1)).sum())
+    return tn, fp, fn, tp
+
+
+def evaluate_model(model, train_csv: str, meta, chunk_size=100_000):
+    tn = fp = fn = tp = 0
+    for chunk in iter_labeled_chunks(train_csv, chunk_size):
+        pred = model.predict(meta["pipeline"].transform(chunk))
+        c = _confusion(chunk["label"], pred)
+        tn, fp, fn, tp = tn + c[0], fp + c[1], fn + c[2], tp + c[3]
+    return _metrics(tn, fp, fn, tp)
+
 
-    tn, fp, fn, tp = confusion_matrix(y, pred, labels=[0, 1]).ravel()
+def _metrics(tn, fp, fn, tp):
     fpr = fp / (fp + tn) if (fp + tn) else 0.0
     tpr = tp / (tp + fn) if (tp + fn) else 0.0
 
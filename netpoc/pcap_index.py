@@ -0,0 +1,351 @@
+import os
+import json
+import mmap
+import time
+import struct
+import sqlite3
+import ipaddress
+
+import numpy as np
+import pandas as pd
+
+from .store import store_path, open_store
+
+
+# Packet index sidecar for classic pcap files: one row per IP packet with a
+# direction-independent 5-tuple key, timestamp and file offset, sorted by
+# (key, ts). Carving a flow is a binary search on its key plus reads of the
+# matching records only. pcapng is not supported (editcap -F pcap converts).
+
+INDEX_NPY = "pcap_index.npy"
+INDEX_META = "pcap_index.json"
+
+INDEX_DTYPE = np.dtype([("key", "<u8"), ("ts_us", "<i8"), ("offset", "<u8"), ("length", "<u4")])
+
+RECORD_BATCH = 65_536  # record offsets collected per batch before the headers are decoded
+
+_MAGIC = {
+    b"\xd4\xc3\xb2\xa1": ("<", 1_000_000),
+    b"\xa1\xb2\xc3\xd4": (">", 1_000_000),
+    b"\x4d\x3c\xb2\xa1": ("<", 1_000_000_000),
+    b"\xa1\xb2\x3c\x4d": (">", 1_000_000_000),
+}
+
+# linktype -> (L2 header length, offset of the 16-bit ethertype or None = look at the IP version nibble)
+_LINKTYPES = {
+    1: (14, 12),      # Ethernet (+ up to two VLAN tags)
+    0: (4, None),     # BSD loopback
+    108: (4, None),   # OpenBSD loopback
+    101: (0, None),   # raw IP
+    228: (0, None),   # raw IPv4
+    229: (0, None),   # raw IPv6
+    113: (16, 14),    # Linux cooked
+    276: (20, 0),     # Linux cooked v2
+}
+
+_K1 = np.uint64(0x9E3779B97F4A7C15)
+_K2 = np.uint64(0xC2B2AE3D27D4EB4F)
+_K3 = np.uint64(0x165667B19E3779F9)
+
+
+def index_paths(out_dir):
+    return os.path.join(out_dir, INDEX_NPY), os.path.join(out_dir, INDEX_META)
+
+
+# ---------- Vectorized header parsing ----------
+
+def _be(buf, idx, n):
+    v = np.zeros(len(idx), dtype=np.uint64)
+    last = len(buf) - 1
+    for i in range(n):
+        v = (v << np.uint64(8)) | buf[np.minimum(idx + i, last)].astype(np.uint64)
+    return v
+
+
+def _fold_v6(hi, lo):
+    return (hi * _K1) ^ lo
+
+
+def _flow_key(ip_a, port_a, ip_b, port_b, proto):
+    ea = (ip_a * _K2) ^ port_a
+    eb = (ip_b * _K2) ^ port_b
+    k = (np.minimum(ea, eb) * _K1) ^ np.maximum(ea, eb)
+    return ((k ^ (k >> np.uint64(29))) * _K3) ^ proto
+
+
+def _parse(buf, data, caplen, linktype):
+    # data: offsets of packet bytes in buf; returns per-packet fields + validity mask
+    l2, et_off = _LINKTYPES[linktype]
+    end = data + caplen
+    l3 = data + l2
+    if et_off is None:
+        ver = buf[np.minimum(l3, len(buf) - 1)] >> 4
+        etype = np.where(ver == 4, 0x0800, np.where(ver == 6, 0x86DD, 0)).astype(np.uint64)
+    else:
+        etype = _be(buf, data + et_off, 2)
+        if linktype == 1:
+            for _ in range(2):
+                vlan = (etype == 0x8100) | (etype == 0x88A8)
+                l3 = np.where(vlan, l3 + 4, l3)
+                etype = np.where(vlan, _be(buf, l3 - 2, 2), etype)
+
+    is4 = (etype == 0x0800) & (l3 + 20 <= end)
+    is6 = (etype == 0x86DD) & (l3 + 40 <= end)
+
+    ihl = (buf[np.minimum(l3, len(buf) - 1)] & 0x0F).astype(np.int64) * 4
+    proto = np.where(is4, _be(buf, l3 + 9, 1), _be(buf, l3 + 6, 1))
+    ip_a = np.where(is4, _be(buf, l3 + 12, 4), _fold_v6(_be(buf, l3 + 8, 8), _be(buf, l3 + 16, 8)))
+    ip_b = np.where(is4, _be(buf, l3 + 16, 4), _fold_v6(_be(buf, l3 + 24, 8), _be(buf, l3 + 32, 8)))
+
+    l4 = np.where(is4, l3 + ihl, l3 + 40)
+    first_frag = ~is4 | ((_be(buf, l3 + 6, 2) & np.uint64(0x1FFF)) == 0)
+    has_ports = np.isin(proto, [6, 17, 132]) & first_frag & (l4 + 4 <= end)
+    zero = np.uint64(0)
+    port_a = np.where(has_ports, _be(buf, l4, 2), zero)
+    port_b = np.where(has_ports, _be(buf, l4 + 2, 2), zero)
+
+    return {
+        "ok": is4 | is6,
+        "proto": proto, "ip_a": ip_a, "ip_b": ip_b, "port_a": port_a, "port_b": port_b,
+    }
+
+
+def _headers(buf, offs, endian):
+    # the 16-byte record headers at offs, decoded together -> (ts_s, ts_frac, caplen)
+    h = buf[offs[:, None] + np.arange(16)].view(endian + "u4").astype(np.int64)
+    return h[:, 0], h[:, 1], h[:, 2]
+
+
+def _records(mm, endian):
+    # each header gives the next record's offset, so the walk itself is sequential;
+    # it only follows incl_len, in batches of RECORD_BATCH offsets, and the header
+    # fields are then read out of the buffer with numpy
+    incl_at = struct.Struct(endian + "I").unpack_from
+    buf = np.frombuffer(mm, dtype=np.uint8)
+    parts = []
+    pos, end = 24, len(mm)
+    done = False
+    while not done:
+        batch = []
+        append = batch.append
+        for _ in range(RECORD_BATCH):
+            if pos + 16 > end:
+                done = True
+                break
+            nxt = pos + 16 + incl_at(mm, pos + 8)[0]
+            if nxt > end:
+                done = True
+                break  # truncated last record
+            append(pos)
+            pos = nxt
+        offs = np.array(batch, dtype=np.int64)
+        parts.append((offs, *_headers(buf, offs, endian)))
+    del buf  # no view of mm may outlive this call (the caller closes it)
+    return tuple(np.concatenate(cols) for cols in zip(*parts))
+
+
+def _open_pcap(path):
+    with open(path, "rb") as f:
+        head = f.read(24)
+    if head[:4] == b"\x0a\x0d\x0d\x0a":
+        raise ValueError(f"{path}: pcapng is not supported by the packet index (convert with: editcap -F pcap)")
+    if len(head) < 24 or head[:4] not in _MAGIC:
+        raise ValueError(f"{path}: not a pcap file")
+    endian, ts_div = _MAGIC[head[:4]]
+    linktype = struct.unpack(endian + "I", head[20:24])[0] & 0x0FFFFFFF
+    if linktype not in _LINKTYPES:
+        raise ValueError(f"{path}: unsupported linktype {linktype}")
+    return head, endian, ts_div, linktype
+
+
+# ---------- Build ----------
+
+def build_pcap_index(pcap_path, out_dir):
+    t0 = time.perf_counter()
+    head, endian, ts_div, linktype = _open_pcap(pcap_path)
+
+    with open(pcap_path, "rb") as f:
+        mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    try:
+        offs, ts_s, ts_f, caplen = _records(mm, endian)
+        buf = np.frombuffer(mm, dtype=np.uint8)
+        p = _parse(buf, offs + 16, caplen, linktype)
+        del buf
+    finally:
+        mm.close()
+
+    ok = p["ok"]
+    key = _flow_key(p["ip_a"][ok], p["port_a"][ok], p["ip_b"][ok], p["port_b"][ok], p["proto"][ok])
+    ts_us = ts_s[ok] * 1_000_000 + ts_f[ok] * 1_000_000 // ts_div
+    order = np.lexsort((ts_us, key))
+    idx = np.empty(len(order), dtype=INDEX_DTYPE)
+    idx["key"] = key[order]
+    idx["ts_us"] = ts_us[order]
+    idx["offset"] = offs[ok][order]
+    idx["length"] = caplen[ok][order] + 16
+
+    npy_path, meta_path = index_paths(out_dir)
+    tmp = npy_path + ".tmp.npy"
+    np.save(tmp, idx)
+    os.replace(tmp, npy_path)
+
+    st = os.stat(pcap_path)
+    meta = {
+        "pcap": os.path.abspath(pcap_path),
+        "size": st.st_size,
+        "mtime_ns": st.st_mtime_ns,
+        "linktype": linktype,
+        "packets": int(len(offs)),
+        "indexed": int(len(idx)),
+        "index_bytes": os.path.getsize(npy_path),
+        "build_s": round(time.perf_counter() - t0, 3),
+    }
+    with open(meta_path, "w", encoding="utf-8") as f:
+        json.dump(meta, f, indent=2)
+    return meta
+
+
+def load_pcap_index(out_dir):
+    npy_path, meta_path = index_paths(out_dir)
+    if not os.path.exists(meta_path):
+        raise FileNotFoundError(f"No packet index in {out_dir} (run analyze with --index-pcap)")
+    with open(meta_path, "r", encoding="utf-8") as f:
+        meta = json.load(f)
+    st = os.stat(meta["pcap"])
+    if st.st_size != meta["size"] or st.st_mtime_ns != meta["mtime_ns"]:
+        raise ValueError(f"Packet index is stale: {meta['pcap']} changed since indexing")
+    return np.load(npy_path, mmap_mode="r"), meta
+
+
+# ---------- Carve ----------
+
+def _ip_fold(ip):
+    addr = ipaddress.ip_address(str(ip))
+    v = int(addr)
+    if addr.version == 4:
+        return np.array([v], dtype=np.uint64)
+    return _fold_v6(np.array([v >> 64], dtype=np.uint64), np.array([v & (2 ** 64 - 1)], dtype=np.uint64))
+
+
+def _endpoints(f):
+    def port(v):
+        return np.array([0 if pd.isna(v) else int(v)], dtype=np.uint64)
+
+    a, b = (_ip_fold(f["src_ip"]), port(f["src_port"])), (_ip_fold(f["dst_ip"]), port(f["dst_port"]))
+    proto = np.array([int(f["protocol"])], dtype=np.uint64)
+    return a, b, proto
+
+
+def flow_key(f):
+    (ip_a, port_a), (ip_b, port_b), proto = _endpoints(f)
+    return int(_flow_key(ip_a, port_a, ip_b, port_b, proto)[0])
+
+
+def _verify(chunks, offsets, linktype, f):
+    # drop key-hash collisions by re-parsing the carved records
+    buf = np.frombuffer(b"".join(chunks), dtype=np.uint8)
+    lengths = np.array([len(c) for c in chunks], dtype=np.int64)
+    starts = np.concatenate([[0], np.cumsum(lengths)[:-1]])
+    p = _parse(buf, starts + 16, lengths - 16, linktype)
+    (ip_a, port_a), (ip_b, port_b), proto = _endpoints(f)
+    fwd = (p["ip_a"] == ip_a) & (p["port_a"] == port_a) & (p["ip_b"] == ip_b) & (p["port_b"] == port_b)
+    rev = (p["ip_a"] == ip_b) & (p["port_a"] == port_b) & (p["ip_b"] == ip_a) & (p["port_b"] == port_a)
+    keep = p["ok"] & (p["proto"] == proto) & (fwd | rev)
+    return {off: c for off, c, k in zip(offsets, chunks, keep) if k}
+
+
+def carve_flows(out_dir, flows, pcap_out):
+    t0 = time.perf_counter()
+    idx, meta = load_pcap_index(out_dir)
+    keys = idx["key"]
+    head, _, _, linktype = _open_pcap(meta["pcap"])
+
+    records = {}
+    with open(meta["pcap"], "rb") as src:
+        for f in flows:
+            key = np.uint64(flow_key(f))
+            lo, hi = np.searchsorted(keys, key, "left"), np.searchsorted(keys, key, "right")
+            part = np.asarray(idx[lo:hi])
+            t_from, t_to = int(f["first_seen_ms"]) * 1000, (int(f["last_seen_ms"]) + 1) * 1000
+            part = part[(part["ts_us"] >= t_from) & (part["ts_us"] < t_to)]
+            chunks, offsets = [], []
+            for off, length in zip(part["offset"].tolist(), part["length"].tolist()):
+                if off in records:
+                    continue
+                src.seek(off)
+                chunks.append(src.read(length))
+                offsets.append(off)
+            if chunks:
+                records.update(_verify(chunks, offsets, linktype, f))
+
+    tmp = pcap_out + ".tmp"
+    with open(tmp, "wb") as dst:
+        dst.write(head)
+        for off in sorted(records):
+            dst.write(records[off])
+    os.replace(tmp, pcap_out)
+    return {
+        "path": pcap_out,
+        "flows": len(flows),
+        "packets": len(records),
+        "seconds": round(time.perf_counter() - t0, 4),
+    }
+
+
+# ---------- Flow lookup (store first, flows.csv/alerts.json as fallback) ----------
+
+CARVE_COLUMNS = ["id", "src_ip", "src_port", "dst_ip", "dst_port", "protocol", "first_seen_ms", "last_seen_ms"]
+
+
+def _query(con, sql, params):
+    con.row_factory = sqlite3.Row
+    return [dict(r) for r in con.execute(sql, params).fetchall()]
+
+
+def lookup_flows(out_dir, flow_ids=(), alert=None):
+    # alert: position in alerts.json; aggregated alerts carve their sample flows,
+    # alerts without a flow id (R010) every flow of their src/dst pair
+    db = store_path(out_dir)
+    con = open_store(db) if os.path.exists(db) else None
+    try:
+        where = []
+        if alert is not None:
+            if con is not None:
+                rows = _query(con, "SELECT * FROM alerts WHERE rowid = ?", [int(alert) + 1])
+            else:
+                with open(os.path.join(out_dir, "alerts.json"), "r", encoding="utf-8") as f:
+                    all_alerts = json.load(f)
+                rows = all_alerts[int(alert):int(alert) + 1]
+            if not rows:
+                raise ValueError(f"No alert #{alert} in {out_dir}")
+            a = rows[0]
+            samples = a.get("sample_flow_ids")
+            samples = json.loads(samples) if isinstance(samples, str) else (samples or [])
+            if samples:
+                flow_ids = list(flow_ids) + [int(i) for i in samples]
+            elif a.get("flow_id") is not None and not pd.isna(a["flow_id"]):
+                flow_ids = list(flow_ids) + [int(a["flow_id"])]
+            else:
+                cond = {"src_ip": a.get("src_ip"), "dst_ip": a.get("dst_ip"), "dst_port": a.get("dst_port")}
+                where.append({k: v for k, v in cond.items() if v is not None and not pd.isna(v)})
+        if flow_ids:
+            where.append({"id": [int(i) for i in flow_ids]})
+
+        flows = []
+        if con is not None:
+            cols = ",".join(CARVE_COLUMNS)
+            for cond in where:
+                sql = " AND ".join(f"{k} IN ({','.join('?' * len(v))})" if isinstance(v, list) else f"{k} = ?" for k, v in cond.items())
+                params = [x for v in cond.values() for x in (v if isinstance(v, list) else [v])]
+                flows += _query(con, f"SELECT {cols} FROM flows WHERE {sql}", params)
+        else:
+            df = pd.read_csv(os.path.join(out_dir, "flows.csv"), usecols=CARVE_COLUMNS)
+            for cond in where:
+                m = pd.Series(True, index=df.index)
+                for k, v in cond.items():
+                    m &= df[k].isin(v) if isinstance(v, list) else (df[k] == v)
+                flows += df[m].to_dict("records")
+    finally:
+        if con is not None:
+            con.close()
+    return flows
@@ -0,0 +1,270 @@
+import os
+import time
+import threading
+from contextlib import contextmanager
+
+import pandas as pd
+
+from .flows import FLOW_COLS, ALL_COLS, pcap_to_flows_df, iter_flow_chunks, nfstream_features
+from .ingest import capture_paths, is_plain_pcap, describe_source
+from .detection_rules import RULE_COLUMNS, run_python_rules, run_flow_rules, run_aggregate_rules
+from .sigma_rules import sigma_columns, run_sigma_rules
+from .report import REPORT_COLUMNS, build_report
+
+
+# One analyze run with already-loaded components (Sigma rules, scoring model,
+# cascade config), shared by `netpoc analyze` and the `netpoc serve` workers.
+# Optional stages (ML, cascade, stream, enrichment) import their modules only
+# when enabled.
+
+def _flow_ids(alerts):
+    return {a["flow_id"] for a in alerts if a.get("flow_id") is not None}
+
+
+def _required_columns(sigma_rules, model_meta, cascade, index_pcap, baseline=False, archive=False):
+    # extraction materializes only the union of what the enabled stages read
+    need = {
+        "python rules": RULE_COLUMNS,
+        "sigma": sigma_columns(sigma_rules) if sigma_rules else [],
+        "ml": list(model_meta["features"]) if model_meta else [],
+        "report": REPORT_COLUMNS,
+    }
+    if cascade:
+        from .cascade import COLUMNS
+
+        need["cascade"] = COLUMNS
+    if baseline:
+        from .baseline import COLUMNS as BASELINE_COLUMNS
+
+        need["baseline"] = BASELINE_COLUMNS
+    if archive:
+        need["archive"] = FLOW_COLS
+    if index_pcap:
+        from .pcap_index import CARVE_COLUMNS
+
+        need["carve"] = CARVE_COLUMNS
+    wanted = set().union(*need.values())
+    cols = [c for c in ALL_COLS if c in wanted]
+    return cols, {
+        "columns": cols,
+        "pruned": [c for c in FLOW_COLS if c not in wanted],
+        "unknown": sorted(wanted - set(ALL_COLS)),
+        "by_stage": {k: v for k, v in need.items() if v},
+        "nfstream": nfstream_features(cols),
+    }
+
+
+def finish_analysis(out, source, flows_df, py_alerts, sigma_alerts, ml_info, timings, enrich=True, plot_workers=None,
+                    store=True, aggregate_cfg=None, column_info=None, baseline_info=None, pairs=None, cluster=None):
+    # downstream (alerts.json, store, plots, enrichment, map) sees incidents, not per-flow hits;
+    # the live stream and the ML cascade used the raw alerts
+    raw_alerts = len(py_alerts) + len(sigma_alerts)
+    aggregation = None
+    if aggregate_cfg is not None:
+        from .aggregate import aggregate_alerts
+
+        with _timed(timings, "aggregate"):
+            agg, aggregation = aggregate_alerts(py_alerts + sigma_alerts, flows_df, aggregate_cfg)
+            py_alerts = [a for a in agg if a["type"] != "sigma"]
+            sigma_alerts = [a for a in agg if a["type"] == "sigma"]
+
+    all_alerts = py_alerts + sigma_alerts
+
+    enrichment = {}
+    if enrich:
+        from .enrich import enrich_suspicious_ips
+
+        with _timed(timings, "enrich"):
+            enrichment = enrich_suspicious_ips(all_alerts)
+
+    with _timed(timings, "report"):
+        report_paths = build_report(
+            out_dir=out,
+            pcap_path=source,
+            flows_df=flows_df,
+            python_alerts=py_alerts,
+            sigma_alerts=sigma_alerts,
+            ml_info=ml_info,
+            enrichment=enrichment,
+            plot_workers=plot_workers,
+            store=store,
+            columns=column_info,
+            aggregation=aggregation,
+            baseline=baseline_info,
+            pairs=pairs,
+            cluster=cluster,
+        )
+
+    return {
+        "report": report_paths,
+        "timings": timings,
+        "flows": int(len(flows_df)),
+        "alerts": len(all_alerts),
+        "raw_alerts": raw_alerts,
+    }
+
+
+@contextmanager
+def _timed(timings, stage):
+    t0 = time.perf_counter()
+    try:
+        yield
+    finally:
+        timings[stage] = round(timings.get(stage, 0.0) + time.perf_counter() - t0, 4)
+
+
+def run_analysis(
+    out, pcap=None, flows_df=None, sigma_rules=(), model=None, train_csv=None, enrich=True,
+    plot_workers=None, store=True, stream=False, chunk_size=50_000, cascade_cfg=None, index_pcap=False,
+    prune_columns=True, aggregate_cfg=None, baseline=None, baseline_cfg=None, baseline_update=True,
+    archive=None,
+):
+    os.makedirs(out, exist_ok=True)
+    timings = {}
+
+    columns, column_info = FLOW_COLS, None
+    if prune_columns and flows_df is None:
+        columns, column_info = _required_columns(
+            sigma_rules, model[1] if model is not None else None, cascade_cfg is not None, index_pcap,
+            baseline=bool(baseline), archive=bool(archive),
+        )
+
+    ingest = {}
+
+    # packet index for `netpoc carve`: its own read of the pcap, overlapped with extraction
+    pcap_index = {}
+    indexer = None
+    if index_pcap and pcap and flows_df is None and not is_plain_pcap(pcap):
+        pcap_index["error"] = "the packet index needs a single uncompressed pcap"
+    elif index_pcap and pcap and flows_df is None:
+        from .pcap_index import build_pcap_index
+
+        def run_index():
+            t0 = time.perf_counter()
+            try:
+                pcap_index.update(build_pcap_index(capture_paths(pcap)[0], out))
+            except (OSError, ValueError) as e:
+                pcap_index["error"] = str(e)
+            timings["pcap_index"] = round(time.perf_counter() - t0, 4)
+
+        indexer = threading.Thread(target=run_index, name="pcap-index", daemon=True)
+        indexer.start()
+
+    ml_info = {}
+    ml_writer = None
+    tiers = None
+    if model is not None:
+        from .ml import predict_with_model, evaluate_model, PredictionWriter, iter_flow_slices
+
+        model_obj, model_meta = model
+        if cascade_cfg is not None:
+            from .cascade import Cascade
+
+            tiers = Cascade(cascade_cfg)
+        ml_writer = PredictionWriter(
+            os.path.join(out, "ml_predictions.csv"),
+            extra_cols=["cascade_tier"] if tiers else (),
+        )
+
+    def score(chunk, alert_flow_ids):
+        with _timed(timings, "ml"):
+            if tiers:
+                chunk = tiers.select(chunk, alert_flow_ids)
+                if len(chunk) == 0:
+                    return
+            t0 = time.perf_counter()
+            ml_writer.append(predict_with_model(model_obj, chunk, model_meta))
+            if tiers:
+                tiers.record_ml(len(chunk), time.perf_counter() - t0)
+
+    if stream and flows_df is None:
+        from .alert_stream import AlertStreamWriter
+
+        writer = AlertStreamWriter(out)
+        chunks, py_alerts, sigma_alerts = [], [], []
+        flow_iter = iter_flow_chunks(pcap, chunk_size=chunk_size, ingest_stats=ingest, columns=columns)
+        while True:
+            with _timed(timings, "extract"):
+                chunk = next(flow_iter, None)
+            if chunk is None:
+                break
+            with _timed(timings, "rules"):
+                chunk_py = run_flow_rules(chunk)
+                chunk_sigma = run_sigma_rules(chunk, sigma_rules) if sigma_rules else []
+                writer.append(chunk_py + chunk_sigma, flows=len(chunk))
+            if ml_writer:
+                score(chunk, _flow_ids(chunk_py + chunk_sigma))
+            py_alerts += chunk_py
+            sigma_alerts += chunk_sigma
+            chunks.append(chunk)
+        flows_df = pd.concat(chunks, ignore_index=True) if chunks else pd.DataFrame(columns=columns)
+        with _timed(timings, "rules"):
+            agg_alerts = run_aggregate_rules(flows_df)
+            writer.append(agg_alerts)
+            writer.close()
+        py_alerts += agg_alerts
+    else:
+        if flows_df is None:
+            with _timed(timings, "extract"):
+                flows_df = pcap_to_flows_df(pcap, ingest_stats=ingest, columns=columns)
+        with _timed(timings, "rules"):
+            py_alerts = run_python_rules(flows_df)
+            sigma_alerts = run_sigma_rules(flows_df, sigma_rules) if sigma_rules else []
+        if ml_writer:
+            # the slices bound the feature matrix and predictions, not the flows: the
+            # aggregate rules, flows.csv and the report read the whole frame anyway
+            alert_flow_ids = _flow_ids(py_alerts + sigma_alerts)
+            for part in iter_flow_slices(flows_df, chunk_size):
+                score(part, alert_flow_ids)
+
+    # flow archive for `netpoc hunt`; a capture already archived (same files) is not added twice
+    archive_info = None
+    if archive:
+        from .archive import archive_flows, source_key
+
+        with _timed(timings, "archive"):
+            run_key = source_key(capture_paths(pcap)) if pcap else None
+            archive_info = archive_flows(archive, flows_df, describe_source(pcap) if pcap else "(flow batch)", run=run_key)
+            archive_info["path"] = archive
+
+    # per-host baselines: score this run's host windows, then fold them into the store
+    baseline_info = None
+    if baseline:
+        from .baseline import run_baseline
+
+        with _timed(timings, "baseline"):
+            flows_df, scored, b_alerts, b_summary = run_baseline(baseline, flows_df, baseline_cfg, update=baseline_update)
+            windows_csv = os.path.join(out, "host_windows.csv")
+            scored.to_csv(windows_csv, index=False)
+        py_alerts += b_alerts
+        baseline_info = {
+            "summary": b_summary,
+            "windows_csv": windows_csv,
+            "top": scored[scored["score"].notna()].nlargest(10, "score"),
+        }
+
+    if indexer is not None:
+        indexer.join()
+
+    if ml_writer:
+        ml_info["preds_csv"] = ml_writer.path
+        ml_info["pred_counts"] = ml_writer.counts
+        if tiers:
+            ml_info["cascade"] = tiers.summary()
+        if train_csv:
+            # held-out metrics from training; full-set scoring only as a fallback
+            ml_info["eval"] = model_meta.get("eval") or evaluate_model(model_obj, train_csv, model_meta)
+
+    result = finish_analysis(
+        out, describe_source(pcap) if pcap else "(flow batch)", flows_df, py_alerts, sigma_alerts, ml_info, timings,
+        enrich=enrich, plot_workers=plot_workers, store=store, aggregate_cfg=aggregate_cfg,
+        column_info=column_info, baseline_info=baseline_info,
+    )
+    return {
+        **result,
+        "baseline": baseline_info["summary"] if baseline_info else None,
+        "archive": archive_info,
+        "ml_pred_counts": ml_info.get("pred_counts"),
+        "pcap_index": pcap_index or None,
+        "ingest": ingest or None,
+    }
@@ -1,53 +1,151 @@
 import os
 import json
+import pickle
+import hashlib
+import threading
+from concurrent.futures import ProcessPoolExecutor
+
 import numpy as np
 import pandas as pd
+import matplotlib
+matplotlib.use("Agg")
 import matplotlib.pyplot as plt
 import matplotlib.dates as mdates
+from matplotlib.colors import LogNorm
 
 from .report_latex import build_report_tex
 from .flows import summary_pairs
 from .report_map import build_map_optional
+from .rollups import write_rollups
+from .store import write_store
 
 
 # ---------- Plots ----------
+#
+# Every plot is an independent job that receives only small, pre-aggregated
+# inputs (never the full flows_df), so it can run in a worker process and be
+# skipped when its input hash did not change since the last run.
+
+def _num(df, col, dtype="float64"):
+    if col not in df.columns:
+        return np.zeros(len(df), dtype=dtype)
+    return pd.to_numeric(df[col], errors="coerce").fillna(0).to_numpy(dtype=dtype)
+
 
-def _plot_top_flows_bytes(flows_df, out_png, top_n=10):
-    if flows_df is None or len(flows_df) == 0:
-        return None
+def _flow_labels(df, idx):
+    src = df["src_ip"].to_numpy()[idx].astype(str)
+    dst = df["dst_ip"].to_numpy()[idx].astype(str)
+    port = _num(df, "dst_port", "int64")[idx].astype(str)
+    return [f"{s}→{d}:{p}" for s, d, p in zip(src, dst, port)]
 
-    df = flows_df.copy()
-    df["src2dst_bytes"] = pd.to_numeric(df["src2dst_bytes"], errors="coerce").fillna(0)
-    df["dst_port"] = pd.to_numeric(df["dst_port"], errors="coerce").fillna(0)
 
-    top = df.sort_values("src2dst_bytes", ascending=False).head(top_n)
-    if len(top) == 0:
-        return None
+def _time_bin_size(span):
+    if span <= pd.Timedelta(minutes=2):
+        return "10s"
+    if span <= pd.Timedelta(hours=2):
+        return "1min"
+    if span <= pd.Timedelta(days=2):
+        return "1h"
+    return "1D"
+
+
+# flow columns read by the plots, pairs summary, rollups and store indexes
+REPORT_COLUMNS = [
+    "id", "src_ip", "dst_ip", "dst_port",
+    "bidirectional_packets", "bidirectional_bytes", "src2dst_bytes", "dst2src_bytes", "first_seen_ms",
+]
+
+SCATTER_MAX_FLOWS = 2000
+_HIST_MAX_TIME_BINS = 240
+_HIST_BYTE_BINS = 48
+
+
+def _flows_time_hist(first_seen_ms, s2d):
+    t0, t1 = int(first_seen_ms.min()), int(first_seen_ms.max())
+    bin_size = _time_bin_size(pd.Timedelta(milliseconds=t1 - t0))
+    bin_ms = int(pd.to_timedelta(bin_size).total_seconds() * 1000)
+
+    start = t0 - t0 % bin_ms
+    n_bins = (t1 - start) // bin_ms + 1
+    if n_bins > _HIST_MAX_TIME_BINS:
+        # too many calendar bins for one figure: widen them, keep the grid fixed
+        bin_ms = -(-(t1 - start + 1) // _HIST_MAX_TIME_BINS)
+        n_bins = _HIST_MAX_TIME_BINS
+        bin_size = str(pd.Timedelta(milliseconds=bin_ms))
+    t_edges = start + np.arange(n_bins + 1, dtype="int64") * bin_ms
+
+    # bytes span orders of magnitude -> bin on log10(bytes + 1)
+    y = np.log10(s2d + 1.0)
+    y_edges = np.linspace(0.0, max(float(y.max()), 1.0), _HIST_BYTE_BINS + 1)
+
+    counts, _, _ = np.histogram2d(first_seen_ms, y, bins=[t_edges, y_edges])
+    return {
+        "mode": "hist",
+        "t_edges_ms": t_edges,
+        "log_bytes_edges": y_edges,
+        "counts": counts.astype("int64"),
+        "bin_size": bin_size,
+    }
+
+
+def _top_idx(values, top_n):
+    if len(values) <= top_n:
+        return np.argsort(-values, kind="stable")
+    idx = np.argpartition(-values, top_n - 1)[:top_n]
+    return idx[np.argsort(-values[idx], kind="stable")]
+
+
+def _prep_plot_data(flows_df, alerts, top_n=10, scatter_max_flows=SCATTER_MAX_FLOWS):
+    data = {}
+
+    if flows_df is not None and len(flows_df) > 0:
+        s2d = _num(flows_df, "src2dst_bytes")
+        d2s = _num(flows_df, "dst2src_bytes")
+        bidir = _num(flows_df, "bidirectional_bytes")
+
+        idx = _top_idx(s2d, top_n)
+        data["top_flows"] = {"labels": _flow_labels(flows_df, idx), "values": s2d[idx]}
+
+        idx = _top_idx(bidir, top_n)
+        data["direction"] = {
+            "labels": _flow_labels(flows_df, idx),
+            "s2d": s2d[idx],
+            "d2s": d2s[idx],
+        }
+
+        first_seen = _num(flows_df, "first_seen_ms", "int64")
+        if len(flows_df) <= scatter_max_flows:
+            data["scatter"] = {"mode": "bubbles", "first_seen_ms": first_seen, "s2d": s2d, "bidir": bidir}
+        else:
+            data["scatter"] = _flows_time_hist(first_seen, s2d)
 
-    labels = [f"{r['src_ip']}→{r['dst_ip']}:{int(r['dst_port'])}" for _, r in top.iterrows()]
-    values = top["src2dst_bytes"].values
+    if alerts:
+        keys = [(a.get("rule_id") or a.get("rule_name") or "unknown") for a in alerts]
+        counts = pd.Series(keys).value_counts()
+        data["by_rule"] = {"labels": counts.index.astype(str).tolist(), "values": counts.to_numpy()}
 
+        ts = [a.get("ts_ms") for a in alerts if a.get("ts_ms") is not None]
+        if ts:
+            data["alerts_ts"] = {"ts_ms": np.asarray(ts, dtype="int64")}
+
+    return data
+
+
+def _plot_top_flows_bytes(out_png, labels, values):
     plt.figure(figsize=(10, 4))
     plt.barh(labels, values)
     plt.gca().invert_yaxis()
     plt.xlabel("src2dst_bytes")
-    plt.title(f"Top {min(top_n, len(top))} flows by src→dst bytes")
+    plt.title(f"Top {len(labels)} flows by src→dst bytes")
     plt.tight_layout()
     plt.savefig(out_png, dpi=180)
     plt.close()
     return out_png
 
 
-def _plot_alerts_by_rule(alerts, out_png):
-    if not alerts:
-        return None
-
-    # prefer rule_id, fallback to rule_name
-    keys = [(a.get("rule_id") or a.get("rule_name") or "unknown") for a in alerts]
-    counts = pd.Series(keys).value_counts()
-
+def _plot_alerts_by_rule(out_png, labels, values):
     plt.figure(figsize=(6, 3))
-    plt.bar(counts.index.astype(str), counts.values)
+    plt.bar(labels, values)
     plt.xlabel("Rule")
     plt.ylabel("Alerts")
     plt.title("Alerts by rule")
@@ -57,35 +155,16 @@ def _plot_alerts_by_rule(alerts, out_png):
     return out_png
 
 
-def _plot_flow_direction_bytes(flows_df, out_png, top_n=10):
-    if flows_df is None or len(flows_df) == 0:
-        return None
-
-    df = flows_df.copy()
-    df["src2dst_bytes"] = pd.to_numeric(df["src2dst_bytes"], errors="coerce").fillna(0)
-    df["dst2src_bytes"] = pd.to_numeric(df["dst2src_bytes"], errors="coerce").fillna(0)
-    df["bidirectional_bytes"] = pd.to_numeric(df["bidirectional_bytes"], errors="coerce").fillna(0)
-    df["dst_port"] = pd.to_numeric(df["dst_port"], errors="coerce").fillna(0)
-
-    top = df.sort_values("bidirectional_bytes", ascending=False).head(top_n)
-    if len(top) == 0:
-        return None
-
-    labels = [f"{r['src_ip']}→{r['dst_ip']}:{int(r['dst_port'])}" for _, r in top.iterrows()]
-    y = np.arange(len(top))
+def _plot_flow_direction_bytes(out_png, labels, s2d, d2s):
+    y = np.arange(len(labels))
 
     plt.figure(figsize=(10, 4))
-    plt.barh(y, top["src2dst_bytes"].values, label="src→dst bytes")
-    plt.barh(
-        y,
-        top["dst2src_bytes"].values,
-        left=top["src2dst_bytes"].values,
-        label="dst→src bytes",
-    )
+    plt.barh(y, s2d, label="src→dst bytes")
+    plt.barh(y, d2s, left=s2d, label="dst→src bytes")
     plt.yticks(y, labels)
     plt.gca().invert_yaxis()
     plt.xlabel("Bytes")
-    plt.title(f"Top {len(top)} flows: traffic direction split")
+    plt.title(f"Top {len(labels)} flows: traffic direction split")
     plt.legend()
     plt.tight_layout()
     plt.savefig(out_png, dpi=180)
@@ -93,26 +172,33 @@ def _plot_flow_direction_bytes(flows_df, out_png, top_n=10):
     return out_png
 
 
-def _plot_flows_scatter_over_time(flows_df, out_png):
-    if flows_df is None or len(flows_df) == 0:
-        return None
+def _plot_flows_bubbles(first_seen_ms, s2d, bidir):
+    x = pd.to_datetime(first_seen_ms, unit="ms")
+    size = (bidir / max(bidir.max(), 1)) * 600 + 80  # scale
+
+    plt.scatter(x, s2d, s=size)
+    plt.ylabel("src→dst bytes")
+    plt.title("Flows over time (bubble size = total bytes)")
+
 
-    df = flows_df.copy()
-    df["first_seen_ms"] = pd.to_numeric(df["first_seen_ms"], errors="coerce").fillna(0).astype("int64")
-    df["src2dst_bytes"] = pd.to_numeric(df["src2dst_bytes"], errors="coerce").fillna(0)
-    df["bidirectional_bytes"] = pd.to_numeric(df["bidirectional_bytes"], errors="coerce").fillna(0)
+def _plot_flows_hist(t_edges_ms, log_bytes_edges, counts, bin_size):
+    x = mdates.date2num(pd.to_datetime(t_edges_ms, unit="ms").to_pydatetime())
+    masked = np.ma.masked_equal(counts.T, 0)
 
-    x = pd.to_datetime(df["first_seen_ms"], unit="ms", utc=True).dt.tz_convert(None)
-    y = df["src2dst_bytes"].values
+    mesh = plt.pcolormesh(x, log_bytes_edges, masked, norm=LogNorm(vmin=1, vmax=max(int(counts.max()), 1)), cmap="viridis")
+    plt.colorbar(mesh, label="Flows per bin")
+    plt.ylabel("log10(src→dst bytes + 1)")
+    plt.title(f"Flows over time (density, bin={bin_size}, {int(counts.sum())} flows)")
+    plt.gca().xaxis_date()
 
-    size = df["bidirectional_bytes"].values
-    size = (size / max(size.max(), 1)) * 600 + 80  # scale
 
+def _plot_flows_scatter_over_time(out_png, mode, **data):
     plt.figure(figsize=(10, 4))
-    plt.scatter(x, y, s=size)
+    if mode == "bubbles":
+        _plot_flows_bubbles(**data)
+    else:
+        _plot_flows_hist(**data)
     plt.xlabel("First seen time")
-    plt.ylabel("src→dst bytes")
-    plt.title("Flows over time (bubble size = total bytes)")
     plt.gca().xaxis.set_major_formatter(mdates.DateFormatter("%Y-%m-%d %H:%M:%S"))
     plt.gca().xaxis.set_major_locator(mdates.AutoDateLocator())
     plt.xticks(rotation=30, ha="right")
@@ -122,25 +208,9 @@ def _plot_flows_scatter_over_time(flows_df, out_png):
     return out_png
 
 
-def _plot_alerts_over_time(alerts, out_png):
-    if not alerts:
-        return None
-
-    ts = [a.get("ts_ms") for a in alerts if a.get("ts_ms") is not None]
-    if not ts:
-        return None
-
-    dt = pd.to_datetime(pd.Series(ts, dtype="int64"), unit="ms", utc=True).sort_values()
-    span = dt.iloc[-1] - dt.iloc[0]
-
-    if span <= pd.Timedelta(minutes=2):
-        bin_size = "10s"
-    elif span <= pd.Timedelta(hours=2):
-        bin_size = "1min"
-    elif span <= pd.Timedelta(days=2):
-        bin_size = "1H"
-    else:
-        bin_size = "1D"
+def _plot_alerts_over_time(out_png, ts_ms):
+    dt = pd.to_datetime(pd.Series(ts_ms, dtype="int64"), unit="ms", utc=True).sort_values()
+    bin_size = _time_bin_size(dt.iloc[-1] - dt.iloc[0])
 
     counts = dt.dt.floor(bin_size).value_counts().sort_index()
 
@@ -176,9 +246,79 @@ def _plot_alerts_over_time(alerts, out_png):
     return out_png
 
 
+_PLOT_JOBS = [
+    # (plot data key, output file, render function)
+    ("top_flows", "top_flows_bytes.png", _plot_top_flows_bytes),
+    ("by_rule", "alerts_by_rule.png", _plot_alerts_by_rule),
+    ("direction", "flow_direction_bytes.png", _plot_flow_direction_bytes),
+    ("scatter", "flows_scatter_over_time.png", _plot_flows_scatter_over_time),
+    ("alerts_ts", "alerts_over_time.png", _plot_alerts_over_time),
+]
+
+_PLOT_CACHE = ".plot_cache.json"
+
+# pyplot keeps global state: in-process rendering from several threads
+# (netpoc serve workers) must not interleave
+_INLINE_PLOT_LOCK = threading.Lock()
+
+
+def _data_hash(fn, kwargs):
+    h = hashlib.sha1(fn.__name__.encode())
+    for k in sorted(kwargs):
+        h.update(k.encode())
+        h.update(pickle.dumps(kwargs[k], protocol=4))
+    return h.hexdigest()
+
+
+def _run_plot_job(job):
+    fn, out_png, kwargs = job
+    return fn(out_png, **kwargs)
+
+
+def render_plots(out_dir, plot_data, workers=None):
+    cache_path = os.path.join(out_dir, _PLOT_CACHE)
+    try:
+        with open(cache_path, "r", encoding="utf-8") as f:
+            cache = json.load(f)
+    except (OSError, ValueError):
+        cache = {}
+
+    pending = []
+    new_cache = {}
+    for key, name, fn in _PLOT_JOBS:
+        out_png = os.path.join(out_dir, name)
+        kwargs = plot_data.get(key)
+        if kwargs is None:
+            # no data -> do not leave a stale plot from a previous run behind
+            if os.path.exists(out_png):
+                os.remove(out_png)
+            continue
+        digest = _data_hash(fn, kwargs)
+        new_cache[name] = digest
+        if cache.get(name) == digest and os.path.exists(out_png):
+            continue
+        pending.append((fn, out_png, kwargs))
+
+    if workers is None:
+        workers = min(len(pending), os.cpu_count() or 1)
+    if workers > 1 and len(pending) > 1:
+        with ProcessPoolExecutor(max_workers=workers) as ex:
+            list(ex.map(_run_plot_job, pending))
+    else:
+        with _INLINE_PLOT_LOCK:
+            for job in pending:
+                _run_plot_job(job)
+
+    with open(cache_path, "w", encoding="utf-8") as f:
+        json.dump(new_cache, f, indent=2)
+
+    return {name: os.path.join(out_dir, name) for name in new_cache}
+
+
 # ---------- Report ----------
 
-def build_report(out_dir, pcap_path, flows_df, python_alerts, sigma_alerts, ml_info, enrichment):
+def build_report(out_dir, pcap_path, flows_df, python_alerts, sigma_alerts, ml_info, enrichment, plot_workers=None, store=True, columns=None, aggregation=None,
+                 baseline=None, pairs=None, cluster=None):
     os.makedirs(out_dir, exist_ok=True)
 
     all_alerts = (python_alerts or []) + (sigma_alerts or [])
@@ -190,14 +330,12 @@ def build_report(out_dir, pcap_path, flows_df, python_alerts, sigma_alerts, ml_i
     scatter_png = os.path.join(out_dir, "flows_scatter_over_time.png")
     alerts_png = os.path.join(out_dir, "alerts_over_time.png")  # optional timeline
 
-    _plot_top_flows_bytes(flows_df, top_png)
-    _plot_alerts_by_rule(all_alerts, byrule_png)
-    _plot_flow_direction_bytes(flows_df, direction_png, top_n=10)
-    _plot_flows_scatter_over_time(flows_df, scatter_png)
-    _plot_alerts_over_time(all_alerts, alerts_png)
+    plot_data = _prep_plot_data(flows_df, all_alerts, top_n=10)
+    render_plots(out_dir, plot_data, workers=plot_workers)
 
     # Tables / exports
-    pairs = summary_pairs(flows_df)
+    if pairs is None:
+        pairs = summary_pairs(flows_df)
 
     flows_csv = os.path.join(out_dir, "flows.csv")
     flows_df.to_csv(flows_csv, index=False)
@@ -213,6 +351,16 @@ def build_report(out_dir, pcap_path, flows_df, python_alerts, sigma_alerts, ml_i
     if ml_info and ml_info.get("preds") is not None:
         ml_csv = os.path.join(out_dir, "ml_predictions.csv")
         ml_info["preds"].to_csv(ml_csv, index=False)
+    elif ml_info and ml_info.get("preds_csv"):
+        # already written chunk by chunk while scoring
+        ml_csv = ml_info["preds_csv"]
+
+    rollups = write_rollups(
+        out_dir, flows_df, all_alerts, pairs,
+        ml_preds=(ml_info or {}).get("preds"),
+        ml_counts=(ml_info or {}).get("pred_counts"),
+    )
+    store_db = write_store(out_dir, flows_df, all_alerts) if store else None
 
     map_html = build_map_optional(out_dir, all_alerts, enrichment)
 
@@ -224,13 +372,38 @@ def build_report(out_dir, pcap_path, flows_df, python_alerts, sigma_alerts, ml_i
 
         f.write("## A.1 — NFStream PCAP → flows\n")
         f.write(f"- Export: `{os.path.basename(flows_csv)}`\n")
-        f.write(f"- Count flows: **{len(flows_df)}**\n\n")
+        f.write(f"- Count flows: **{len(flows_df)}**\n")
+        if columns:
+            nf = columns["nfstream"]
+            f.write(f"- Columns extracted ({len(columns['columns'])}): {', '.join(columns['columns'])}\n")
+            f.write(f"- Pruned (no stage reads them; not in flows.csv, NULL in netpoc.sqlite): {', '.join(columns['pruned']) or '-'}\n")
+            f.write(
+                f"- NFStream statistical features: {'on' if nf['statistical_analysis'] else 'off'}, "
+                f"application dissection: {'on' if nf['n_dissections'] else 'off'}\n"
+            )
+            if columns["unknown"]:
+                f.write(f"- Requested but not NFStream columns: {', '.join(columns['unknown'])}\n")
+            f.write("\n")
+            f.write(pd.DataFrame(
+                [{"stage": k, "columns": ", ".join(v)} for k, v in columns["by_stage"].items()]
+            ).to_markdown(index=False))
+            f.write("\n")
+        f.write("\n")
 
         f.write("## A.2 — Summary stats (src_ip → dst_ip)\n")
         f.write(f"- Export: `{os.path.basename(pairs_csv)}`\n\n")
         f.write(pairs.head(15).to_markdown(index=False))
         f.write("\n\n")
 
+        if cluster:
+            f.write("## A.3 — Sharded run (coordinator + workers)\n")
+            f.write(
+                f"- Workers: **{len(cluster['workers'])}**, host-key partitions: **{cluster['partitions']}** "
+                f"(R010 counts by dst_ip, pair summary by src_ip; partials moved: {cluster['partial_bytes']} bytes)\n\n"
+            )
+            f.write(pd.DataFrame(cluster["tasks"]).to_markdown(index=False))
+            f.write("\n\n")
+
         f.write("## V.0 — Top flows by bytes\n")
         if os.path.exists(top_png):
             f.write(f"![topflows]({os.path.basename(top_png)})\n\n")
@@ -252,9 +425,14 @@ def build_report(out_dir, pcap_path, flows_df, python_alerts, sigma_alerts, ml_i
         else:
             f.write("- (no direction split plot)\n\n")
 
-        f.write("## V.3 — Flows over time (bubble plot)\n")
+        f.write("## V.3 — Flows over time\n")
         if os.path.exists(scatter_png):
             f.write(f"![scatter]({os.path.basename(scatter_png)})\n\n")
+            if plot_data["scatter"]["mode"] == "hist":
+                f.write(
+                    f"More than {SCATTER_MAX_FLOWS} flows: binned into a time × bytes density map "
+                    f"(bin={plot_data['scatter']['bin_size']}) instead of one bubble per flow.\n\n"
+                )
         else:
             f.write("- (no flows scatter plot)\n\n")
 
@@ -270,6 +448,39 @@ def build_report(out_dir, pcap_path, flows_df, python_alerts, sigma_alerts, ml_i
         f.write("## D.2 — Sigma rules\n")
         f.write(f"- Alerts: **{len(sigma_alerts or [])}**\n\n")
 
+        if aggregation:
+            f.write("## D.3 — Alert aggregation\n")
+            f.write(
+                f"- Key: {', '.join(aggregation['key'])}, window: {aggregation['window_s']} s (per-rule overrides apply)\n"
+                f"- Raw alerts: **{aggregation['raw']}** → aggregated: **{aggregation['aggregates']}** "
+                f"(suppressed: {aggregation['suppressed']}, throttled: {aggregation['throttled']})\n\n"
+            )
+            if aggregation["by_rule"]:
+                f.write(pd.DataFrame(aggregation["by_rule"]).to_markdown(index=False))
+                f.write("\n\n")
+
+        if baseline:
+            s = baseline["summary"]
+            f.write("## B.1 — Host baselines (EWMA per host and time bucket)\n")
+            f.write(
+                f"- Store: `{s['path']}` — hosts: **{s['hosts']}** (new: {s['new_hosts']}), "
+                f"bucket: {s['config']['bucket_s']} s, alpha: {s['config']['alpha']}\n"
+                f"- Host windows: **{s['windows']}**, scored: {s['scored_windows']} "
+                f"(hosts need {s['config']['min_history']} buckets of history), folded into the store: {s['updated_windows']}\n"
+                f"- Anomalies (score ≥ {s['config']['threshold']}): **{s['anomalies']}** — `{os.path.basename(baseline['windows_csv'])}`\n\n"
+            )
+            if len(baseline["top"]):
+                f.write(baseline["top"].round(2).to_markdown(index=False))
+                f.write("\n\n")
+
+        casc = (ml_info or {}).get("cascade")
+        if casc:
+            f.write("## ML.0 — Detection cascade (prefilters before ML)\n")
+            f.write(pd.DataFrame(casc["tiers"]).to_markdown(index=False))
+            f.write("\n\n")
+            f.write(f"- Flows in: **{casc['flows_in']}**, ML-scored: **{casc['ml_flows']}**, dropped before ML: **{casc['dropped']}**\n")
+            f.write(f"- ML time: {casc['ml_seconds']} s, estimated time saved: **{casc['est_seconds_saved']} s**\n\n")
+
         f.write("## ML.1/ML.2 — ML classification + metrics\n")
         if ml_csv:
             f.write(f"- Predictions: `{os.path.basename(ml_csv)}`\n")
@@ -285,12 +496,17 @@ def build_report(out_dir, pcap_path, flows_df, python_alerts, sigma_alerts, ml_i
 
         if map_html:
             f.write("## V.10 — Map (optional)\n")
-            f.write(f"- Map: `{os.path.basename(map_html)}`\n\n")
+            f.write(f"- Map: `{os.path.basename(map_html)}`\n")
+            f.write("- Alerts aggregated per geolocated IP/location (counts + rule breakdown), clustered markers + heat layer\n\n")
 
         f.write("## Raw outputs\n")
         f.write(f"- `{os.path.basename(alerts_json)}`\n")
         f.write(f"- `{os.path.basename(flows_csv)}`\n")
         f.write(f"- `{os.path.basename(pairs_csv)}`\n")
+        f.write(f"- `{os.path.basename(rollups['summary_json'])}`, `{os.path.basename(rollups['timeline_csv'])}`, "
+                f"`{os.path.basename(rollups['pairs_top_csv'])}` (dashboard rollups)\n")
+        if store_db:
+            f.write(f"- `{os.path.basename(store_db)}` (SQLite: alerts + flows, indexed)\n")
 
     report_tex = build_report_tex(out_dir=out_dir, pcap_path=pcap_path)
     return {"report_md": report_md, "map_html": map_html, "report_tex": report_tex}
@@ -1,9 +1,16 @@
 import os
-import folium
+import html
+from collections import Counter
 
 
-def build_map_optional(out_dir, alerts, enrichment):
-    pts = []
+# Above this many distinct locations markers are drawn client-side from a
+# compact data array (FastMarkerCluster) instead of one folium object each.
+MAX_RICH_MARKERS = 1000
+POPUP_TOP_RULES = 5
+
+
+def _aggregate_locations(alerts, enrichment):
+    locs = {}
     for a in alerts:
         ip = a.get("dst_ip") or a.get("src_ip")
         if not ip:
@@ -15,15 +22,64 @@ def build_map_optional(out_dir, alerts, enrichment):
         lon = geo.get("lon")
         if lat is None or lon is None:
             continue
-        pts.append((lat, lon, ip, a.get("rule_id")))
+        loc = locs.setdefault((lat, lon), {"count": 0, "ips": Counter(), "rules": Counter(), "place": geo.get("city") or geo.get("country")})
+        loc["count"] += 1
+        loc["ips"][ip] += 1
+        loc["rules"][a.get("rule_id") or "unknown"] += 1
+    return locs
 
-    if not pts:
-        return None
 
-    m = folium.Map(location=[pts[0][0], pts[0][1]], zoom_start=3)
-    for lat, lon, ip, rid in pts[:500]:
-        folium.Marker([lat, lon], popup=f"{ip} {rid}").add_to(m)
+def _popup(loc):
+    rules = ", ".join(f"{html.escape(str(r))}: {c}" for r, c in loc["rules"].most_common(POPUP_TOP_RULES))
+    if len(loc["rules"]) > POPUP_TOP_RULES:
+        rules += f" (+{len(loc['rules']) - POPUP_TOP_RULES} more)"
+    ips = ", ".join(html.escape(ip) for ip, _ in loc["ips"].most_common(3))
+    if len(loc["ips"]) > 3:
+        ips += f" (+{len(loc['ips']) - 3} more)"
+    place = html.escape(str(loc["place"])) if loc["place"] else ""
+    return f"<b>{loc['count']} alerts</b> {place}<br>{ips}<br>{rules}"
+
 
+def build_map_optional(out_dir, alerts, enrichment):
+    locs = _aggregate_locations(alerts, enrichment)
     out_html = os.path.join(out_dir, "map.html")
+    if not locs:
+        if os.path.exists(out_html):
+            os.remove(out_html)
+        return None
+
+    import folium
+    from folium.plugins import FastMarkerCluster, HeatMap, MarkerCluster
+
+    (lat0, lon0), _ = max(locs.items(), key=lambda kv: kv[1]["count"])
+    m = folium.Map(location=[lat0, lon0], zoom_start=3)
+    max_count = max(loc["count"] for loc in locs.values())
+
+    if len(locs) <= MAX_RICH_MARKERS:
+        cluster = MarkerCluster(name="Alerts (clustered)").add_to(m)
+        for (lat, lon), loc in locs.items():
+            folium.CircleMarker(
+                [lat, lon],
+                radius=4 + 12 * (loc["count"] / max_count) ** 0.5,
+                popup=folium.Popup(_popup(loc), max_width=320),
+                fill=True,
+            ).add_to(cluster)
+    else:
+        data = [[lat, lon, _popup(loc)] for (lat, lon), loc in locs.items()]
+        callback = (
+            "function (row) {"
+            "var marker = L.marker(new L.LatLng(row[0], row[1]));"
+            "marker.bindPopup(row[2]);"
+            "return marker;};"
+        )
+        FastMarkerCluster(data, callback=callback, name="Alerts (clustered)").add_to(m)
+
+    HeatMap(
+        [[lat, lon, loc["count"] / max_count] for (lat, lon), loc in locs.items()],
+        name="Alert density",
+        show=False,
+    ).add_to(m)
+    folium.LayerControl().add_to(m)
+
     m.save(out_html)
     return out_html
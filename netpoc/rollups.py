@@ -0,0 +1,83 @@
+import os
+import json
+import pandas as pd
+
+
+# Base bin of the precomputed alert timeline. Dashboard bins (5/10/30/60 s)
+# are multiples of it, so they are re-aggregated from the rollup directly.
+ROLLUP_BIN_MS = 5000
+TOP_PAIRS = 100
+
+ALERT_COLS = [
+    "rule_id", "rule_name", "type", "ts_ms", "src_ip", "dst_ip", "dst_port", "details", "flow_id",
+    # set on aggregated alerts (netpoc.aggregate)
+    "count", "first_seen_ms", "last_seen_ms", "bytes", "sample_flow_ids",
+]
+
+TIMELINE_CSV = "alerts_timeline.csv"
+PAIRS_TOP_CSV = "pairs_top.csv"
+SUMMARY_JSON = "rollups.json"
+
+
+def alerts_frame(alerts) -> pd.DataFrame:
+    df = pd.DataFrame(alerts or [], columns=ALERT_COLS)
+    df["rule_id"] = df["rule_id"].fillna("UNKNOWN").astype(str)
+    df["ts_ms"] = pd.to_numeric(df["ts_ms"], errors="coerce")
+    return df
+
+
+def alerts_timeline(alerts_df: pd.DataFrame, bin_ms=ROLLUP_BIN_MS) -> pd.DataFrame:
+    df = alerts_df[alerts_df["ts_ms"].notna()]
+    bins = (df["ts_ms"].astype("int64") // bin_ms) * bin_ms
+    g = df.groupby([bins.rename("bin_ms"), df["rule_id"]]).size()
+    return g.reset_index(name="count").sort_values("bin_ms")
+
+
+def rebin_timeline(timeline: pd.DataFrame, bin_ms: int) -> pd.DataFrame:
+    bins = (timeline["bin_ms"] // bin_ms) * bin_ms
+    g = timeline.groupby([bins, timeline["rule_id"]])["count"].sum().reset_index()
+    g["bin"] = pd.to_datetime(g["bin_ms"], unit="ms")
+    return g.sort_values("bin_ms")
+
+
+def _pred_column(preds):
+    for c in ("ml_pred", "pred_label"):
+        if preds is not None and c in preds.columns:
+            return c
+    return None
+
+
+def summarize(alerts_df: pd.DataFrame, total_flows=None, ml_preds=None, ml_counts=None):
+    sigma = alerts_df["rule_id"].str.upper().str.startswith("SIGMA")
+    pred_col = _pred_column(ml_preds)
+    if pred_col:
+        vc = ml_preds[pred_col].value_counts()
+        ml_counts = {str(k): int(v) for k, v in vc.items()}
+
+    return {
+        "total_flows": None if total_flows is None else int(total_flows),
+        "total_alerts": int(len(alerts_df)),
+        "sigma_alerts": int(sigma.sum()),
+        "python_alerts": int((~sigma).sum()),
+        "rule_ids": sorted(alerts_df["rule_id"].unique().tolist()),
+        "src_ips": sorted(alerts_df["src_ip"].dropna().astype(str).unique().tolist()),
+        "dst_ips": sorted(alerts_df["dst_ip"].dropna().astype(str).unique().tolist()),
+        "ml_pred_counts": ml_counts,
+        "rollup_bin_ms": ROLLUP_BIN_MS,
+    }
+
+
+def write_rollups(out_dir, flows_df, alerts, pairs, ml_preds=None, ml_counts=None):
+    alerts_df = alerts_frame(alerts)
+
+    timeline_csv = os.path.join(out_dir, TIMELINE_CSV)
+    alerts_timeline(alerts_df).to_csv(timeline_csv, index=False)
+
+    pairs_top_csv = os.path.join(out_dir, PAIRS_TOP_CSV)
+    pairs.head(TOP_PAIRS).to_csv(pairs_top_csv, index=False)
+
+    summary_json = os.path.join(out_dir, SUMMARY_JSON)
+    with open(summary_json, "w", encoding="utf-8") as f:
+        json.dump(summarize(alerts_df, len(flows_df), ml_preds, ml_counts), f, indent=2, ensure_ascii=False)
+
+    return {"timeline_csv": timeline_csv, "pairs_top_csv": pairs_top_csv, "summary_json": summary_json}
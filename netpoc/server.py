@@ -0,0 +1,256 @@
+import os
+import json
+import queue
+import socket
+import threading
+import time
+import traceback
+import uuid
+from collections import OrderedDict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pandas as pd
+
+from .cascade import load_cascade_config
+from .flows import FLOW_COLS
+from .detection_rules import RULE_COLUMNS
+from .report import REPORT_COLUMNS
+from .pipeline import run_analysis
+from .sigma_rules import load_sigma_rules
+
+
+# `netpoc serve`: a long-running process that loads Sigma rules, the scoring
+# model and the enrichment cache once, and runs submitted analyses from a
+# bounded queue on a pool of worker threads.
+#
+#   POST /jobs            {"pcap": path | [rotated paths]} | {"flows_csv": path} | {"flows": [...]}
+#                         optional: "out", "enrich", "cascade", "store", "stream"
+#   GET  /jobs            list of jobs (status only)
+#   GET  /jobs/<id>       status, per-stage timings, result paths/counts
+#   GET  /jobs/<id>/alerts  alerts.json of a finished job
+#   GET  /health          queue depth, workers, what is loaded
+
+MAX_FINISHED_JOBS = 1000
+
+# flow batches must carry these: the Python rules and the report index them per row
+REQUIRED_FLOW_COLS = [c for c in FLOW_COLS if c in set(RULE_COLUMNS) | set(REPORT_COLUMNS)]
+
+
+def _check_flows(df: pd.DataFrame):
+    missing = [c for c in REQUIRED_FLOW_COLS if c not in df.columns]
+    if missing:
+        raise ValueError(f"flows lack required columns: {', '.join(missing)}")
+    empty = [c for c in REQUIRED_FLOW_COLS if df[c].isna().any()]
+    if empty:
+        raise ValueError(f"flows have empty values in required columns: {', '.join(empty)}")
+
+
+class AnalysisService:
+    def __init__(self, jobs_dir="out/jobs", sigma=None, model_path=None, workers=2, queue_size=16,
+                 enrich=True, cascade_config=None, aggregate=True, aggregate_config=None, chunk_size=50_000):
+        t0 = time.perf_counter()
+        self.jobs_dir = jobs_dir
+        self.enrich = enrich
+        self.chunk_size = chunk_size
+        self.sigma_rules = load_sigma_rules(sigma) if sigma else []
+        self.model = None
+        if model_path:
+            from .ml import load_scoring_model
+
+            self.model = load_scoring_model(model_path=model_path)
+        self.cascade_cfg = load_cascade_config(cascade_config)
+        self.aggregate_cfg = None
+        if aggregate:
+            from .aggregate import load_aggregation_config
+
+            self.aggregate_cfg = load_aggregation_config(aggregate_config)
+        self.warmup_seconds = round(time.perf_counter() - t0, 4)
+
+        self.queue = queue.Queue(maxsize=queue_size)
+        self.jobs = OrderedDict()
+        self.lock = threading.Lock()
+        self.workers = [threading.Thread(target=self._worker, daemon=True, name=f"netpoc-worker-{i}") for i in range(workers)]
+        for w in self.workers:
+            w.start()
+
+    # ---------- jobs ----------
+
+    def submit(self, spec):
+        if not any(k in spec for k in ("pcap", "flows_csv", "flows")):
+            raise ValueError("job needs one of: pcap, flows_csv, flows")
+        if "pcap" in spec:
+            for p in [spec["pcap"]] if isinstance(spec["pcap"], str) else spec["pcap"]:
+                if not os.path.exists(p):
+                    raise ValueError(f"pcap not found: {p}")
+        if "flows_csv" in spec:
+            if not os.path.exists(spec["flows_csv"]):
+                raise ValueError(f"flows_csv not found: {spec['flows_csv']}")
+            _check_flows(pd.read_csv(spec["flows_csv"], nrows=0))
+        if "flows" in spec:
+            # validated once here (400 on bad input); the worker reuses the frame
+            spec = {**spec, "flows": self._flows_from_spec(spec)}
+
+        job_id = uuid.uuid4().hex[:12]
+        job = {
+            "id": job_id,
+            "status": "queued",
+            "submitted": time.time(),
+            "out": spec.get("out") or os.path.join(self.jobs_dir, job_id),
+            "spec": {k: v for k, v in spec.items() if k != "flows"},
+            "timings": {},
+            "result": None,
+            "error": None,
+        }
+        with self.lock:
+            self.jobs[job_id] = job
+        try:
+            self.queue.put_nowait((job, spec))
+        except queue.Full:
+            with self.lock:
+                del self.jobs[job_id]
+            raise
+        return job
+
+    def get(self, job_id):
+        with self.lock:
+            job = self.jobs.get(job_id)
+            return dict(job) if job else None
+
+    def list(self):
+        with self.lock:
+            return [{"id": j["id"], "status": j["status"]} for j in self.jobs.values()]
+
+    def health(self):
+        return {
+            "queued": self.queue.qsize(),
+            "queue_size": self.queue.maxsize,
+            "workers": len(self.workers),
+            "sigma_rules": len(self.sigma_rules),
+            "model": type(self.model[0]).__name__ if self.model else None,
+            "warmup_seconds": self.warmup_seconds,
+        }
+
+    def _flows_from_spec(self, spec):
+        if "flows" in spec:
+            df = spec["flows"] if isinstance(spec["flows"], pd.DataFrame) else pd.DataFrame(spec["flows"])
+        elif "flows_csv" in spec:
+            df = pd.read_csv(spec["flows_csv"])
+        else:
+            return None
+        _check_flows(df)
+        return df.reindex(columns=FLOW_COLS)
+
+    def _run(self, job, spec):
+        t0 = time.perf_counter()
+        flows_df = self._flows_from_spec(spec)
+        job["timings"]["load_input"] = round(time.perf_counter() - t0, 4)
+        result = run_analysis(
+            job["out"],
+            pcap=spec.get("pcap"),
+            flows_df=flows_df,
+            sigma_rules=self.sigma_rules,
+            model=self.model,
+            enrich=spec.get("enrich", self.enrich),
+            plot_workers=1,
+            store=spec.get("store", True),
+            stream=spec.get("stream", False),
+            chunk_size=self.chunk_size,
+            cascade_cfg=self.cascade_cfg if spec.get("cascade") else None,
+            aggregate_cfg=self.aggregate_cfg if spec.get("aggregate", True) else None,
+        )
+        job["timings"].update(result.pop("timings"))
+        return result
+
+    def _worker(self):
+        while True:
+            job, spec = self.queue.get()
+            job["status"] = "running"
+            job["started"] = time.time()
+            job["timings"]["queue_wait"] = round(job["started"] - job["submitted"], 4)
+            try:
+                job["result"] = self._run(job, spec)
+                job["status"] = "done"
+            except Exception as e:
+                job["status"] = "failed"
+                job["error"] = f"{type(e).__name__}: {e}"
+                traceback.print_exc()
+            finally:
+                job["finished"] = time.time()
+                job["timings"]["total"] = round(job["finished"] - job["started"], 4)
+                self.queue.task_done()
+                self._trim()
+
+    def _trim(self):
+        with self.lock:
+            finished = [k for k, j in self.jobs.items() if j["status"] in ("done", "failed")]
+            for k in finished[:max(0, len(finished) - MAX_FINISHED_JOBS)]:
+                del self.jobs[k]
+
+
+# ---------- HTTP ----------
+
+def _make_handler(service: AnalysisService):
+    class Handler(BaseHTTPRequestHandler):
+        def _send(self, code, payload):
+            body = json.dumps(payload, default=str).encode("utf-8")
+            self.send_response(code)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_GET(self):
+            parts = [p for p in self.path.split("?")[0].split("/") if p]
+            if parts == ["health"]:
+                return self._send(200, service.health())
+            if parts == ["jobs"]:
+                return self._send(200, service.list())
+            if len(parts) in (2, 3) and parts[0] == "jobs":
+                job = service.get(parts[1])
+                if job is None:
+                    return self._send(404, {"error": "unknown job"})
+                if len(parts) == 2:
+                    return self._send(200, job)
+                if parts[2] == "alerts":
+                    if job["status"] != "done":
+                        return self._send(409, {"error": f"job is {job['status']}"})
+                    with open(os.path.join(job["out"], "alerts.json"), "r", encoding="utf-8") as f:
+                        return self._send(200, json.load(f))
+            return self._send(404, {"error": "not found"})
+
+        def do_POST(self):
+            if self.path.rstrip("/") != "/jobs":
+                return self._send(404, {"error": "not found"})
+            try:
+                length = int(self.headers.get("Content-Length") or 0)
+                spec = json.loads(self.rfile.read(length) or b"{}")
+                job = service.submit(spec)
+            except queue.Full:
+                return self._send(503, {"error": "queue full, retry later"})
+            except (ValueError, TypeError) as e:
+                return self._send(400, {"error": str(e)})
+            return self._send(202, {"id": job["id"], "status": job["status"], "out": job["out"]})
+
+    return Handler
+
+
+class UnixHTTPServer(ThreadingHTTPServer):
+    address_family = socket.AF_UNIX
+
+    def server_bind(self):
+        if os.path.exists(self.server_address):
+            os.remove(self.server_address)
+        self.socket.bind(self.server_address)
+        self.server_name, self.server_port = "localhost", 0
+
+    def get_request(self):
+        # AF_UNIX peers have no (host, port); the handler logs client_address[0]
+        conn, _ = self.socket.accept()
+        return conn, ("unix", 0)
+
+
+def make_server(service: AnalysisService, host="127.0.0.1", port=8765, unix_socket=None):
+    handler = _make_handler(service)
+    if unix_socket:
+        return UnixHTTPServer(unix_socket, handler)
+    return ThreadingHTTPServer((host, port), handler)
@@ -32,6 +32,16 @@ def _field_map():
     }
 
 
+def sigma_columns(sigma_rules):
+    # flow columns the loaded rules select on (+ the ones copied into alerts)
+    fmap = _field_map()
+    cols = ["id", "src_ip", "dst_ip", "dst_port", "first_seen_ms"]
+    for rule in sigma_rules:
+        sel = (rule.get("detection") or {}).get("selection") or {}
+        cols += [fmap.get(k, k) for k in sel]
+    return list(dict.fromkeys(cols))
+
+
 def _match_selection(df: pd.DataFrame, sel: dict) -> pd.Series:
     m = pd.Series([True] * len(df), index=df.index)
     fmap = _field_map()
@@ -0,0 +1,87 @@
+import os
+import json
+import sqlite3
+import pandas as pd
+
+from .flows import FLOW_COLS
+from .rollups import ALERT_COLS
+
+
+STORE_DB = "netpoc.sqlite"
+
+_INDEXES = {
+    "alerts": ["rule_id", "src_ip", "dst_ip", "ts_ms"],
+    "flows": ["id", "src_ip", "dst_ip", "first_seen_ms"],
+}
+
+
+def store_path(out_dir):
+    return os.path.join(out_dir, STORE_DB)
+
+
+def write_store(out_dir, flows_df: pd.DataFrame, alerts, chunksize=50_000):
+    path = store_path(out_dir)
+    tmp = path + ".tmp"
+    if os.path.exists(tmp):
+        os.remove(tmp)
+
+    con = sqlite3.connect(tmp)
+    try:
+        con.execute("PRAGMA journal_mode=OFF")
+        con.execute("PRAGMA synchronous=OFF")
+        alerts_df = pd.DataFrame(alerts or [], columns=ALERT_COLS)
+        alerts_df["sample_flow_ids"] = alerts_df["sample_flow_ids"].map(
+            lambda v: json.dumps(v) if isinstance(v, list) else v
+        )
+        alerts_df.to_sql("alerts", con, index=False, chunksize=chunksize)
+        flows_df.reindex(columns=FLOW_COLS).to_sql("flows", con, index=False, chunksize=chunksize)
+        for table, cols in _INDEXES.items():
+            for c in cols:
+                con.execute(f"CREATE INDEX idx_{table}_{c} ON {table}({c})")
+        con.execute("ANALYZE")
+        con.commit()
+    finally:
+        con.close()
+
+    # readers keep seeing the previous run until the new file is complete
+    os.replace(tmp, path)
+    return path
+
+
+def open_store(path):
+    return sqlite3.connect(f"file:{path}?mode=ro", uri=True, check_same_thread=False)
+
+
+# ---------- Alert queries (filters pushed down to SQLite) ----------
+
+def _where(rules=None, src_ips=None, dst_ips=None):
+    clauses, params = [], []
+    for col, values in (("rule_id", rules), ("src_ip", src_ips), ("dst_ip", dst_ips)):
+        if values:
+            clauses.append(f"{col} IN ({','.join('?' * len(values))})")
+            params.extend(values)
+    sql = (" WHERE " + " AND ".join(clauses)) if clauses else ""
+    return sql, params
+
+
+def count_alerts(con, **filters):
+    where, params = _where(**filters)
+    return con.execute(f"SELECT COUNT(*) FROM alerts{where}", params).fetchone()[0]
+
+
+def alerts_timeline(con, bin_ms, **filters):
+    where, params = _where(**filters)
+    ts_cond = ("AND" if where else "WHERE") + " ts_ms IS NOT NULL"
+    sql = (
+        f"SELECT (CAST(ts_ms AS INTEGER) / ?) * ? AS bin_ms, rule_id, COUNT(*) AS count FROM alerts{where} {ts_cond} "
+        "GROUP BY bin_ms, rule_id ORDER BY bin_ms"
+    )
+    g = pd.read_sql_query(sql, con, params=[int(bin_ms), int(bin_ms)] + params)
+    g["bin"] = pd.to_datetime(g["bin_ms"], unit="ms")
+    return g
+
+
+def alerts_page(con, limit=15, offset=0, **filters):
+    where, params = _where(**filters)
+    sql = f"SELECT * FROM alerts{where} ORDER BY ts_ms DESC LIMIT ? OFFSET ?"
+    return pd.read_sql_query(sql, con, params=params + [int(limit), int(offset)])
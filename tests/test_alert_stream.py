@@ -0,0 +1,26 @@
+import os
+
+from netpoc.alert_stream import AlertStreamWriter, read_index, stream_dir, tail
+
+
+def test_each_run_starts_a_fresh_stream(tmp_path):
+    out = str(tmp_path)
+    w = AlertStreamWriter(out, segment_max_records=2)
+    w.append([{"rule_id": "R001", "n": i} for i in range(5)], flows=10)
+    w.close()
+    sdir = stream_dir(out)
+    records, cursor, index = tail(sdir)
+    assert len(records) == 5 and index["flows"] == 10 and index["done"]
+
+    w = AlertStreamWriter(out, segment_max_records=2)
+    w.append([{"rule_id": "R002"}], flows=3)
+    w.close()
+    index = read_index(sdir)
+    assert index["stream_id"] != cursor["stream_id"]
+    assert (index["records"], index["flows"]) == (1, 3)
+    assert sorted(n for n in os.listdir(sdir) if n.endswith(".ndjson")) == [s["name"] for s in index["segments"]]
+
+    # a reader still holding the old cursor restarts on the new stream
+    records, cursor2, _ = tail(sdir, cursor)
+    assert [r["rule_id"] for r in records] == ["R002"]
+    assert cursor2["stream_id"] == index["stream_id"]
@@ -0,0 +1,55 @@
+import numpy as np
+import pandas as pd
+
+from netpoc.archive import archive_flows, hunt, read_block, write_block
+from netpoc.flows import FLOW_COLS
+
+
+def _flows(n=6, t0=1_700_000_000_000):
+    df = pd.DataFrame({c: np.arange(n, dtype="int64") for c in FLOW_COLS})
+    df["src_ip"] = "10.0.0.1"
+    df["dst_ip"] = [f"10.0.1.{i}" for i in range(n)]
+    df["first_seen_ms"] = t0 + np.arange(n)
+    df["last_seen_ms"] = df["first_seen_ms"] + 10
+    # StringDtype under pandas 3, as NFStream app columns come out of _flows_frame
+    df["application_name"] = pd.array(["TLS", "DNS", None, "TLS", "HTTP", "DNS"][:n], dtype="string")
+    return df
+
+
+def test_write_block_keeps_string_columns(tmp_path):
+    df = _flows()
+    zone = write_block(str(tmp_path / "b"), df)
+    assert zone["application_name"]["min"] == "DNS"
+    assert zone["application_name"]["max"] == "TLS"
+    assert zone["application_name"]["values"] == ["DNS", "HTTP", "TLS"]
+    back = read_block(str(tmp_path), "b")
+    assert list(back["application_name"]) == ["TLS", "DNS", "", "TLS", "HTTP", "DNS"]
+    assert list(back["dst_ip"]) == list(df["dst_ip"])
+
+
+def test_hunt_sigma_on_app_column(tmp_path):
+    root = str(tmp_path / "archive")
+    summary = archive_flows(root, _flows(), "test", run="r1")
+    assert summary["blocks"] == 1
+    # the second run's block has no TLS flow, so its zone map skips it
+    other = _flows(t0=1_700_000_000_000 + 7_200_000)
+    other["application_name"] = pd.array(["DNS"] * len(other), dtype="string")
+    archive_flows(root, other, "test", run="r2")
+
+    rule = {"id": "tls", "title": "tls", "detection": {"selection": {"application_name": "TLS"}, "condition": "selection"}}
+    alerts, stats = hunt(root, sigma_rules=[rule], python_rules=False, workers=1)
+    assert len(alerts) == 2
+    assert stats["blocks_scanned"] == 1
+    assert stats["blocks_skipped_by_zone_maps"] == 1
+
+
+def test_rearchive_after_crash_clears_orphan_blocks(tmp_path):
+    root = tmp_path / "archive"
+    # a crashed attempt: block folder written, catalog never committed
+    orphan = root / "2023" / "11" / "14" / "22" / "b-r1-0"
+    orphan.mkdir(parents=True)
+    (orphan / "stale.npy").write_bytes(b"")
+    summary = archive_flows(str(root), _flows(), "test", run="r1")
+    assert not summary["skipped"] and summary["blocks"] == 1
+    assert not (orphan / "stale.npy").exists()
+    assert len(read_block(str(root), "2023/11/14/22/b-r1-0")) == 6
@@ -0,0 +1,60 @@
+import numpy as np
+import pandas as pd
+
+from netpoc.baseline import METRICS, BaselineStore
+
+
+def _windows(n_hosts=20, n_buckets=40, seed=0):
+    rng = np.random.default_rng(seed)
+    hosts = np.repeat([f"10.0.0.{i}" for i in range(n_hosts)], n_buckets)
+    buckets = np.tile(np.arange(n_buckets, dtype=np.int64) * 60_000, n_hosts)
+    df = pd.DataFrame({"src_ip": hosts, "bucket_ms": buckets})
+    for m in METRICS:
+        df[m] = rng.integers(1, 1000, size=len(df))
+    df.loc[df.sample(frac=0.3, random_state=seed).index, "bytes"] *= 50
+    return df
+
+
+def _reference(windows, cfg):
+    # straightforward per-window EWMA in time order, for comparison
+    alpha, state, z = cfg["alpha"], {}, {}
+    for row in windows.sort_values("bucket_ms", kind="stable").itertuples():
+        x = np.log1p(np.array([getattr(row, m) for m in METRICS], dtype=np.float64)).astype(np.float32)
+        mean, var, n = state.get(row.src_ip, (None, np.zeros(len(METRICS), np.float32), 0))
+        if n >= cfg["min_history"]:
+            z[row.Index] = (x - mean) / np.maximum(np.sqrt(var), cfg["min_std"])
+        if n == 0:
+            mean = x
+        else:
+            diff = x - mean
+            mean = mean + np.float32(alpha) * diff
+            var = (1 - np.float32(alpha)) * (var + diff * np.float32(alpha) * diff)
+        state[row.src_ip] = (mean, var, n + 1)
+    return state, z
+
+
+def test_score_update_matches_per_window_ewma(tmp_path):
+    windows = _windows().sample(frac=1.0, random_state=1)  # unsorted input
+    store = BaselineStore(str(tmp_path / "b"))
+    scored = store.score_update(windows)
+    state, z = _reference(windows, store.cfg)
+
+    for i, host in enumerate(store.hosts):
+        mean, var, n = state[host]
+        np.testing.assert_allclose(store.mean[i], mean, rtol=1e-5)
+        np.testing.assert_allclose(store.var[i], var, rtol=1e-4, atol=1e-6)
+        assert store.n[i] == n
+    zcols = scored[[f"z_{m}" for m in METRICS]]
+    assert zcols.notna().all(axis=1).sum() == len(z)
+    for idx, expected in z.items():
+        np.testing.assert_allclose(zcols.loc[idx].to_numpy(dtype=np.float64), expected, rtol=1e-4, atol=1e-5)
+
+
+def test_rescoring_the_same_buckets_does_not_count_twice(tmp_path):
+    windows = _windows(n_hosts=3, n_buckets=12)
+    store = BaselineStore(str(tmp_path / "b"))
+    store.score_update(windows)
+    n, mean = store.n.copy(), store.mean.copy()
+    store.score_update(windows)
+    np.testing.assert_array_equal(store.n, n)
+    np.testing.assert_array_equal(store.mean, mean)
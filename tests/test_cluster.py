@@ -0,0 +1,23 @@
+import numpy as np
+import pandas as pd
+
+from netpoc.cluster import pack, unpack
+
+
+def test_pack_round_trips_string_and_numeric_columns():
+    df = pd.DataFrame({
+        "id": np.arange(3, dtype="int64"),
+        "src_ip": ["10.0.0.1", "10.0.0.2", None],
+        "application_name": pd.array(["TLS", None, "DNS"], dtype="string"),
+        "bytes": [1.5, 2.0, np.nan],
+    })
+    frames, meta = unpack(pack({"flows": df}, {"alerts": [{"rule_id": "R001"}]}))
+    back = frames["flows"]
+    assert list(back.columns) == list(df.columns)
+    assert list(back["id"]) == [0, 1, 2]
+    assert list(back["src_ip"].isna()) == [False, False, True]
+    assert list(back["src_ip"][:2]) == ["10.0.0.1", "10.0.0.2"]
+    assert list(back["application_name"].isna()) == [False, True, False]
+    assert list(back["application_name"].dropna()) == ["TLS", "DNS"]
+    np.testing.assert_array_equal(back["bytes"].to_numpy(), df["bytes"].to_numpy())
+    assert meta == {"alerts": [{"rule_id": "R001"}]}
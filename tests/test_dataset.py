@@ -0,0 +1,42 @@
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from netpoc.dataset import DATASET_META, build_dataset, is_dataset, iter_dataset
+from netpoc.flows import APP_COLS, FLOW_COLS
+
+
+def _csv(path, n, first_port):
+    df = pd.DataFrame({c: np.arange(n, dtype="int64") for c in FLOW_COLS if c != "id"})
+    df["src_ip"] = "10.0.0.1"
+    df["dst_ip"] = "10.0.1.1"
+    df["src_port"] = first_port + np.arange(n)
+    for c in APP_COLS:
+        df[c] = "TLS" if c == "application_name" else ""
+    df.to_csv(path, index=False)
+    return str(path)
+
+
+def test_build_dataset_with_app_columns(tmp_path):
+    sources = [{"path": _csv(tmp_path / "a.csv", 30, 1000), "label": 0}, {"path": _csv(tmp_path / "b.csv", 20, 5000), "label": 1}]
+    out = str(tmp_path / "ds")
+    meta = build_dataset(out, sources, per_class=50, shard_rows=16, workers=1, extra=("app",))
+    assert is_dataset(out)
+    assert meta["rows"] == 40  # balanced to the smaller class
+    assert len(meta["shards"]) == 3
+    data = pd.concat(iter_dataset(out), ignore_index=True)
+    assert set(data["application_name"]) == {"TLS"}
+    assert sorted(data["label"].value_counts().tolist()) == [20, 20]
+
+
+def test_build_dataset_refuses_foreign_out(tmp_path):
+    sources = [{"path": _csv(tmp_path / "a.csv", 5, 1000), "label": 0}]
+    out = tmp_path / "models"
+    out.mkdir()
+    (out / "model.joblib").write_bytes(b"keep")
+    with pytest.raises(ValueError, match="not a dataset folder"):
+        build_dataset(str(out), sources, workers=1)
+    assert (out / "model.joblib").read_bytes() == b"keep"
+    assert not os.path.exists(out / DATASET_META)
@@ -0,0 +1,41 @@
+import numpy as np
+import pandas as pd
+from sklearn.ensemble import RandomForestClassifier
+
+from netpoc.features import FeaturePipeline
+from netpoc.forest import export_forest, load_forest
+
+
+def _fit(X, y, **kw):
+    model = RandomForestClassifier(n_estimators=25, random_state=3, **kw).fit(X, y)
+    df = pd.DataFrame(X, columns=[f"f{i}" for i in range(X.shape[1])])
+    return model, FeaturePipeline(list(df.columns)).fit(df)
+
+
+def _parity(tmp_path, model, pipeline, X):
+    forest, _ = load_forest(export_forest(model, pipeline, str(tmp_path / "m.forest")))
+    np.testing.assert_allclose(forest.predict_proba(X), model.predict_proba(X), atol=1e-9)
+    np.testing.assert_array_equal(forest.predict(X), model.predict(X))
+    # same leaf as sklearn in every tree (global node index = root offset + local index)
+    expected = model.apply(X).T + np.asarray(forest.roots)[:, None]
+    np.testing.assert_array_equal(forest.apply(X), expected)
+
+
+def test_forest_matches_sklearn(tmp_path):
+    rng = np.random.default_rng(0)
+    X = rng.normal(size=(500, 4)).astype(np.float32)
+    y = (X[:, 0] + X[:, 1] ** 2 > 1).astype(int)
+    model, pipeline = _fit(X, y)
+    _parity(tmp_path, model, pipeline, rng.normal(size=(300, 4)).astype(np.float32))
+
+
+def test_forest_with_single_leaf_trees(tmp_path):
+    # 2 positives in 200 rows: most bootstrap samples are pure, so those trees are one leaf
+    rng = np.random.default_rng(1)
+    X = rng.normal(size=(200, 3)).astype(np.float32)
+    y = np.ones(200, dtype=int)
+    y[[5, 150]] = 0
+    model, pipeline = _fit(X, y)
+    assert any(est.tree_.node_count == 1 for est in model.estimators_)
+    assert any(est.tree_.node_count > 1 for est in model.estimators_)
+    _parity(tmp_path, model, pipeline, np.vstack([X, rng.normal(size=(100, 3)).astype(np.float32)]))
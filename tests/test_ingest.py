@@ -0,0 +1,39 @@
+import gzip
+
+import pytest
+
+from netpoc.ingest import capture_source
+
+
+def _read_then_fail(path):
+    # stands in for NFStream: reads what the feeder sends, then gives up on it
+    with open(path, "rb") as f:
+        f.read()
+    raise RuntimeError("truncated dump file")
+
+
+def test_feeder_error_wins_over_reader_error(tmp_path):
+    bad = tmp_path / "cap.pcapng.gz"
+    with gzip.open(bad, "wb") as f:
+        f.write(b"\x0a\x0d\x0d\x0a" + b"\0" * 64)
+    with pytest.raises(ValueError, match="pcapng cannot be concatenated") as info:
+        with capture_source(str(bad)) as path:
+            _read_then_fail(path)
+    assert isinstance(info.value.__cause__, RuntimeError)
+
+
+def test_corrupt_archive_is_a_value_error(tmp_path):
+    bad = tmp_path / "cap.pcap.gz"
+    bad.write_bytes(b"not gzip at all")
+    with pytest.raises(ValueError, match="cap.pcap.gz"):
+        with capture_source(str(bad)) as path:
+            _read_then_fail(path)
+
+
+def test_reader_error_kept_when_input_is_fine(tmp_path):
+    good = tmp_path / "cap.pcap.gz"
+    with gzip.open(good, "wb") as f:
+        f.write(b"\xd4\xc3\xb2\xa1\x02\x00\x04\x00" + b"\0" * 8 + b"\xff\xff\x00\x00\x01\x00\x00\x00")
+    with pytest.raises(RuntimeError, match="truncated"):
+        with capture_source(str(good)) as path:
+            _read_then_fail(path)
@@ -0,0 +1,70 @@
+import os
+import sqlite3
+
+import joblib
+import numpy as np
+import pytest
+
+from netpoc.forest import ForestModel, forest_path
+from netpoc.ml import (
+    StreamingLinearModel, _make_synthetic_training, load_scoring_model, predict_with_model, train_or_load_model,
+    train_streaming,
+)
+from netpoc.store import write_store
+
+
+def test_synthetic_model_is_saved_once(tmp_path):
+    path = str(tmp_path / "model.joblib")
+    train_or_load_model(path)
+    assert os.path.exists(path) and os.path.isdir(forest_path(path))
+    mtime = os.path.getmtime(path)
+    # the next run scores with the exported forest instead of retraining
+    model, meta = load_scoring_model(path)
+    assert isinstance(model, ForestModel)
+    assert os.path.getmtime(path) == mtime
+
+
+def test_existing_bundle_is_not_overwritten(tmp_path):
+    path = tmp_path / "model.joblib"
+    joblib.dump({"model": None, "meta": {"features": []}}, path)
+    before = path.read_bytes()
+    with pytest.raises(ValueError, match="predates FeaturePipeline"):
+        train_or_load_model(str(path))
+    csv = tmp_path / "train.csv"
+    csv.write_text("label\n1\n")
+    with pytest.raises(ValueError, match="--force-train"):
+        train_or_load_model(str(path), train_csv=str(csv))
+    assert path.read_bytes() == before
+
+
+def _labeled_store(path, n=3000):
+    df = _make_synthetic_training(n)
+    df["id"] = np.arange(n)
+    df["src_ip"], df["dst_ip"], df["first_seen_ms"] = "10.0.0.1", "10.0.1.1", 1_700_000_000_000
+    with sqlite3.connect(path) as con:
+        df.to_sql("flows", con, index=False)
+    return df
+
+
+def test_out_of_core_from_labeled_store_replaces_forest(tmp_path):
+    path = str(tmp_path / "model.joblib")
+    train_or_load_model(path)  # synthetic forest + its numpy export
+    df = _labeled_store(str(tmp_path / "flows.sqlite"))
+    model, meta = train_streaming(path, str(tmp_path / "flows.sqlite"), chunk_size=500)
+    assert meta["train_stats"]["rows"] == len(df)
+    assert meta["eval"]["tp"] + meta["eval"]["fn"] > 0  # the held-out sample covers both classes
+    # the old forest export must not shadow the new model when scoring
+    assert not os.path.exists(forest_path(path))
+    loaded, loaded_meta = load_scoring_model(path)
+    assert isinstance(loaded, StreamingLinearModel)
+    preds = predict_with_model(loaded, df, loaded_meta)
+    assert len(preds) == len(df)
+
+
+def test_out_of_core_rejects_unlabeled_flow_store(tmp_path):
+    out = tmp_path / "out"
+    out.mkdir()
+    write_store(str(out), _make_synthetic_training(10).drop(columns="label"), [])
+    with pytest.raises(ValueError, match="no label column"):
+        train_streaming(str(tmp_path / "m.joblib"), str(out / "netpoc.sqlite"))
+    assert not os.path.exists(tmp_path / "m.joblib")
@@ -0,0 +1,44 @@
+import struct
+
+import numpy as np
+import pytest
+
+import netpoc.pcap_index as pcap_index
+from netpoc.pcap_index import build_pcap_index, carve_flows, load_pcap_index
+
+
+def _packet(src, dst, sport, dport):
+    ip = struct.pack(">BBHHHBBH4s4s", 0x45, 0, 40, 0, 0, 64, 6, 0, bytes(src), bytes(dst))
+    tcp = struct.pack(">HHIIBBHHH", sport, dport, 0, 0, 0x50, 0x02, 1024, 0, 0)
+    return b"\0" * 12 + b"\x08\x00" + ip + tcp
+
+
+def _write_pcap(path, n, truncated_tail=False):
+    flows = []
+    with open(path, "wb") as f:
+        f.write(struct.pack("<IHHiIII", 0xA1B2C3D4, 2, 4, 0, 0, 65535, 1))
+        for i in range(n):
+            sport = 40000 + i % 7
+            pkt = _packet([10, 0, 0, 1], [10, 0, 1, 1], sport, 443) if i % 2 else _packet([10, 0, 1, 1], [10, 0, 0, 1], 443, sport)
+            f.write(struct.pack("<IIII", 1_700_000_000 + i, 0, len(pkt), len(pkt)) + pkt)
+            flows.append(sport)
+        if truncated_tail:
+            f.write(struct.pack("<IIII", 1_700_000_000 + n, 0, 60, 60) + b"\0" * 10)
+    return flows
+
+
+@pytest.mark.parametrize("batch", [4, 7, 65_536])
+def test_index_across_record_batches(tmp_path, monkeypatch, batch):
+    monkeypatch.setattr(pcap_index, "RECORD_BATCH", batch)
+    pcap = str(tmp_path / "cap.pcap")
+    sports = _write_pcap(pcap, 28, truncated_tail=True)
+    meta = build_pcap_index(pcap, str(tmp_path))
+    assert meta["packets"] == meta["indexed"] == 28
+    idx, _ = load_pcap_index(str(tmp_path))
+    assert np.all(idx["key"][1:] >= idx["key"][:-1])
+    assert sorted(idx["offset"].tolist())[0] == 24
+
+    flow = {"src_ip": "10.0.0.1", "src_port": 40003, "dst_ip": "10.0.1.1", "dst_port": 443, "protocol": 6,
+            "first_seen_ms": 1_700_000_000_000, "last_seen_ms": 1_700_000_100_000}
+    res = carve_flows(str(tmp_path), [flow], str(tmp_path / "one.pcap"))
+    assert res["packets"] == sports.count(40003)  # both directions
@@ -0,0 +1,66 @@
+import json
+import threading
+import time
+import urllib.error
+import urllib.request
+
+import pytest
+
+from netpoc.server import AnalysisService, make_server
+
+
+def _flow(i):
+    return {
+        "id": i, "src_ip": "10.0.0.1", "src_port": 40000 + i, "dst_ip": "10.0.1.1", "dst_port": 443, "protocol": 6,
+        "bidirectional_packets": 4, "bidirectional_bytes": 400, "src2dst_packets": 2, "src2dst_bytes": 200,
+        "dst2src_packets": 2, "dst2src_bytes": 200, "duration_ms": 10,
+        "first_seen_ms": 1_700_000_000_000 + i, "last_seen_ms": 1_700_000_000_010 + i,
+    }
+
+
+@pytest.fixture
+def server(tmp_path):
+    service = AnalysisService(jobs_dir=str(tmp_path / "jobs"), workers=1, enrich=False, aggregate=False)
+    srv = make_server(service, port=0)
+    threading.Thread(target=srv.serve_forever, daemon=True).start()
+    yield f"http://127.0.0.1:{srv.server_address[1]}"
+    srv.shutdown()
+
+
+def _post(url, spec):
+    req = urllib.request.Request(f"{url}/jobs", data=json.dumps(spec).encode(), method="POST")
+    try:
+        with urllib.request.urlopen(req, timeout=10) as resp:
+            return resp.status, json.loads(resp.read())
+    except urllib.error.HTTPError as e:
+        return e.code, json.loads(e.read())
+
+
+def test_flows_batch_without_required_column_is_rejected(server):
+    flows = [_flow(i) for i in range(3)]
+    for f in flows:
+        del f["last_seen_ms"]
+    code, body = _post(server, {"flows": flows})
+    assert code == 400
+    assert "last_seen_ms" in body["error"]
+
+
+def test_flows_batch_with_empty_required_value_is_rejected(server):
+    flows = [_flow(i) for i in range(3)]
+    flows[1]["last_seen_ms"] = None
+    code, body = _post(server, {"flows": flows})
+    assert code == 400
+    assert "last_seen_ms" in body["error"]
+
+
+def test_flows_batch_runs(server):
+    code, body = _post(server, {"flows": [_flow(i) for i in range(3)]})
+    assert code == 202
+    for _ in range(300):
+        with urllib.request.urlopen(f"{server}/jobs/{body['id']}", timeout=10) as resp:
+            job = json.loads(resp.read())
+        if job["status"] in ("done", "failed"):
+            break
+        time.sleep(0.1)
+    assert job["status"] == "done", job["error"]
+    assert job["result"]["flows"] == 3